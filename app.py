@@ -1,14 +1,33 @@
-﻿from pathlib import Path
+﻿import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from fastapi import FastAPI, Request
 from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
-from db import init_db
-from routers import auth, export, qr, user
+from config import settings
+from core.compression import CompressionMiddleware, CompressionStats
+from core.tracing import TracingMiddleware
+from db import engine, init_db
+from maintenance import run_periodic_gc
+from routers import auth, export, qr, redirect, user
+from services.admission import preview_budget
+from services.qr import warm_up
+from services.redirects import redirects, run_scan_flusher
+from static_assets import FingerprintedStaticFiles, StaticRegistry
+from storage import asset_writer, ensure_dirs, mark_assets_ready, referenced_paths
+
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
 
 BASE_DIR = Path(__file__).parent
+logger = logging.getLogger(__name__)
+static_registry = StaticRegistry()
+compression_stats = CompressionStats()
 
 TAGS_METADATA = [
     {
@@ -27,8 +46,70 @@ TAGS_METADATA = [
         "name": "export",
         "description": "CSV export of the authenticated user's QR history.",
     },
+    {
+        "name": "redirect",
+        "description": "Public short links that resolve dynamic QR codes to their current destination.",
+    },
 ]
 
+
+@lru_cache(maxsize=1)
+def get_templates() -> "Jinja2Templates":
+    # Jinja2 is only imported once the first page is rendered
+    from fastapi.templating import Jinja2Templates
+
+    templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+    templates.env.globals["static_url"] = static_registry.static_url
+    return templates
+
+
+def _warm_up() -> None:
+    """Pay the lazy-import and first-render costs before the first request does."""
+
+    get_templates()
+    for module in ("bcrypt", "jose.jwt"):
+        importlib.import_module(module)
+    warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.migrate_on_startup:
+        init_db(engine)
+    ensure_dirs()
+    static_registry.build()
+    redirects.load(engine)
+    asset_writer.on_flushed = partial(mark_assets_ready, engine)
+    asset_writer.referenced = partial(referenced_paths, engine)
+    if settings.warmup:
+        await asyncio.to_thread(_warm_up)
+    tasks = [
+        asyncio.create_task(run_scan_flusher(redirects, engine, interval_seconds=settings.scan_flush_seconds))
+    ]
+    if settings.asset_gc_interval_minutes > 0:
+        tasks.append(
+            asyncio.create_task(
+                run_periodic_gc(
+                    engine,
+                    interval_seconds=settings.asset_gc_interval_minutes * 60,
+                    grace_seconds=settings.asset_gc_grace_seconds,
+                )
+            )
+        )
+    yield
+    for task in tasks:
+        task.cancel()
+    # let the scan flusher write its final batch
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # previews whose callers gave up may still be rendering; let them reach a stage boundary
+    if not await preview_budget.drain(settings.graceful_shutdown_seconds):
+        logger.warning("Shutting down with %d preview pixels still rendering", preview_budget.in_use)
+    # queued writes and unlinks must land before the process exits
+    await asyncio.to_thread(asset_writer.flush)
+    asset_writer.on_flushed = None
+    asset_writer.referenced = None
+
+
 app = FastAPI(
     title="QR Forge",
     description="Generate, preview, customise, and manage QR codes locally with FastAPI.",
@@ -42,22 +123,39 @@ app = FastAPI(
     openapi_tags=TAGS_METADATA,
     docs_url="/docs",
     redoc_url=None,
+    lifespan=lifespan,
+)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    level=settings.compression_level,
+    stats=compression_stats,
 )
+# added last so it is outermost: the root span covers compression too
+app.add_middleware(TracingMiddleware)
 
-init_db()
 app.include_router(auth.router)
 app.include_router(user.router)
 app.include_router(qr.router)
+app.include_router(qr.ws_router)
 app.include_router(export.router)
+app.include_router(redirect.router)
 
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount(
+    "/assets",
+    FingerprintedStaticFiles(directory=BASE_DIR / "assets", manifest=static_registry.add(BASE_DIR / "assets", "/assets")),
+    name="assets",
+)
+app.mount(
+    "/static",
+    FingerprintedStaticFiles(directory=BASE_DIR / "static", manifest=static_registry.add(BASE_DIR / "static", "/static")),
+    name="static",
+)
 
 
 __all__ = ("app",)
 
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-
 
 @app.get("/favicon.ico", include_in_schema=False)
 def favicon() -> FileResponse:
@@ -66,7 +164,7 @@ def favicon() -> FileResponse:
 
 @app.get("/", response_class=HTMLResponse, name="home", summary="Serve the landing page")
 def home(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "home.html",
         {"request": request, "active_page": "home"},
     )
@@ -74,7 +172,7 @@ def home(request: Request) -> HTMLResponse:
 
 @app.get("/generator", response_class=HTMLResponse, name="generator_page", summary="Serve the QR generator UI")
 def generator_page(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "index.html",
         {"request": request, "active_page": "generator"},
     )
@@ -82,7 +180,7 @@ def generator_page(request: Request) -> HTMLResponse:
 
 @app.get("/history", response_class=HTMLResponse, name="history_page", summary="Serve the saved history UI")
 def history_page(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "history.html",
         {"request": request, "active_page": "history"},
     )
@@ -90,7 +188,7 @@ def history_page(request: Request) -> HTMLResponse:
 
 @app.get("/profile", response_class=HTMLResponse, name="profile_page", summary="Serve the profile management UI")
 def profile_page(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "profile.html",
         {"request": request, "active_page": "profile"},
     )
@@ -98,7 +196,7 @@ def profile_page(request: Request) -> HTMLResponse:
 
 @app.get("/login", response_class=HTMLResponse, name="login_page", summary="Serve the login UI")
 def login_page(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "login.html",
         {"request": request, "active_page": "login"},
     )
@@ -106,7 +204,7 @@ def login_page(request: Request) -> HTMLResponse:
 
 @app.get("/signup", response_class=HTMLResponse, name="signup_page", summary="Serve the signup UI")
 def signup_page(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "signup.html",
         {"request": request, "active_page": "signup"},
     )
@@ -115,3 +213,8 @@ def signup_page(request: Request) -> HTMLResponse:
 @app.get("/health", summary="Simple health check")
 def health() -> dict:
     return {"status": "ok"}
+
+
+@app.get("/health/compression", summary="Response compression statistics")
+def compression_health() -> dict:
+    return compression_stats.as_dict()
@@ -0,0 +1,122 @@
+"""Compare the original and lean history list paths at 10k rows.
+
+    python -m benchmarks.bench_history [--rows 10000] [--repeat 5]
+
+The original path returned full ``QRItem`` rows through ``response_model``; the
+lean path selects only ``QRItemSummary`` columns and renders with orjson.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from core.security import get_current_user
+from db import get_session
+from models import QRItem, User
+from routers import qr
+
+
+def _seed(engine, rows: int) -> User:
+    with Session(engine) as session:
+        user = User(email="bench@example.com", full_name="Bench", hashed_password="x")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        start = datetime.now(timezone.utc)
+        session.bulk_insert_mappings(
+            QRItem,
+            [
+                {
+                    "user_id": user.id,
+                    "title": f"Campaign {n}",
+                    "url": f"https://example.com/campaign/{n}?utm_source=print",
+                    "foreground_color": "#000000",
+                    "background_color": "#ffffff",
+                    "size": 512,
+                    "padding": 16,
+                    "border_radius": 0,
+                    "svg_path": f"generated_svgs/{n:064x}.svg",
+                    "png_path": f"generated_pngs/{n:064x}.png",
+                    "created_at": start + timedelta(seconds=n),
+                    "updated_at": start + timedelta(seconds=n),
+                }
+                for n in range(rows)
+            ],
+        )
+        session.commit()
+        session.refresh(user)
+        session.expunge(user)
+        return user
+
+
+def _build_app(engine, user: User) -> FastAPI:
+    app = FastAPI()
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    @app.get("/original", response_model=List[QRItem])
+    def original(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+        return session.exec(
+            select(QRItem).where(QRItem.user_id == current_user.id).order_by(QRItem.created_at.desc())
+        ).all()
+
+    app.include_router(qr.router)
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_current_user] = lambda: user
+    return app
+
+
+def _measure(call: Callable[[], object], repeat: int) -> tuple:
+    call()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    user = _seed(engine, args.rows)
+    client = TestClient(_build_app(engine, user))
+
+    results = {}
+    for name, path in (("original", "/original"), ("lean", "/api/qr")):
+        def call(path: str = path) -> None:
+            resp = client.get(path)
+            assert resp.status_code == 200 and len(resp.json()) == args.rows
+
+        results[name] = _measure(call, args.repeat)
+        seconds, peak = results[name]
+        print(f"{name:>8}: {seconds * 1000:8.1f} ms median, {peak / 1024 / 1024:6.1f} MiB peak")
+
+    speedup = results["original"][0] / results["lean"][0]
+    memory = results["original"][1] / results["lean"][1]
+    print(f"lean path: {speedup:.1f}x faster, {memory:.1f}x less peak memory at {args.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
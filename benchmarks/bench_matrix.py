@@ -0,0 +1,95 @@
+"""Compare qrcode's ``List[List[bool]]`` with the bit-packed ``QRMatrix``.
+
+    python -m benchmarks.bench_matrix [--versions 1,10,25,40] [--repeat 5]
+
+For each QR version the script reports the retained memory of one matrix
+(measured with tracemalloc), its pickled size, and the time to walk it for
+rendering: the run-merging loop over the lists that the renderers used before
+versus ``QRMatrix.runs``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import pickle
+import statistics
+import time
+import tracemalloc
+from typing import Callable, List
+
+import qrcode
+
+from services.matrix import QRMatrix
+
+
+def _list_matrix(version: int) -> List[List[bool]]:
+    qr = qrcode.QRCode(version=version, border=0)
+    qr.add_data("QR FORGE")
+    qr.make(fit=False)
+    # copy so the qrcode object's own buffers are not counted
+    return [list(row) for row in qr.get_matrix()]
+
+
+def _retained(build: Callable[[], object]) -> int:
+    tracemalloc.start()
+    value = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del value
+    return current
+
+
+def _walk_lists(matrix: List[List[bool]]) -> int:
+    dark = 0
+    for row in matrix:
+        x = 0
+        width = len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            dark += x - start
+    return dark
+
+
+def _walk_runs(matrix: QRMatrix) -> int:
+    return sum(length for _, _, length in matrix.runs())
+
+
+def _median(call: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--versions", default="1,10,25,40")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'version':>7} {'modules':>7} {'lists':>10} {'QRMatrix':>10} {'pickle':>15} {'list runs':>11} {'QRMatrix runs':>14}")
+    for version in (int(value) for value in args.versions.split(",")):
+        rows = _list_matrix(version)
+        packed = QRMatrix.from_rows(rows)
+        assert _walk_lists(rows) == _walk_runs(packed)
+
+        list_bytes = _retained(lambda: [list(row) for row in rows])
+        packed_bytes = _retained(lambda: QRMatrix.from_rows(rows))
+        pickles = f"{len(pickle.dumps(rows))}/{len(pickle.dumps(packed))}"
+        walk_lists = _median(lambda: _walk_lists(rows), args.repeat)
+        walk_runs = _median(lambda: _walk_runs(packed), args.repeat)
+        print(
+            f"{version:>7} {len(rows):>7} {list_bytes / 1024:8.1f}KB {packed_bytes / 1024:8.1f}KB {pickles:>15} "
+            f"{walk_lists * 1000:9.2f}ms {walk_runs * 1000:12.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
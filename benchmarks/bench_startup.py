@@ -0,0 +1,87 @@
+"""Measure the cold-start cost of importing the app, ``-X importtime`` style.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--top 15]
+
+Each run imports ``app`` in a fresh interpreter (from a scratch directory, so
+nothing on disk is touched) and parses the ``-X importtime`` report. The
+median wall time and the import time per top-level package are printed,
+along with any deferred module that was loaded anyway.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+DEFERRED_MODULES = ("PIL", "qrcode", "bcrypt", "jose", "jinja2")
+SCRIPT = f"""
+import sys, time
+sys.path.insert(0, {str(ROOT_DIR)!r})
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(",".join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))
+"""
+
+
+def _self_time_by_package(report: str) -> Dict[str, int]:
+    """Sum ``-X importtime`` self times (microseconds) per top-level package."""
+
+    totals: Dict[str, int] = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".", 1)[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+
+def _run_once(workdir: str) -> Tuple[float, Dict[str, int], List[str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=workdir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    return float(elapsed), _self_time_by_package(result.stderr), [name for name in loaded.split(",") if name]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    timings: List[float] = []
+    packages: Dict[str, List[int]] = {}
+    loaded: List[str] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(args.repeat):
+            elapsed, totals, loaded = _run_once(workdir)
+            timings.append(elapsed)
+            for package, self_us in totals.items():
+                packages.setdefault(package, []).append(self_us)
+        leftovers = sorted(path.name for path in Path(workdir).iterdir())
+
+    medians = {package: statistics.median(values) for package, values in packages.items()}
+    print(f"import app: {statistics.median(timings) * 1000:.1f} ms median over {args.repeat} runs")
+    print(f"modules imported: {len(medians)} packages, {sum(medians.values()) / 1000:.1f} ms total self time")
+    print("\nslowest packages (self time):")
+    for package, self_us in sorted(medians.items(), key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+    print(f"\ndeferred modules loaded at import: {', '.join(loaded) or 'none'}")
+    print(f"files created at import: {', '.join(leftovers) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
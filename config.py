@@ -7,6 +7,43 @@ class Settings:
     secret_key: str = os.getenv("QR_FORGE_SECRET_KEY", "change-me-in-env")
     access_token_expire_minutes: int = int(os.getenv("QR_FORGE_TOKEN_EXPIRE_MINUTES", "720"))
     algorithm: str = os.getenv("QR_FORGE_TOKEN_ALG", "HS256")
+    signed_url_ttl_seconds: int = int(os.getenv("QR_FORGE_SIGNED_URL_TTL_SECONDS", "86400"))
+    compression_min_size: int = int(os.getenv("QR_FORGE_COMPRESSION_MIN_SIZE", "500"))
+    compression_level: int = int(os.getenv("QR_FORGE_COMPRESSION_LEVEL", "6"))
+    asset_gc_interval_minutes: int = int(os.getenv("QR_FORGE_ASSET_GC_INTERVAL_MINUTES", "0"))
+    asset_gc_grace_seconds: int = int(os.getenv("QR_FORGE_ASSET_GC_GRACE_SECONDS", "300"))
+    public_base_url: str = os.getenv("QR_FORGE_PUBLIC_BASE_URL", "http://127.0.0.1:8000")
+    # how long a worker trusts its cached short-link destinations; 0 reads every redirect from the DB
+    redirect_cache_seconds: float = float(os.getenv("QR_FORGE_REDIRECT_CACHE_SECONDS", "5"))
+    scan_flush_seconds: float = float(os.getenv("QR_FORGE_SCAN_FLUSH_SECONDS", "5"))
+    warmup: bool = os.getenv("QR_FORGE_WARMUP", "false").lower() in ("1", "true", "yes")
+    asset_fsync: bool = os.getenv("QR_FORGE_ASSET_FSYNC", "true").lower() in ("1", "true", "yes")
+    asset_write_batch: int = int(os.getenv("QR_FORGE_ASSET_WRITE_BATCH", "64"))
+    render_cache_path: str = os.getenv("QR_FORGE_RENDER_CACHE_PATH", "")
+    render_cache_mb: int = int(os.getenv("QR_FORGE_RENDER_CACHE_MB", "64"))
+    # 0 disables a quota
+    quota_max_items: int = int(os.getenv("QR_FORGE_QUOTA_MAX_ITEMS", "0"))
+    quota_max_mb: int = int(os.getenv("QR_FORGE_QUOTA_MAX_MB", "0"))
+    quota_renders_per_day: int = int(os.getenv("QR_FORGE_QUOTA_RENDERS_PER_DAY", "0"))
+    # default and upper bound for X-Render-Deadline-Ms on previews
+    preview_deadline_ms: int = int(os.getenv("QR_FORGE_PREVIEW_DEADLINE_MS", "3000"))
+    # pixels (size squared) of previews rendered at once, e.g. 8 at 1024px
+    preview_pixel_budget: int = int(os.getenv("QR_FORGE_PREVIEW_PIXEL_BUDGET", str(8 * 1024 * 1024)))
+    # fraction of requests traced; 0 disables tracing
+    trace_sample_rate: float = float(os.getenv("QR_FORGE_TRACE_SAMPLE_RATE", "0"))
+    trace_exporter: str = os.getenv("QR_FORGE_TRACE_EXPORTER", "jsonl")
+    trace_path: str = os.getenv("QR_FORGE_TRACE_PATH", "traces.jsonl")
+    # python -m serve: 0 workers means one per CPU, 0 concurrency means unlimited
+    host: str = os.getenv("QR_FORGE_HOST", "127.0.0.1")
+    port: int = int(os.getenv("QR_FORGE_PORT", "8000"))
+    workers: int = int(os.getenv("QR_FORGE_WORKERS", "1"))
+    backlog: int = int(os.getenv("QR_FORGE_BACKLOG", "2048"))
+    keep_alive_seconds: int = int(os.getenv("QR_FORGE_KEEP_ALIVE_SECONDS", "5"))
+    limit_concurrency: int = int(os.getenv("QR_FORGE_LIMIT_CONCURRENCY", "0"))
+    graceful_shutdown_seconds: int = int(os.getenv("QR_FORGE_GRACEFUL_SHUTDOWN_SECONDS", "30"))
+    # serve migrates once before starting workers and turns this off for them
+    migrate_on_startup: bool = os.getenv("QR_FORGE_MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    qr_uppercase_host: bool = os.getenv("QR_FORGE_QR_UPPERCASE_HOST", "false").lower() in ("1", "true", "yes")
 
 
 settings = Settings()
@@ -0,0 +1,163 @@
+"""Gzip response compression for text payloads (SVG, JSON, CSV, ...)."""
+
+from __future__ import annotations
+
+import zlib
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_MEDIA_TYPES: FrozenSet[str] = frozenset(
+    {
+        "application/json",
+        "application/javascript",
+        "application/postscript",
+        "image/svg+xml",
+        "text/csv",
+        "text/css",
+        "text/html",
+        "text/plain",
+    }
+)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into ``{encoding: quality}``."""
+
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+@dataclass
+class CompressionStats:
+    responses: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    def record(self, bytes_in: int, bytes_out: int) -> None:
+        self.responses += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def as_dict(self) -> dict:
+        ratio = self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+        return {
+            "responses": self.responses,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(ratio, 4),
+        }
+
+
+class CompressionMiddleware:
+    """Gzip allowlisted media types, streaming chunk by chunk when the body is streamed.
+
+    Responses that are already encoded, smaller than ``minimum_size`` or of a
+    media type outside ``media_types`` (PNG, WebP, ZIP, ...) pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 500,
+        level: int = 6,
+        media_types: FrozenSet[str] = DEFAULT_MEDIA_TYPES,
+        stats: Optional[CompressionStats] = None,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.media_types = media_types
+        self.stats = stats if stats is not None else CompressionStats()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if accepted.get("gzip", 0) <= 0:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _GzipResponder(self, send).send)
+
+    def eligible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        return media_type in self.media_types
+
+
+class _GzipResponder:
+    def __init__(self, middleware: CompressionMiddleware, send: Send) -> None:
+        self.middleware = middleware
+        self.downstream = send
+        self.start: Optional[Message] = None
+        self.compressor = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # hold the headers until the first body chunk decides the encoding
+            self.start = message
+            return
+        if self.start is None:
+            if self.compressor is not None and message["type"] == "http.response.body":
+                await self.downstream(self._compress(message))
+            else:
+                await self.downstream(message)
+            return
+
+        start, self.start = self.start, None
+        headers = MutableHeaders(raw=start["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if (
+            message["type"] != "http.response.body"
+            or not self.middleware.eligible(headers)
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            await self.downstream(start)
+            await self.downstream(message)
+            return
+
+        self.compressor = zlib.compressobj(self.middleware.level, zlib.DEFLATED, 31)
+        headers["Content-Encoding"] = "gzip"
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # the compressed representation is no longer byte-identical
+            headers["ETag"] = f"W/{etag}"
+        compressed = self._compress(message)
+        if more_body:
+            del headers["content-length"]
+        else:
+            headers["Content-Length"] = str(len(compressed["body"]))
+        await self.downstream(start)
+        await self.downstream(compressed)
+
+    def _compress(self, message: Message) -> Message:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        data = self.compressor.compress(body)
+        data += self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+        self.bytes_in += len(body)
+        self.bytes_out += len(data)
+        if not more_body:
+            self.middleware.stats.record(self.bytes_in, self.bytes_out)
+        return {"type": "http.response.body", "body": data, "more_body": more_body}
@@ -0,0 +1,26 @@
+"""Response classes for hot JSON endpoints."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON rendered by orjson when installed, skipping FastAPI's encoder pass.
+
+    Content must already be plain data (dicts, lists, str/int, datetimes); it is
+    not validated against a response model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
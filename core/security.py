@@ -1,14 +1,17 @@
-﻿from datetime import datetime, timedelta, timezone
+﻿import base64
+import hashlib
+import hmac
+import time
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import Optional
 
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
 from sqlmodel import Session
 
 from config import settings
+from core.tracing import span
 from db import get_session
 from models import User
 
@@ -25,28 +28,53 @@ class _AuthError(HTTPException):
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Return True when the provided password matches the stored bcrypt hash."""
 
+    import bcrypt
+
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 
 def get_password_hash(password: str) -> str:
     """Hash the provided password using bcrypt with a randomly generated salt."""
 
+    import bcrypt
+
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 
 def create_access_token(*, subject: int, expires_delta: Optional[timedelta] = None) -> str:
     """Create a signed JWT using the configured algorithm and expiry."""
 
+    from jose import jwt
+
     expire_delta = expires_delta or timedelta(minutes=settings.access_token_expire_minutes)
     expire = datetime.now(timezone.utc) + expire_delta
     payload = {"sub": str(subject), "exp": expire}
     return jwt.encode(payload, settings.secret_key, algorithm=settings.algorithm)
 
 
+def sign_asset(asset_id: str, fmt: str, expires: int) -> str:
+    """Sign an asset reference so it can be fetched without an Authorization header."""
+
+    message = f"{asset_id}:{fmt}:{expires}".encode("utf-8")
+    digest = hmac.new(settings.secret_key.encode("utf-8"), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode("ascii")
+
+
+def verify_asset_signature(asset_id: str, fmt: str, expires: int, signature: str) -> bool:
+    """Return True for an unexpired signature produced by :func:`sign_asset`."""
+
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_asset(asset_id, fmt, expires), signature)
+
+
 @lru_cache(maxsize=128)
 def _decode_access_token(token: str) -> dict:
     """Decode and cache JWT payloads to avoid repeated signature checks in a request."""
 
+    # python-jose pulls in the cryptography package, so it is loaded on first use
+    from jose import jwt
+
     return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
 
 
@@ -59,9 +87,18 @@ async def get_current_user(
     if not credentials:
         raise _AuthError("Not authenticated")
 
-    token = credentials.credentials
+    with span("auth"):
+        return get_user_from_token(credentials.credentials, session)
+
+
+def get_user_from_token(token: str, session: Session) -> User:
+    """Resolve a bearer token to its user, for callers outside the HTTP auth dependency."""
+
+    from jose import JWTError
+
     try:
-        payload = _decode_access_token(token)
+        with span("auth.jwt_decode"):
+            payload = _decode_access_token(token)
         subject = payload.get("sub")
         if subject is None:
             raise _AuthError("Invalid token payload")
@@ -69,7 +106,8 @@ async def get_current_user(
     except (JWTError, ValueError):
         raise _AuthError("Invalid token") from None
 
-    user = session.get(User, user_id)
+    with span("auth.user_fetch"):
+        user = session.get(User, user_id)
     if not user:
         raise _AuthError("User not found")
 
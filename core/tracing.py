@@ -0,0 +1,239 @@
+"""Lightweight per-request tracing.
+
+:class:`TracingMiddleware` opens a root span for every HTTP request and
+returns its id in the ``X-Trace-Id`` header. Code on the request path opens
+child spans with :func:`span`; the active span lives in a ``ContextVar``, so
+spans opened in threadpool dependencies and endpoints nest under the request
+without any argument passing. When the request finishes, the spans of a
+sampled trace are handed to the configured exporter.
+
+Only ``QR_FORGE_TRACE_SAMPLE_RATE`` of requests are sampled (0 disables
+tracing). Outside a sampled trace :func:`span` returns a shared no-op context
+manager, so instrumented code pays one ``ContextVar.get`` per span.
+
+Exporters implement ``export(spans)``. ``QR_FORGE_TRACE_EXPORTER=jsonl``
+appends one JSON object per span to ``QR_FORGE_TRACE_PATH`` for offline
+analysis; ``package.module:factory`` plugs in any other exporter.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+from anyio import to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "duration", "attributes")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.time() - self.start
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """Spans of one request; children may be appended from threadpool workers."""
+
+    def __init__(self, trace_id: str, sampled: bool) -> None:
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+
+    def open(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        opened = Span(self, name, parent.span_id if parent else None, attributes)
+        # list.append is atomic, so no lock is needed across threads
+        self.spans.append(opened)
+        return opened
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("qr_forge_span", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("parent", "name", "attributes", "span", "token")
+
+    def __init__(self, parent: Span, name: str, attributes: Dict[str, Any]) -> None:
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = self.parent.trace.open(self.name, self.parent, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.span.set(error=exc_type.__name__)
+        self.span.end()
+        _current.reset(self.token)
+
+
+def span(name: str, **attributes: Any):
+    """Context manager timing a child of the active span; yields ``None`` when not tracing."""
+
+    parent = _current.get()
+    if parent is None or not parent.trace.sampled:
+        return _NOOP
+    return _ActiveSpan(parent, name, attributes)
+
+
+def record(name: str, start: float, **attributes: Any) -> None:
+    """Add a finished span that began at ``start`` (``time.time()``) and ends now.
+
+    For work that cannot sit inside a ``with`` block, such as a streamed
+    response body whose chunks are produced in different threads.
+    """
+
+    parent = _current.get()
+    if parent is None or not parent.trace.sampled:
+        return
+    finished = parent.trace.open(name, parent, attributes)
+    finished.start = start
+    finished.end()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current.get()
+    return active.trace.trace_id if active else None
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: Sequence[Span]) -> None: ...
+
+
+class JsonLinesExporter:
+    """Append each span as one JSON line to a local file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        lines = "".join(json.dumps(item.as_dict(), default=str) + "\n" for item in spans)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(lines)
+
+
+def load_exporter(spec: str, path: str) -> Optional[SpanExporter]:
+    """``jsonl``, ``none`` or a ``package.module:factory`` called with no arguments."""
+
+    if not spec or spec == "none":
+        return None
+    if spec == "jsonl":
+        return JsonLinesExporter(Path(path))
+    module, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+
+@lru_cache(maxsize=1)
+def configured_exporter() -> Optional[SpanExporter]:
+    return load_exporter(settings.trace_exporter, settings.trace_path)
+
+
+class TracingMiddleware:
+    """Root span per HTTP request, ``X-Trace-Id`` on every response, export after the body is sent."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        sample_rate: Optional[float] = None,
+        exporter: Optional[SpanExporter] = None,
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # settings are read per request so they can change without rebuilding the app
+        rate = settings.trace_sample_rate if self.sample_rate is None else self.sample_rate
+        exporter = self.exporter or configured_exporter()
+        # a caller-supplied id lets a client correlate its own logs with the trace
+        incoming = Headers(scope=scope).get(TRACE_HEADER.lower(), "").lower()
+        trace = Trace(
+            incoming if _TRACE_ID.match(incoming) else secrets.token_hex(16),
+            sampled=exporter is not None and rate > 0 and random.random() < rate,
+        )
+        root = trace.open(f"{scope['method']} {scope['path']}", None, {})
+        token = _current.set(root)
+        status_code = 500
+
+        async def send_with_trace_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[TRACE_HEADER] = trace.trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current.reset(token)
+            root.end()
+            route = scope.get("route")
+            root.set(status=status_code, route=getattr(route, "path", scope["path"]))
+            if trace.sampled:
+                try:
+                    await to_thread.run_sync(exporter.export, trace.spans)
+                except Exception:
+                    logger.exception("Exporting trace %s failed", trace.trace_id)
@@ -1,7 +1,13 @@
+import os
 from collections.abc import Generator
 from typing import Any, Dict
 
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, create_engine
+
+from core.tracing import span
+from migrations import migrate
 
 DATABASE_URL = "sqlite:///qr.db"
 
@@ -10,11 +16,29 @@ connect_args: Dict[str, Any] = {}
 if DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+
+class TracedQueuePool(QueuePool):
+    """Times every checkout, including any wait for a free connection, as a ``db.checkout`` span.
+
+    Sessions check a connection out on first use, so the span only appears
+    for requests that actually query.
+    """
+
+    def connect(self):
+        with span("db.checkout"):
+            return super().connect()
+
+
+engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args, poolclass=TracedQueuePool)
+
+# each worker needs its own pool: a forked child must not reuse the parent's
+# connections, so drop them (without closing, the parent still owns them)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
 
 
-def init_db() -> None:
-    SQLModel.metadata.create_all(engine)
+def init_db(bind: Engine = engine) -> None:
+    migrate(bind)
 
 
 def get_session() -> Generator[Session, None, None]:
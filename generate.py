@@ -0,0 +1,490 @@
+"""Offline bulk generation of QR codes from a CSV or NDJSON file.
+
+    python -m generate urls.csv --out codes/
+    python -m generate urls.ndjson --out codes.zip --formats svg,png,pdf --workers 8
+
+Each row needs a ``url``. An optional ``name`` becomes the file stem (the row
+number otherwise; a name already used gets ``-<row number>`` appended), and ``foreground_color``, ``background_color``, ``size``,
+``padding``, ``border_radius`` and ``overlay_text`` override the command-line
+defaults for that row. Nothing touches the database or the web app; rows are
+rendered with the same ``services.qr`` code the API uses.
+
+Memory stays flat however long the input is: rows are streamed, dispatched
+to a process pool in chunks of ``--chunk-size`` with at most ``--max-inflight``
+chunks outstanding, and rendered chunks go through a bounded queue to a
+single writer thread. Chunks are written in input order and the checkpoint
+(``<out>.checkpoint``) records how many rows are on disk after each one, so
+``--resume`` skips straight past them after an interruption. A ZIP archive
+cut off by a crash has no central directory; resuming rebuilds it from the
+complete entries it still holds.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from services.qr import FORMATS, QRConfig, render_qr
+
+DEFAULT_CHUNK_SIZE = 64
+STYLE_FIELDS = ("foreground_color", "background_color", "size", "padding", "border_radius", "overlay_text")
+INT_FIELDS = ("size", "padding", "border_radius")
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+# stems of unnamed rows; a name that looks like one is treated as taken
+_ROW_STEM = re.compile(r"\d{6,}")
+# signature, version, flags, method, time, date, crc32, compressed size, size, name length, extra length
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+Row = Tuple[str, QRConfig]
+
+
+@dataclass
+class ChunkResult:
+    index: int
+    rows: int
+    # (file name, bytes) in input order
+    files: List[Tuple[str, bytes]] = field(default_factory=list)
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+    # seconds spent per stage in the worker: "encode" and one entry per format
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class GenerateStats:
+    rows: int = 0
+    skipped: int = 0
+    codes: int = 0
+    files: int = 0
+    bytes: int = 0
+    failed: int = 0
+    # named rows whose name was already used, written as "<name>-<row>"
+    renamed: int = 0
+    seconds: float = 0.0
+    codes_per_second: float = 0.0
+    # summed over workers, so they can exceed the wall time
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data["seconds"] = round(self.seconds, 3)
+        data["codes_per_second"] = round(self.codes_per_second, 1)
+        data["stage_seconds"] = {name: round(value, 3) for name, value in self.stage_seconds.items()}
+        return data
+
+
+def read_rows(path: Path) -> Iterator[Dict[str, str]]:
+    """Stream rows from a CSV file with a header, or from NDJSON (``.ndjson`` / ``.jsonl``)."""
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.suffix.lower() in (".ndjson", ".jsonl"):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(handle)
+
+
+class UniqueNames:
+    """Hands out a distinct file stem per row.
+
+    Only explicit names are remembered, so memory grows with the named rows
+    alone; unnamed rows use their zero-padded row number, which is unique.
+    """
+
+    def __init__(self) -> None:
+        self.taken: Set[str] = set()
+        self.renamed = 0
+
+    def claim(self, name: str, number: int) -> str:
+        if not name:
+            return f"{number:06d}"
+        stem = name
+        while stem in self.taken or _ROW_STEM.fullmatch(stem):
+            stem = f"{stem}-{number}"
+        if stem != name:
+            self.renamed += 1
+        self.taken.add(stem)
+        return stem
+
+
+def _row_name(row: Dict[str, str]) -> str:
+    return _UNSAFE_NAME.sub("_", str(row.get("name") or "")).strip("._")
+
+
+def row_config(
+    row: Dict[str, str], number: int, defaults: Dict[str, object], names: Optional[UniqueNames] = None
+) -> Row:
+    """``(file stem, config)`` for one input row; raises ``ValueError`` for unusable rows.
+
+    Pass the run's ``names`` to keep stems unique; the name is claimed before
+    the row is validated, so a resumed run names the remaining rows the same way.
+    """
+
+    stem = (names or UniqueNames()).claim(_row_name(row), number)
+    url = (row.get("url") or "").strip()
+    if not url:
+        raise ValueError("missing url")
+    values = dict(defaults)
+    for name in STYLE_FIELDS:
+        value = row.get(name)
+        if value not in (None, ""):
+            values[name] = int(value) if name in INT_FIELDS else str(value)
+    return stem, QRConfig(url=url, **values)
+
+
+def render_chunk(index: int, rows: Sequence[Tuple[int, Optional[Row], str]], formats: Tuple[str, ...]) -> ChunkResult:
+    """Render one chunk in a pool worker. ``rows`` holds ``(number, row, error)`` triples."""
+
+    result = ChunkResult(index=index, rows=len(rows), stages={"encode": 0.0, **{fmt: 0.0 for fmt in formats}})
+    for number, row, error in rows:
+        if row is None:
+            result.failures.append((f"row {number}", error))
+            continue
+        stem, config = row
+        try:
+            render = render_qr(config)
+            started = time.perf_counter()
+            render.matrix
+            result.stages["encode"] += time.perf_counter() - started
+            outputs = []
+            for fmt in formats:
+                started = time.perf_counter()
+                outputs.append((f"{stem}.{fmt}", render.get(fmt)))
+                result.stages[fmt] += time.perf_counter() - started
+        except Exception as exc:  # one bad row must not sink the batch
+            result.failures.append((f"row {number}", f"{type(exc).__name__}: {exc}"))
+            continue
+        result.files.extend(outputs)
+    return result
+
+
+def _local_entries(handle) -> Iterator[Tuple[str, bytes, int]]:
+    """``(name, data, compression)`` of each complete entry, read through the local headers.
+
+    Stops at the first truncated or corrupt entry, which is where a crash cut
+    the archive off, or at the central directory of a closed archive.
+    """
+
+    while True:
+        header = handle.read(_LOCAL_HEADER.size)
+        if len(header) < _LOCAL_HEADER.size:
+            return
+        signature, _, flags, method, _, _, crc, size, _, name_length, extra_length = _LOCAL_HEADER.unpack(header)
+        # sizes trail the data when bit 3 is set; seekable writes never do that
+        if signature != _LOCAL_SIGNATURE or flags & 0x08 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return
+        name = handle.read(name_length)
+        handle.read(extra_length)
+        data = handle.read(size)
+        if len(name) < name_length or len(data) < size:
+            return
+        if method == zipfile.ZIP_DEFLATED:
+            try:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+            except zlib.error:
+                return
+        if zlib.crc32(data) != crc:
+            return
+        yield name.decode("utf-8" if flags & 0x800 else "cp437"), data, method
+
+
+def recover_zip(path: Path) -> int:
+    """Make ``path`` a readable archive again and return how many entries it holds.
+
+    The central directory is only written when an archive is closed, so after
+    a crash the file cannot be opened, and append mode would start a second
+    archive after the old bytes, hiding every entry already written. The
+    complete entries are copied into a fresh archive instead.
+    """
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return len(archive.namelist())
+    except zipfile.BadZipFile:
+        pass
+    temp = path.with_name(path.name + ".tmp")
+    kept = 0
+    with open(path, "rb") as source, zipfile.ZipFile(temp, "w") as rebuilt:
+        for name, data, compression in _local_entries(source):
+            rebuilt.writestr(name, data, compress_type=compression)
+            kept += 1
+    os.replace(temp, path)
+    return kept
+
+
+class OutputSink:
+    """Directory or ZIP archive the writer thread stores files in."""
+
+    def __init__(self, out: Path, *, resume: bool) -> None:
+        self.out = out
+        self.archive: Optional[zipfile.ZipFile] = None
+        self._handle = None
+        if out.suffix.lower() == ".zip":
+            out.parent.mkdir(parents=True, exist_ok=True)
+            if resume and out.exists():
+                recover_zip(out)
+                self._handle = open(out, "r+b")
+                self.archive = zipfile.ZipFile(self._handle, "a")
+            else:
+                self._handle = open(out, "w+b")
+                self.archive = zipfile.ZipFile(self._handle, "w")
+            # a chunk written just before a crash may be rendered again
+            self.names = set(self.archive.namelist())
+        else:
+            out.mkdir(parents=True, exist_ok=True)
+
+    def write(self, name: str, data: bytes) -> None:
+        if self.archive is None:
+            temp = self.out / f".{name}.tmp"
+            temp.write_bytes(data)
+            os.replace(temp, self.out / name)
+            return
+        if name in self.names:
+            return
+        # PNG/WebP are already compressed
+        compression = zipfile.ZIP_DEFLATED if name.endswith((".svg", ".eps", ".pdf")) else zipfile.ZIP_STORED
+        self.archive.writestr(name, data, compress_type=compression)
+        self.names.add(name)
+
+    def sync(self) -> None:
+        """Hand buffered archive bytes to the OS, so a checkpoint never covers entries a crash could lose."""
+
+        if self._handle is not None:
+            self._handle.flush()
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+            self._handle.close()
+
+
+class Checkpoint:
+    """Number of input rows fully written, persisted atomically next to the output."""
+
+    def __init__(self, path: Path, source: Path) -> None:
+        self.path = path
+        self.source = str(source)
+
+    def load(self) -> int:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        return int(data.get("rows", 0)) if data.get("input") == self.source else 0
+
+    def save(self, rows: int) -> None:
+        temp = self.path.with_name(self.path.name + ".tmp")
+        temp.write_text(json.dumps({"input": self.source, "rows": rows}), encoding="utf-8")
+        os.replace(temp, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class BoundedWriter:
+    """Writer thread fed through a queue of at most ``max_chunks`` rendered chunks.
+
+    ``put`` blocks while the queue is full, which stops the dispatcher from
+    collecting (and so submitting) more work until the disk catches up.
+    """
+
+    def __init__(self, sink: OutputSink, checkpoint: Checkpoint, *, done_rows: int, max_chunks: int) -> None:
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.done_rows = done_rows
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue[Optional[ChunkResult]]" = queue.Queue(maxsize=max_chunks)
+        self._thread = threading.Thread(target=self._run, name="generate-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, result: ChunkResult) -> None:
+        if self.error is not None:
+            raise self.error
+        self._queue.put(result)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        while True:
+            result = self._queue.get()
+            if result is None:
+                return
+            if self.error is not None:
+                continue  # drain so put() never blocks forever
+            try:
+                started = time.perf_counter()
+                for name, data in result.files:
+                    self.sink.write(name, data)
+                    self.files += 1
+                    self.bytes += len(data)
+                self.sink.sync()
+                self.done_rows += result.rows
+                self.checkpoint.save(self.done_rows)
+                self.seconds += time.perf_counter() - started
+            except BaseException as exc:
+                self.error = exc
+
+
+def _chunks(
+    rows: Iterator[Dict[str, str]], start: int, size: int, defaults: Dict[str, object], names: UniqueNames
+) -> Iterator[List[Tuple[int, Optional[Row], str]]]:
+    numbered = enumerate(rows, start=1)
+    for number, raw in itertools.islice(numbered, start):
+        # rows already written still claim their names, so the rest are named as in the first run
+        names.claim(_row_name(raw), number)
+    names.renamed = 0
+    while True:
+        chunk = []
+        for number, raw in itertools.islice(numbered, size):
+            try:
+                chunk.append((number, row_config(raw, number, defaults, names), ""))
+            except (ValueError, TypeError) as exc:
+                chunk.append((number, None, str(exc)))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generate(
+    source: Path,
+    out: Path,
+    *,
+    formats: Tuple[str, ...] = ("svg", "png"),
+    defaults: Optional[Dict[str, object]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_inflight: Optional[int] = None,
+    resume: bool = False,
+    on_failure: Optional[Callable[[str, str], None]] = None,
+) -> GenerateStats:
+    """Render every row of ``source`` into ``out`` (a directory, or a ``.zip`` file)."""
+
+    defaults = {
+        "foreground_color": "#000000",
+        "background_color": "#FFFFFF",
+        "size": 512,
+        "padding": 16,
+        "border_radius": 0,
+        **(defaults or {}),
+    }
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or workers * 2
+    checkpoint = Checkpoint(out.with_name(out.name + ".checkpoint"), source)
+    start = checkpoint.load() if resume else 0
+    stats = GenerateStats(skipped=start, stage_seconds={"encode": 0.0, **{fmt: 0.0 for fmt in formats}})
+
+    started = time.perf_counter()
+    sink = OutputSink(out, resume=resume)
+    writer = BoundedWriter(sink, checkpoint, done_rows=start, max_chunks=max_inflight)
+    pending: Deque["Future[ChunkResult]"] = deque()
+    names = UniqueNames()
+
+    def collect(future: "Future[ChunkResult]") -> None:
+        result = future.result()
+        stats.rows += result.rows
+        stats.codes += result.rows - len(result.failures)
+        stats.failed += len(result.failures)
+        for name, seconds in result.stages.items():
+            stats.stage_seconds[name] += seconds
+        if on_failure is not None:
+            for where, error in result.failures:
+                on_failure(where, error)
+        writer.put(result)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for index, chunk in enumerate(_chunks(read_rows(source), start, chunk_size, defaults, names)):
+                # collect in submission order so the checkpoint only ever covers a written prefix
+                while len(pending) >= max_inflight:
+                    collect(pending.popleft())
+                pending.append(pool.submit(render_chunk, index, chunk, formats))
+            while pending:
+                collect(pending.popleft())
+    finally:
+        for future in pending:
+            future.cancel()
+        writer.close()
+        sink.close()
+
+    checkpoint.clear()
+    stats.files, stats.bytes = writer.files, writer.bytes
+    stats.renamed = names.renamed
+    stats.stage_seconds["write"] = writer.seconds
+    stats.seconds = time.perf_counter() - started
+    stats.codes_per_second = stats.codes / stats.seconds if stats.seconds else 0.0
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m generate", description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path, help="CSV with a header row, or .ndjson/.jsonl")
+    parser.add_argument("--out", type=Path, required=True, help="output directory, or a .zip file")
+    parser.add_argument("--formats", default="svg,png", help=f"comma-separated, from {','.join(FORMATS)}")
+    parser.add_argument("--foreground-color", default="#000000")
+    parser.add_argument("--background-color", default="#FFFFFF")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--padding", type=int, default=16)
+    parser.add_argument("--border-radius", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per task")
+    parser.add_argument("--max-inflight", type=int, default=None, help="chunks outstanding (default: 2 per worker)")
+    parser.add_argument("--resume", action="store_true", help="skip rows the checkpoint says are written")
+    parser.add_argument("--verbose", action="store_true", help="print each failed row")
+    parser.add_argument("--json", action="store_true", help="print the stats as JSON")
+    args = parser.parse_args(argv)
+
+    formats = tuple(fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip())
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        parser.error(f"unknown format(s): {', '.join(unknown) or args.formats}")
+
+    stats = generate(
+        args.input,
+        args.out,
+        formats=formats,
+        defaults={
+            "foreground_color": args.foreground_color,
+            "background_color": args.background_color,
+            "size": args.size,
+            "padding": args.padding,
+            "border_radius": args.border_radius,
+        },
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        max_inflight=args.max_inflight,
+        resume=args.resume,
+        on_failure=(lambda where, error: print(f"{where}: {error}")) if args.verbose else None,
+    )
+    if args.json:
+        print(json.dumps(stats.as_dict(), indent=2))
+    else:
+        for key, value in stats.as_dict().items():
+            print(f"{key}: {value}")
+    return 0 if not stats.failed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
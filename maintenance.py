@@ -0,0 +1,317 @@
+"""Consistency checks and garbage collection for stored QR assets.
+
+Run ``python -m maintenance`` for a read-only report, or add
+``--remove-orphans`` / ``--regenerate-missing`` to repair. Directories are
+walked with ``os.scandir`` and the database is read in keyset-paginated
+batches, so memory stays bounded by ``--batch-size`` regardless of how many
+files or rows exist. The one exception is the set of file names owned by
+items saved before assets were shared; no new rows of that kind are written.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PureWindowsPath
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from models import ASSET_PENDING, ASSET_READY, Asset, QRItem
+from services.qr import QRRender, address_qr_assets, render_qr
+from storage import PNG_DIR, SVG_DIR, asset_writer, item_config
+
+DEFAULT_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GCReport:
+    scanned_files: int = 0
+    orphaned_files: int = 0
+    orphaned_bytes: int = 0
+    removed_files: int = 0
+    checked_assets: int = 0
+    missing_assets: int = 0
+    regenerated_assets: int = 0
+    disk_usage: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _iter_batches(directory: Path, batch_size: int) -> Iterator[List[Tuple[str, int, float]]]:
+    """Yield ``(path, size, mtime)`` batches for regular files in ``directory``."""
+
+    if not directory.is_dir():
+        return
+    batch: List[Tuple[str, int, float]] = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            batch.append((str(directory / entry.name), stat.st_size, stat.st_mtime))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _file_name(path: str) -> str:
+    # paths saved on Windows use backslashes; PureWindowsPath splits on both separators
+    return PureWindowsPath(path).name
+
+
+def _legacy_names(bind: Engine, column_name: str, batch_size: int) -> Set[str]:
+    """File names that items saved before assets were shared point at, read by id in batches."""
+
+    column = getattr(QRItem, column_name)
+    names: Set[str] = set()
+    last_id = 0
+    while True:
+        with Session(bind) as session:
+            rows = session.exec(
+                select(QRItem.id, column)
+                .where(QRItem.asset_id.is_(None), QRItem.id > last_id)
+                .order_by(QRItem.id)
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            return names
+        last_id = rows[-1][0]
+        names.update(_file_name(path) for _, path in rows if path)
+
+
+def _referenced(session: Session, column_name: str, names: List[str], legacy: Set[str]) -> set:
+    """The file names in ``names`` that an asset or a legacy item still points at.
+
+    Files are matched by name, never by the stored path: stored paths are
+    relative to the app's working directory, so comparing them with the swept
+    directory's spelling would call every live file an orphan.
+    """
+
+    stems = [name.rpartition(".")[0] for name in names]
+    # shared assets are named after their id, so the primary key finds them
+    paths = session.exec(select(getattr(Asset, column_name)).where(Asset.id.in_(stems))).all()
+    return {_file_name(path) for path in paths if path} | (legacy & set(names))
+
+
+def _sweep_directory(
+    bind: Engine,
+    directory: Path,
+    column_name: str,
+    report: GCReport,
+    *,
+    remove: bool,
+    batch_size: int,
+    grace_seconds: int,
+    on_orphan: Optional[Callable[[str], None]],
+) -> None:
+    usage = 0
+    # files younger than the grace period may belong to a create that has not committed yet
+    cutoff = time.time() - grace_seconds
+    legacy = _legacy_names(bind, column_name, batch_size)
+    for batch in _iter_batches(directory, batch_size):
+        with Session(bind) as session:
+            referenced = _referenced(session, column_name, [Path(path).name for path, _, _ in batch], legacy)
+        for path, size, mtime in batch:
+            report.scanned_files += 1
+            usage += size
+            if Path(path).name in referenced or mtime > cutoff:
+                continue
+            report.orphaned_files += 1
+            report.orphaned_bytes += size
+            if on_orphan:
+                on_orphan(path)
+            if remove:
+                Path(path).unlink(missing_ok=True)
+                report.removed_files += 1
+                usage -= size
+    report.disk_usage[str(directory)] = usage
+
+
+def _write_missing(key: str, render: QRRender, svg_path: Optional[str], png_path: Optional[str]) -> Future:
+    """Queue the missing files on the asset writer so they land atomically like any other write."""
+
+    files = {
+        Path(path): render.get(fmt)
+        for path, fmt in ((svg_path, "svg"), (png_path, "png"))
+        if path and not Path(path).exists()
+    }
+    return asset_writer.write(key, files)
+
+
+def _written(future: Future) -> bool:
+    try:
+        future.result()
+    except OSError:
+        return False  # the writer has logged it; the next run tries again
+    return True
+
+
+def _check_assets(bind: Engine, report: GCReport, *, regenerate: bool, batch_size: int) -> None:
+    last_id = ""
+    while True:
+        with Session(bind) as session:
+            assets = session.exec(
+                select(Asset).where(Asset.id > last_id).order_by(Asset.id).limit(batch_size)
+            ).all()
+            if not assets:
+                return
+            last_id = assets[-1].id
+            ready = []
+            repairs: List[Tuple[str, Future]] = []
+            for asset in assets:
+                report.checked_assets += 1
+                paths = (asset.svg_path, asset.png_path)
+                if any(asset_writer.pending_bytes(path) is not None for path in paths):
+                    continue  # still queued on the asset writer
+                if Path(asset.svg_path).exists() and Path(asset.png_path).exists():
+                    if asset.status == ASSET_PENDING:
+                        ready.append(asset.id)  # written before a restart lost the callback
+                    continue
+                report.missing_assets += 1
+                if not regenerate:
+                    continue
+                owner = session.exec(select(QRItem).where(QRItem.asset_id == asset.id).limit(1)).first()
+                if owner is None:
+                    continue
+                render = render_qr(item_config(owner), shared=True)
+                files = address_qr_assets(
+                    render, svg_dir=Path(asset.svg_path).parent, png_dir=Path(asset.png_path).parent
+                )
+                if files.digest != asset.id:
+                    # the renderer has changed since; files under this name must hold the original bytes
+                    logger.warning("Item %s no longer renders asset %s; leaving it missing", owner.id, asset.id)
+                    continue
+                repairs.append((asset.id, _write_missing(asset.id, render, asset.svg_path, asset.png_path)))
+            for asset_id, future in repairs:
+                if _written(future):
+                    ready.append(asset_id)
+                    report.regenerated_assets += 1
+            if ready:
+                session.exec(update(Asset).where(Asset.id.in_(ready)).values(status=ASSET_READY))
+                session.commit()
+
+
+def _check_legacy_items(bind: Engine, report: GCReport, *, regenerate: bool, batch_size: int) -> None:
+    """Check items saved before assets were shared; each owns its own files."""
+
+    last_id = 0
+    while True:
+        with Session(bind) as session:
+            items = session.exec(
+                select(QRItem)
+                .where(QRItem.asset_id.is_(None), QRItem.id > last_id)
+                .order_by(QRItem.id)
+                .limit(batch_size)
+            ).all()
+        if not items:
+            return
+        last_id = items[-1].id
+        repairs: List[Future] = []
+        for item in items:
+            report.checked_assets += 1
+            paths = [path for path in (item.svg_path, item.png_path) if path]
+            if all(Path(path).exists() for path in paths):
+                continue
+            report.missing_assets += 1
+            if regenerate:
+                render = render_qr(item_config(item), shared=True)
+                repairs.append(_write_missing(f"item-{item.id}", render, item.svg_path, item.png_path))
+        for future in repairs:
+            if _written(future):
+                report.regenerated_assets += 1
+
+
+def collect_garbage(
+    bind: Engine,
+    *,
+    svg_dir: Path = SVG_DIR,
+    png_dir: Path = PNG_DIR,
+    remove: bool = False,
+    regenerate: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    grace_seconds: int = 300,
+    on_orphan: Optional[Callable[[str], None]] = None,
+) -> GCReport:
+    """Report (and optionally repair) orphaned files and missing assets."""
+
+    report = GCReport()
+    for directory, column_name in ((svg_dir, "svg_path"), (png_dir, "png_path")):
+        _sweep_directory(
+            bind,
+            directory,
+            column_name,
+            report,
+            remove=remove,
+            batch_size=batch_size,
+            grace_seconds=grace_seconds,
+            on_orphan=on_orphan,
+        )
+    _check_assets(bind, report, regenerate=regenerate, batch_size=batch_size)
+    _check_legacy_items(bind, report, regenerate=regenerate, batch_size=batch_size)
+    return report
+
+
+async def run_periodic_gc(bind: Engine, *, interval_seconds: float, grace_seconds: int) -> None:
+    """Repair asset storage every ``interval_seconds`` until cancelled."""
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            report = await asyncio.to_thread(
+                collect_garbage, bind, remove=True, regenerate=True, grace_seconds=grace_seconds
+            )
+        except Exception:
+            logger.exception("Asset garbage collection failed")
+            continue
+        logger.info("Asset garbage collection finished: %s", report.as_dict())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m maintenance", description=__doc__.splitlines()[0])
+    parser.add_argument("--remove-orphans", action="store_true", help="delete files no row references")
+    parser.add_argument("--regenerate-missing", action="store_true", help="re-render assets whose files are gone")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--grace-seconds", type=int, default=300, help="ignore files newer than this")
+    parser.add_argument("--svg-dir", type=Path, default=SVG_DIR)
+    parser.add_argument("--png-dir", type=Path, default=PNG_DIR)
+    parser.add_argument("--verbose", action="store_true", help="print each orphaned path")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    from db import engine, init_db
+
+    init_db()
+    report = collect_garbage(
+        engine,
+        svg_dir=args.svg_dir,
+        png_dir=args.png_dir,
+        remove=args.remove_orphans,
+        regenerate=args.regenerate_missing,
+        batch_size=args.batch_size,
+        grace_seconds=args.grace_seconds,
+        on_orphan=print if args.verbose else None,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        for key, value in report.as_dict().items():
+            print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
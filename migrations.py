@@ -0,0 +1,141 @@
+"""Versioned schema migrations for the SQLite database.
+
+The schema version lives in ``PRAGMA user_version``. :func:`migrate` applies
+every migration newer than that version in order and bumps the version after
+each one, so an existing ``qr.db`` picks up new columns and indexes on the
+next start. Migrations must be safe to re-run (SQLite DDL is not always
+transactional here), and new ones are appended to ``MIGRATIONS``; never edit
+or reorder the ones already shipped.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+
+import models  # registers every table on SQLModel.metadata
+
+Migration = Callable[[Connection], None]
+MIGRATIONS: List[Migration] = []
+
+
+def migration(func: Migration) -> Migration:
+    MIGRATIONS.append(func)
+    return func
+
+
+def schema_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar_one()
+
+
+@migration
+def _baseline(conn: Connection) -> None:
+    """Create missing tables and add the columns introduced before versioning.
+
+    Only nullable columns or columns with a server default can be added in place.
+    """
+
+    SQLModel.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = column.type.compile(dialect=conn.dialect)
+            if column.server_default is not None:
+                definition += f" DEFAULT {column.server_default.arg} NOT NULL"
+            elif not column.nullable:
+                continue
+            conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {definition}')
+        for index in table.indexes:
+            # reflection skips expression indexes, so checkfirst=True cannot be trusted
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+@migration
+def _query_indexes(conn: Connection) -> None:
+    """Indexes shaped like the history, export and login queries."""
+
+    # history, export and signed links: WHERE user_id = ? ORDER BY created_at DESC
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_qr_items_user_created ON qr_items (user_id, created_at DESC)"
+    )
+    # the composite index covers every lookup the single-column one served
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_qr_items_user_id")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))")
+
+
+@migration
+def _asset_status(conn: Connection) -> None:
+    """Track whether an asset's files have been written yet."""
+
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(assets)")}
+    if "status" not in columns:
+        conn.exec_driver_sql("ALTER TABLE assets ADD COLUMN status VARCHAR(16) DEFAULT 'ready' NOT NULL")
+
+
+@migration
+def _item_logo(conn: Connection) -> None:
+    """Centre logos for branded codes."""
+
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(qr_items)")}
+    if "logo_id" not in columns:
+        conn.exec_driver_sql("ALTER TABLE qr_items ADD COLUMN logo_id VARCHAR(64)")
+
+
+@migration
+def _asset_matrix(conn: Connection) -> None:
+    """Keep the encoded matrix next to each asset."""
+
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(assets)")}
+    if "matrix" not in columns:
+        conn.exec_driver_sql("ALTER TABLE assets ADD COLUMN matrix BLOB")
+
+
+@migration
+def _search_index(conn: Connection) -> None:
+    """FTS5 index over item titles and URLs, backfilled from existing rows."""
+
+    for statement in models.SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(f"INSERT INTO {models.SEARCH_TABLE} ({models.SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+@migration
+def _user_usage(conn: Connection) -> None:
+    """Per-user usage counters, backfilled from the existing items.
+
+    Assets written before this migration have no recorded sizes and count as zero bytes.
+    """
+
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(assets)")}
+    for column in ("svg_bytes", "png_bytes"):
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE assets ADD COLUMN {column} INTEGER")
+    models.UserUsage.__table__.create(conn, checkfirst=True)
+    conn.exec_driver_sql(
+        """INSERT OR IGNORE INTO user_usage
+            (user_id, item_count, svg_bytes, png_bytes, renders_today, renders_day, updated_at)
+        SELECT qr_items.user_id, count(*), coalesce(sum(assets.svg_bytes), 0), coalesce(sum(assets.png_bytes), 0),
+            0, date('now'), datetime('now')
+        FROM qr_items LEFT JOIN assets ON assets.id = qr_items.asset_id
+        GROUP BY qr_items.user_id"""
+    )
+
+
+def migrate(bind: Engine) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+
+    with bind.connect() as conn:
+        version = schema_version(conn)
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        with bind.begin() as conn:
+            step(conn)
+            # PRAGMA does not take bound parameters; number is an int from enumerate
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+    return max(version, len(MIGRATIONS))
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Optional
 
 from pydantic import EmailStr
+from sqlalchemy import DDL, Column, Index, LargeBinary, event, func
 from sqlmodel import Field, SQLModel
 
 
+ASSET_PENDING = "pending"
+ASSET_READY = "ready"
+
+
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -22,11 +27,46 @@ class User(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=utcnow)
 
 
+class Asset(SQLModel, table=True):
+    """Rendered SVG/PNG pair shared by every QR item with identical output."""
+
+    __tablename__ = "assets"
+
+    id: str = Field(primary_key=True, max_length=64)
+    config_hash: str = Field(index=True, max_length=64)
+    svg_path: str
+    png_path: str
+    refcount: int = Field(default=0)
+    # pending until the asset writer has renamed both files into place
+    status: str = Field(default=ASSET_READY, max_length=16, sa_column_kwargs={"server_default": ASSET_READY})
+    # bit-packed QRMatrix, so style-only edits skip encoding
+    matrix: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    # byte sizes of the two files, so usage is tracked without stat() calls
+    svg_bytes: Optional[int] = Field(default=None)
+    png_bytes: Optional[int] = Field(default=None)
+    created_at: datetime = Field(default_factory=utcnow)
+
+
+class UserUsage(SQLModel, table=True):
+    """Running totals per user, updated in the same transaction as the items they count."""
+
+    __tablename__ = "user_usage"
+
+    user_id: int = Field(primary_key=True, foreign_key="users.id")
+    item_count: int = Field(default=0)
+    svg_bytes: int = Field(default=0)
+    png_bytes: int = Field(default=0)
+    # renders_today counts renders on renders_day; an older day means none yet today
+    renders_today: int = Field(default=0)
+    renders_day: date = Field(default_factory=lambda: utcnow().date())
+    updated_at: datetime = Field(default_factory=utcnow)
+
+
 class QRItem(SQLModel, table=True):
     __tablename__ = "qr_items"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="users.id", index=True)
+    user_id: int = Field(foreign_key="users.id")
     title: Optional[str] = Field(default=None, max_length=200)
     url: str
     foreground_color: str = Field(default="#000000", max_length=7)
@@ -35,7 +75,39 @@ class QRItem(SQLModel, table=True):
     padding: int = Field(default=10, ge=0, le=80)
     border_radius: int = Field(default=0, ge=0, le=60)
     overlay_text: Optional[str] = Field(default=None, max_length=4)
+    logo_id: Optional[str] = Field(default=None, max_length=64)
     svg_path: str
     png_path: Optional[str] = Field(default=None)
+    asset_id: Optional[str] = Field(default=None, foreign_key="assets.id", index=True)
+    slug: Optional[str] = Field(default=None, max_length=16, unique=True, index=True)
+    scan_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     created_at: datetime = Field(default_factory=utcnow, index=True)
     updated_at: datetime = Field(default_factory=utcnow)
+
+
+# keep in step with migrations._query_indexes, which adds these to existing databases
+Index("ix_qr_items_user_created", QRItem.__table__.c.user_id, QRItem.__table__.c.created_at.desc())
+Index("ix_users_email_lower", func.lower(User.__table__.c.email))
+
+# Full-text index over title and url. It is an external-content FTS5 table: it
+# stores only the index, reads the text back from qr_items, and the triggers
+# below keep it in step with every insert, update and delete.
+SEARCH_TABLE = "qr_items_fts"
+SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, url, content='qr_items', content_rowid='id', tokenize='unicode61')""",
+    f"""CREATE TRIGGER IF NOT EXISTS qr_items_fts_insert AFTER INSERT ON qr_items BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, url) VALUES (new.id, new.title, new.url);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS qr_items_fts_delete AFTER DELETE ON qr_items BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS qr_items_fts_update AFTER UPDATE OF title, url ON qr_items BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+        INSERT INTO {SEARCH_TABLE} (rowid, title, url) VALUES (new.id, new.title, new.url);
+    END""",
+)
+# create_all sets these up with the table; migrations._search_index adds them to existing databases
+for _statement in SEARCH_DDL:
+    event.listen(QRItem.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(QRItem.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}").execute_if(dialect="sqlite"))
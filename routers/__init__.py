@@ -1,3 +1,3 @@
-from . import auth, export, qr, user
+from . import auth, export, qr, redirect, user
 
-__all__ = ["auth", "export", "qr", "user"]
+__all__ = ["auth", "export", "qr", "redirect", "user"]
@@ -1,6 +1,7 @@
 ﻿from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
 from sqlmodel import Session, select
 
 from core.security import create_access_token, get_password_hash, verify_password
@@ -22,7 +23,7 @@ def signup(payload: UserCreate, session: Session = Depends(get_session)) -> User
     if len(payload.password) < 8:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password must be at least 8 characters long")
     normalized_email = payload.email.lower()
-    existing = session.exec(select(User).where(User.email == normalized_email)).first()
+    existing = session.exec(select(User).where(func.lower(User.email) == normalized_email)).first()
     if existing:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
@@ -47,8 +48,8 @@ def signup(payload: UserCreate, session: Session = Depends(get_session)) -> User
     response_description="Bearer token for subsequent requests",
 )
 def login(payload: UserLogin, session: Session = Depends(get_session)) -> Token:
-    normalized_email = payload.email.lower()
-    user = session.exec(select(User).where(User.email == normalized_email)).first()
+    # matches through ix_users_email_lower, including rows stored before emails were normalised
+    user = session.exec(select(User).where(func.lower(User.email) == payload.email.lower())).first()
     if not user or not verify_password(payload.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
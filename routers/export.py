@@ -1,19 +1,42 @@
 ﻿import csv
 import io
+import time
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, List
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 
 from core.security import get_current_user
+from core.tracing import record
 from db import get_session
 from models import QRItem, User
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
 
+EXPORT_BATCH_SIZE = 500
+CSV_HEADER = [
+    "title",
+    "url",
+    "created_at",
+    "foreground_color",
+    "background_color",
+    "size",
+    "padding",
+    "border_radius",
+    "svg_file",
+    "png_file",
+]
+
+
+def _csv_chunk(rows: List[list]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+
 @router.get(
     "/csv",
     summary="Export the authenticated user's QR history as CSV",
@@ -23,48 +46,65 @@ def export_csv(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ) -> StreamingResponse:
-    rows = session.exec(
-        select(QRItem).where(QRItem.user_id == current_user.id).order_by(QRItem.created_at.desc())
-    ).all()
-
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(
-        [
-            "title",
-            "url",
-            "created_at",
-            "foreground_color",
-            "background_color",
-            "size",
-            "padding",
-            "border_radius",
-            "svg_file",
-            "png_file",
-        ]
-    )
-    for r in rows:
-        writer.writerow(
-            [
-                r.title,
-                r.url,
-                r.created_at.isoformat(),
-                r.foreground_color,
-                r.background_color,
-                r.size,
-                r.padding,
-                r.border_radius,
-                Path(r.svg_path).name if r.svg_path else "",
-                Path(r.png_path).name if r.png_path else "",
-            ]
+    statement = (
+        select(
+            QRItem.title,
+            QRItem.url,
+            QRItem.created_at,
+            QRItem.foreground_color,
+            QRItem.background_color,
+            QRItem.size,
+            QRItem.padding,
+            QRItem.border_radius,
+            QRItem.svg_path,
+            QRItem.png_path,
         )
-    buf.seek(0)
+        .where(QRItem.user_id == current_user.id)
+        .order_by(QRItem.created_at.desc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    # the dependency's session is closed before the body streams, so the
+    # generator reads through a session of its own and always closes it
+    bind = session.get_bind()
 
-    def iter_buf() -> Iterable[str]:
-        yield buf.read()
+    # rows are fetched and written in batches so large histories stream instead of buffering
+    def iter_csv() -> Iterable[str]:
+        # chunks are produced on different threadpool threads, so the span is recorded at the end
+        started = time.time()
+        rows = 0
+        yield _csv_chunk([CSV_HEADER])
+        batch = []
+        export_session = Session(bind)
+        try:
+            for r in export_session.exec(statement):
+                rows += 1
+                batch.append(
+                    [
+                        r.title,
+                        r.url,
+                        r.created_at.isoformat(),
+                        r.foreground_color,
+                        r.background_color,
+                        r.size,
+                        r.padding,
+                        r.border_radius,
+                        Path(r.svg_path).name if r.svg_path else "",
+                        Path(r.png_path).name if r.png_path else "",
+                    ]
+                )
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    yield _csv_chunk(batch)
+                    batch = []
+        finally:
+            # also runs when the client disconnects and the generator is closed mid-stream
+            export_session.close()
+        if batch:
+            yield _csv_chunk(batch)
+        record("export.csv", started, rows=rows)
 
     return StreamingResponse(
-        iter_buf(),
+        iter_csv(),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=qr_history.csv"},
     )
@@ -1,22 +1,80 @@
-﻿from datetime import datetime, timezone
+﻿import asyncio
+import base64
+import binascii
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi import Path as PathParam
+from fastapi.responses import FileResponse, Response
+from pydantic import HttpUrl, ValidationError
 from sqlmodel import Session, select
 
-from core.security import get_current_user
+from config import settings
+from core.responses import FastJSONResponse
+from core.security import get_current_user, get_user_from_token, sign_asset, verify_asset_signature
 from db import get_session
-from models import QRItem, User
-from schemas import QRCreate, QRPreviewResponse
-from services.qr import QRConfig, encode_render, generate_qr_assets, render_qr
+from models import Asset, QRItem, User
+from schemas import (
+    QRAssetLink,
+    QRCreate,
+    QRItemSummary,
+    QRLogo,
+    QRLogoUpload,
+    QRMatrixResponse,
+    QRPreviewResponse,
+    QRUpdate,
+)
+from services.admission import Abandoned, DeadlineExceeded, Overloaded, RenderRejected, preview_budget, run_admitted
+from services.matrix import QRMatrix
+from services.qr import (
+    FORMATS,
+    Matrix,
+    QRConfig,
+    QRPreview,
+    QRRender,
+    build_matrix,
+    encode_render,
+    fits_capacity,
+    format_pattern,
+    logo_path,
+    plan_encoding,
+    render_format,
+    render_qr,
+    render_staged,
+)
+from services.redirects import PREVIEW_SLUG, new_slug, redirect_url, redirects
+from services.search import search_items
+from services.usage import QuotaExceeded, asset_bytes, check_quota, record
+from storage import PNG_DIR, SVG_DIR, acquire_asset, asset_writer, item_config, release_asset, store_logo
 
 router = APIRouter(prefix="/api/qr", tags=["qr"])
-SVG_DIR = Path("generated_svgs")
-PNG_DIR = Path("generated_pngs")
-SVG_DIR.mkdir(parents=True, exist_ok=True)
-PNG_DIR.mkdir(parents=True, exist_ok=True)
+ws_router = APIRouter(tags=["qr"])
+IMMUTABLE_MAX_AGE = 31536000
+STORED_FORMATS = ("svg", "png")
+PREVIEW_FORMATS = ("svg", "png")
+# nginx's "client closed request"; nobody reads it, but it keeps access logs honest
+CLIENT_CLOSED_REQUEST = 499
+MAX_LOGO_BYTES = 512 * 1024
+CAPACITY_DETAIL = "URL is too long for a QR code with an overlay; shorten it or remove the overlay"
+# only the columns QRItemSummary exposes; internal paths and asset ids are never loaded
+SUMMARY_COLUMNS = tuple(getattr(QRItem, name) for name in QRItemSummary.model_fields)
 
 
 def _ensure_owner(session: Session, user: User, item_id: int) -> QRItem:
@@ -28,31 +86,307 @@ def _ensure_owner(session: Session, user: User, item_id: int) -> QRItem:
     return item
 
 
-def _to_config(payload: QRCreate) -> QRConfig:
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored as UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _item_etag(item: QRItem, fmt: str) -> str:
+    if item.asset_id:
+        return f'"{item.asset_id}-{fmt}"'
+    return f'"{item.id}-{int(_as_utc(item.updated_at).timestamp())}-{fmt}"'
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates or "*" in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(last_modified.timestamp()) <= since.timestamp()
+    return False
+
+
+def _link_expiry() -> int:
+    # expiries snap to TTL buckets so URLs stay stable (and cacheable) for a full bucket
+    ttl = settings.signed_url_ttl_seconds
+    return (int(time.time()) // ttl + 2) * ttl
+
+
+def _encoded_url(url: str, dynamic: bool) -> str:
+    # previews of dynamic codes use a placeholder slug of the final length
+    return redirect_url(PREVIEW_SLUG) if dynamic else url
+
+
+def _unused_slug(session: Session) -> str:
+    while True:
+        slug = new_slug()
+        if session.exec(select(QRItem.id).where(QRItem.slug == slug)).first() is None:
+            return slug
+
+
+def _to_config(payload: QRCreate, slug: Optional[str] = None) -> QRConfig:
     return QRConfig(
-        url=str(payload.url),
+        url=redirect_url(slug) if slug else _encoded_url(str(payload.url), payload.dynamic),
         foreground_color=payload.foreground_color,
         background_color=payload.background_color,
         size=payload.size,
         padding=payload.padding,
         border_radius=payload.border_radius,
+        overlay_text=payload.overlay_text,
+        logo=payload.logo_id,
     )
 
 
+def _require_capacity(config: QRConfig) -> None:
+    # overlays force level H, which holds roughly half of what level M does
+    if not fits_capacity(config):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=CAPACITY_DETAIL)
+
+
+def _check_quota(session: Session, user: User, *, new_item: bool) -> None:
+    try:
+        check_quota(session, user.id, new_item=new_item)
+    except QuotaExceeded as exc:
+        code = status.HTTP_429_TOO_MANY_REQUESTS if exc.daily else status.HTTP_403_FORBIDDEN
+        raise HTTPException(status_code=code, detail=exc.detail) from exc
+
+
+def _logo_missing(config: QRConfig) -> bool:
+    return bool(config.logo) and not logo_path(config.logo).exists()
+
+
+def _require_logo(config: QRConfig) -> None:
+    if _logo_missing(config):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown logo; upload it first")
+
+
+@router.post(
+    "/logos",
+    response_model=QRLogo,
+    status_code=status.HTTP_201_CREATED,
+    summary="Upload a logo for branded codes",
+    response_description="Content hash to pass as logo_id",
+)
+def upload_logo(
+    payload: QRLogoUpload,
+    current_user: User = Depends(get_current_user),
+) -> QRLogo:
+    _ = current_user
+    try:
+        data = base64.b64decode(payload.data, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Logo must be base64") from None
+    if len(data) > MAX_LOGO_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Logo is too large")
+    try:
+        return QRLogo(logo_id=store_logo(data))
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from None
+
+
 @router.post(
     "/preview",
     response_model=QRPreviewResponse,
+    response_class=FastJSONResponse,
     summary="Render a customised QR preview without saving",
     response_description="Inline base64 PNG and SVG markup",
 )
-def preview_qr(
+async def preview_qr(
+    request: Request,
     payload: QRCreate,
+    x_render_deadline_ms: Optional[int] = Header(
+        default=None, ge=1, description="Give up after this many milliseconds (capped by the server default)"
+    ),
     current_user: User = Depends(get_current_user),
-) -> QRPreviewResponse:
+) -> Response:
     _ = current_user
-    render = render_qr(_to_config(payload))
-    preview = encode_render(render)
-    return QRPreviewResponse(svg_data=preview.svg_data, png_data=preview.png_data)
+    config = _to_config(payload)
+    _require_logo(config)
+    _require_capacity(config)
+    try:
+        preview = await run_admitted(
+            preview_budget,
+            config.size ** 2,
+            partial(_render_preview, config),
+            deadline=_preview_deadline(x_render_deadline_ms),
+            abandoned=_disconnected(request),
+        )
+    except Overloaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Preview renderer is busy",
+            headers={"Retry-After": "1"},
+        ) from None
+    except DeadlineExceeded:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Preview missed its deadline") from None
+    except Abandoned:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    return FastJSONResponse({"svg_data": preview.svg_data, "png_data": preview.png_data})
+
+
+def _preview_deadline(requested_ms: Optional[int]) -> float:
+    """Deadline in ``loop.time()`` units; a client may shorten the configured one but not extend it."""
+
+    budget_ms = settings.preview_deadline_ms if requested_ms is None else min(requested_ms, settings.preview_deadline_ms)
+    return asyncio.get_running_loop().time() + budget_ms / 1000
+
+
+async def _disconnected(request: Request) -> None:
+    # the body has been read already, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+def _render_preview(config: QRConfig, cancelled: threading.Event) -> QRPreview:
+    return encode_render(render_staged(render_qr(config), PREVIEW_FORMATS, cancelled))
+
+
+@router.get(
+    "/matrix",
+    response_model=QRMatrixResponse,
+    summary="Return the bit-packed module matrix for a URL",
+    response_description="Module count and base64 matrix bits, or raw bits for application/octet-stream",
+)
+def qr_matrix(
+    request: Request,
+    url: HttpUrl = Query(...),
+    dynamic: bool = Query(default=False, description="Encode a short redirect link instead of the URL"),
+    current_user: User = Depends(get_current_user),
+):
+    _ = current_user
+    plan = plan_encoding(_encoded_url(str(url), dynamic), upper_host=settings.qr_uppercase_host)
+    matrix = build_matrix(plan)
+    packed = matrix.to_bytes()
+    if "application/octet-stream" in request.headers.get("accept", ""):
+        return Response(
+            content=packed,
+            media_type="application/octet-stream",
+            headers={
+                "X-QR-Modules": str(len(matrix)),
+                "X-QR-Version": str(plan.version),
+                "X-QR-Efficiency": f"{plan.efficiency:.3f}",
+            },
+        )
+    return QRMatrixResponse(
+        modules=len(matrix),
+        version=plan.version,
+        efficiency=round(plan.efficiency, 3),
+        data=base64.b64encode(packed).decode("ascii"),
+    )
+
+
+class _PreviewSession:
+    """Per-connection preview state; the encoded matrix survives style-only deltas."""
+
+    __slots__ = ("fields", "generation", "encoded", "matrix")
+
+    def __init__(self) -> None:
+        self.fields: Dict[str, Any] = {"title": ""}
+        self.generation = 0
+        # (url, error correction level) the cached matrix was encoded for
+        self.encoded: Optional[Tuple[str, int]] = None
+        self.matrix: Optional[Matrix] = None
+
+
+def _render_frame(config: QRConfig, matrix: Optional[Matrix], cancelled: threading.Event) -> QRRender:
+    return render_staged(render_qr(config, matrix), ("png",), cancelled)
+
+
+@ws_router.websocket("/ws/qr/preview")
+async def preview_socket(websocket: WebSocket, session: Session = Depends(get_session)) -> None:
+    """Stream PNG previews for config deltas.
+
+    The first message must be ``{"token": ...}``. Every following JSON object is
+    merged into the session config. A delta that arrives mid-render supersedes
+    it: the render stops at its next stage and only the newest config is drawn.
+    Each frame is announced by ``{"type": "frame", "seq": n}`` where ``n``
+    counts the deltas received so far.
+    """
+
+    await websocket.accept()
+    try:
+        message = await websocket.receive_json()
+        get_user_from_token(str(message.get("token") or ""), session)
+    except WebSocketDisconnect:
+        return
+    except (HTTPException, ValueError, AttributeError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # the socket outlives the request, so release the connection right away
+        session.close()
+
+    state = _PreviewSession()
+    changed = asyncio.Event()
+
+    async def render_latest() -> None:
+        while True:
+            await changed.wait()
+            changed.clear()
+            generation = state.generation
+            try:
+                config = _to_config(QRCreate.model_validate(state.fields))
+            except ValidationError as exc:
+                await websocket.send_json(
+                    {"type": "error", "seq": generation, "detail": exc.errors(include_url=False, include_context=False)}
+                )
+                continue
+            if _logo_missing(config):
+                await websocket.send_json({"type": "error", "seq": generation, "detail": "Unknown logo"})
+                continue
+            if not fits_capacity(config):
+                # raised inside the render it would end this task and silence the socket
+                await websocket.send_json({"type": "error", "seq": generation, "detail": CAPACITY_DETAIL})
+                continue
+            encoded = (config.url, config.error_correction)
+            matrix = state.matrix if encoded == state.encoded else None
+            deadline = asyncio.get_running_loop().time() + settings.preview_deadline_ms / 1000
+            try:
+                render = await run_admitted(
+                    preview_budget,
+                    config.size ** 2,
+                    partial(_render_frame, config, matrix),
+                    deadline=deadline,
+                    # a newer delta supersedes this frame
+                    abandoned=changed.wait(),
+                )
+            except Abandoned:
+                continue
+            except RenderRejected as exc:
+                detail = "Preview renderer is busy" if isinstance(exc, Overloaded) else "Preview missed its deadline"
+                await websocket.send_json({"type": "error", "seq": generation, "detail": detail})
+                continue
+            state.encoded, state.matrix = encoded, render.matrix
+            await websocket.send_json({"type": "frame", "seq": generation})
+            await websocket.send_bytes(render.png_bytes)
+
+    await websocket.send_json({"type": "ready"})
+    renderer = asyncio.create_task(render_latest())
+    try:
+        while True:
+            try:
+                delta = await websocket.receive_json()
+            except ValueError:
+                # malformed text is a client error, not a reason to drop the socket
+                delta = None
+            if not isinstance(delta, dict):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object"})
+                continue
+            state.fields.update(delta)
+            state.generation += 1
+            changed.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        renderer.cancel()
 
 
 @router.post(
@@ -68,7 +402,14 @@ def create_qr(
     current_user: User = Depends(get_current_user),
 ) -> QRItem:
     now = datetime.now(timezone.utc)
-    assets = generate_qr_assets(_to_config(payload), svg_dir=SVG_DIR, png_dir=PNG_DIR)
+    slug = _unused_slug(session) if payload.dynamic else None
+    config = _to_config(payload, slug)
+    _require_logo(config)
+    _require_capacity(config)
+    _check_quota(session, current_user, new_item=True)
+    asset = acquire_asset(session, config, svg_dir=SVG_DIR, png_dir=PNG_DIR)
+    svg_bytes, png_bytes = asset_bytes(asset)
+    record(session, current_user.id, items=1, svg_bytes=svg_bytes, png_bytes=png_bytes, renders=1)
 
     item = QRItem(
         user_id=current_user.id,
@@ -79,46 +420,135 @@ def create_qr(
         size=payload.size,
         padding=payload.padding,
         border_radius=payload.border_radius,
-        overlay_text=None,
-        svg_path=str(assets.svg_path),
-        png_path=str(assets.png_path),
+        overlay_text=payload.overlay_text,
+        logo_id=payload.logo_id,
+        svg_path=asset.svg_path,
+        png_path=asset.png_path,
+        asset_id=asset.id,
+        slug=slug,
         created_at=now,
         updated_at=now,
     )
     session.add(item)
     session.commit()
     session.refresh(item)
+    if slug:
+        redirects.set(slug, item.url)
     return item
 
 
 @router.get(
     "",
-    response_model=List[QRItem],
+    response_model=List[QRItemSummary],
+    response_class=FastJSONResponse,
     summary="List QR codes owned by the authenticated user",
 )
 def list_qr(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
-) -> List[QRItem]:
-    return session.exec(
-        select(QRItem)
+) -> FastJSONResponse:
+    rows = session.exec(
+        select(*SUMMARY_COLUMNS)
         .where(QRItem.user_id == current_user.id)
         .order_by(QRItem.created_at.desc())
     ).all()
+    return FastJSONResponse([row._asdict() for row in rows])
 
 
 @router.get(
     "/history",
-    response_model=List[QRItem],
+    response_model=List[QRItemSummary],
+    response_class=FastJSONResponse,
     summary="Alias for listing QR history",
 )
 def history(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
-) -> List[QRItem]:
+) -> FastJSONResponse:
     return list_qr(session=session, current_user=current_user)
 
 
+@router.get(
+    "/search",
+    response_model=List[QRItemSummary],
+    response_class=FastJSONResponse,
+    summary="Full-text search over the user's QR titles and URLs, best match first",
+)
+def search_qr(
+    q: str = Query(min_length=1, max_length=200, description="Words to match; each one matches as a prefix"),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+) -> FastJSONResponse:
+    rows = search_items(session, current_user.id, q, SUMMARY_COLUMNS, limit=limit, offset=offset)
+    return FastJSONResponse([row._asdict() for row in rows])
+
+
+@router.patch(
+    "/{item_id}",
+    response_model=QRItem,
+    summary="Edit a saved QR code, re-rendering only what the change requires",
+)
+def update_qr(
+    item_id: int,
+    payload: QRUpdate,
+    background_tasks: BackgroundTasks,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+) -> QRItem:
+    item = _ensure_owner(session, current_user, item_id)
+    changes = payload.model_dump(exclude_unset=True)
+    if "title" in changes:
+        changes["title"] = changes["title"].strip() or "Untitled QR"
+    if "url" in changes:
+        changes["url"] = str(changes["url"])
+    # the two overlays are exclusive, so setting one replaces the other
+    if changes.get("overlay_text"):
+        changes.setdefault("logo_id", None)
+    elif changes.get("logo_id"):
+        changes.setdefault("overlay_text", None)
+
+    before = item_config(item)
+    for name, value in changes.items():
+        setattr(item, name, value)
+    after = item_config(item)
+
+    orphaned: Tuple[Optional[str], ...] = ()
+    # title edits, and destination edits of dynamic codes, leave the rendered code as it is
+    if after != before:
+        _require_logo(after)
+        _require_capacity(after)
+        _check_quota(session, current_user, new_item=False)
+        matrix = None
+        if item.asset_id and (after.url, after.error_correction) == (before.url, before.error_correction):
+            # style-only edit: the modules are unchanged, so skip encoding
+            stored = session.exec(select(Asset.matrix).where(Asset.id == item.asset_id)).first()
+            matrix = QRMatrix.from_bytes(stored) if stored else None
+        # take the new reference before dropping the old one, in case both are the same asset
+        asset = acquire_asset(session, after, svg_dir=SVG_DIR, png_dir=PNG_DIR, matrix=matrix)
+        old_svg, old_png = asset_bytes(session.get(Asset, item.asset_id) if item.asset_id else None)
+        if item.asset_id:
+            released = release_asset(session, item.asset_id)
+            orphaned = (released.svg_path, released.png_path) if released else ()
+        else:
+            orphaned = (item.svg_path, item.png_path)
+        svg_bytes, png_bytes = asset_bytes(asset)
+        record(session, current_user.id, svg_bytes=svg_bytes - old_svg, png_bytes=png_bytes - old_png, renders=1)
+        item.asset_id, item.svg_path, item.png_path = asset.id, asset.svg_path, asset.png_path
+
+    # ETags and Last-Modified of legacy items are derived from this
+    item.updated_at = datetime.now(timezone.utc)
+    session.add(item)
+    session.commit()
+    session.refresh(item)
+    if item.slug and "url" in changes:
+        redirects.set(item.slug, item.url)
+    # queued behind the new asset's write, so the old files go only once the new ones landed
+    background_tasks.add_task(asset_writer.remove, *orphaned)
+    return item
+
+
 @router.delete(
     "/{item_id}",
     summary="Delete a saved QR code",
@@ -126,40 +556,132 @@ def history(
 )
 def delete_qr(
     item_id: int,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ) -> dict:
     item = _ensure_owner(session, current_user, item_id)
-    try:
-        if item.svg_path and Path(item.svg_path).exists():
-            Path(item.svg_path).unlink()
-        if item.png_path and Path(item.png_path).exists():
-            Path(item.png_path).unlink()
-    finally:
-        session.delete(item)
-        session.commit()
+    svg_bytes, png_bytes = asset_bytes(session.get(Asset, item.asset_id) if item.asset_id else None)
+    record(session, current_user.id, items=-1, svg_bytes=-svg_bytes, png_bytes=-png_bytes)
+    if item.asset_id:
+        released = release_asset(session, item.asset_id)
+        orphaned = (released.svg_path, released.png_path) if released else ()
+    else:
+        orphaned = (item.svg_path, item.png_path)
+    slug = item.slug
+    session.delete(item)
+    session.commit()
+    if slug:
+        redirects.discard(slug)
+    # unlinks go through the writer queue so they stay ordered behind pending writes
+    background_tasks.add_task(asset_writer.remove, *orphaned)
     return {"ok": True}
 
 
+@router.get(
+    "/links",
+    response_model=List[QRAssetLink],
+    summary="Signed, browser-cacheable asset URLs for the user's saved codes",
+)
+def asset_links(
+    format: str = Query(default="png", pattern="^(svg|png)$"),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+) -> List[QRAssetLink]:
+    expires = _link_expiry()
+    expires_at = datetime.fromtimestamp(expires, tz=timezone.utc)
+    rows = session.exec(
+        select(QRItem.id, QRItem.asset_id)
+        .where(QRItem.user_id == current_user.id, QRItem.asset_id.is_not(None))
+        .order_by(QRItem.created_at.desc())
+    ).all()
+    return [
+        QRAssetLink(
+            id=item_id,
+            url=f"{router.prefix}/assets/{asset_id}.{format}?expires={expires}&signature={sign_asset(asset_id, format, expires)}",
+            expires_at=expires_at,
+        )
+        for item_id, asset_id in rows
+    ]
+
+
+@router.get(
+    "/assets/{asset_id}.{format}",
+    summary="Serve a saved asset through a signed URL",
+    response_description="Immutable SVG or PNG stream",
+)
+def signed_asset(
+    request: Request,
+    asset_id: str = PathParam(pattern="^[0-9a-f]{64}$"),
+    format: str = PathParam(pattern="^(svg|png)$"),
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    if not verify_asset_signature(asset_id, format, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired signature")
+    etag = f'"{asset_id}-{format}"'
+    # assets are content-addressed, so the bytes behind a URL never change
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max(expires - int(time.time()), 0)}, immutable",
+    }
+    if _not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    asset_path = (SVG_DIR if format == "svg" else PNG_DIR) / f"{asset_id}.{format}"
+    pending = asset_writer.pending_bytes(asset_path)
+    if pending is not None:
+        return Response(content=pending, media_type=FORMATS[format].media_type, headers=headers)
+    if not asset_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not available")
+    return FileResponse(asset_path, media_type=FORMATS[format].media_type, headers=headers)
+
+
 @router.get(
     "/{item_id}/download",
     summary="Download a saved QR code",
-    response_description="Binary SVG or PNG stream",
+    response_description="Binary stream in the requested format",
 )
 def download_qr(
+    request: Request,
     item_id: int,
-    format: str = Query(default="svg", pattern="^(svg|png)$"),
+    format: str = Query(default="svg", pattern=format_pattern()),
+    v: Optional[str] = Query(default=None, description="Version token, e.g. updated_at; versioned URLs are cached as immutable"),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ):
     item = _ensure_owner(session, current_user, item_id)
-    if format == "svg":
-        if not item.svg_path or not Path(item.svg_path).exists():
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="SVG not available")
-        return FileResponse(item.svg_path, media_type="image/svg+xml", filename=f"qr-{item.id}.svg")
-
-    if not item.png_path:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="PNG export not available yet")
-    if not Path(item.png_path).exists():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="PNG not available")
-    return FileResponse(item.png_path, media_type="image/png", filename=f"qr-{item.id}.png")
+    etag = _item_etag(item, format)
+    last_modified = _as_utc(item.updated_at)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": f"private, max-age={IMMUTABLE_MAX_AGE}, immutable" if v else "private, no-cache",
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if format in STORED_FORMATS:
+        stored = item.svg_path if format == "svg" else item.png_path
+        if not stored and format == "png":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="PNG export not available yet")
+        pending = asset_writer.pending_bytes(stored) if stored else None
+        if pending is not None:
+            # the asset writer has not renamed the file into place yet
+            headers["Content-Disposition"] = f'attachment; filename="qr-{item.id}.{format}"'
+            return Response(content=pending, media_type=FORMATS[format].media_type, headers=headers)
+        if not stored or not Path(stored).exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{format.upper()} not available")
+        return FileResponse(
+            stored,
+            media_type=FORMATS[format].media_type,
+            filename=f"qr-{item.id}.{format}",
+            headers=headers,
+        )
+
+    # formats without a stored asset are rendered on demand from the saved config
+    headers["Content-Disposition"] = f'attachment; filename="qr-{item.id}.{format}"'
+    return Response(
+        content=render_format(item_config(item), format),
+        media_type=FORMATS[format].media_type,
+        headers=headers,
+    )
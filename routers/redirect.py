@@ -0,0 +1,30 @@
+﻿from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import Path as PathParam
+from fastapi.responses import RedirectResponse
+from sqlmodel import Session
+
+from db import get_session
+from services.redirects import SLUG_ALPHABET, SLUG_LENGTH, redirects
+
+router = APIRouter(tags=["redirect"])
+
+
+@router.get("/R/{slug}", include_in_schema=False)
+@router.get(
+    "/r/{slug}",
+    response_class=RedirectResponse,
+    status_code=status.HTTP_302_FOUND,
+    summary="Resolve a dynamic QR code",
+    response_description="Temporary redirect to the current destination",
+)
+def resolve_slug(
+    slug: str = PathParam(pattern=f"^[{SLUG_ALPHABET}]{{{SLUG_LENGTH}}}$"),
+    session: Session = Depends(get_session),
+) -> RedirectResponse:
+    # the session only opens a connection when the slug is not cached yet
+    url = redirects.resolve(slug, session)
+    if url is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+    redirects.record_scan(slug)
+    # 302 rather than 301: destinations may change and must not be cached by browsers
+    return RedirectResponse(url, status_code=status.HTTP_302_FOUND, headers={"Cache-Control": "no-store"})
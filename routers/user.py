@@ -1,25 +1,42 @@
 ﻿from datetime import datetime, timezone
-from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlmodel import Session, select
 
 from core.security import get_current_user, get_password_hash
 from db import get_session
-from models import QRItem, User
-from schemas import UserRead, UserUpdate
+from config import settings
+from models import QRItem, User, UserUsage
+from schemas import UserProfile, UserRead, UserUpdate, UserUsageRead
+from services.redirects import redirects
+from services.usage import forget, renders_today
+from storage import asset_writer, release_user_items
 
 router = APIRouter(prefix="/api/user", tags=["users"])
 
 
 @router.get(
     "/me",
-    response_model=UserRead,
+    response_model=UserProfile,
     summary="Return the authenticated user's profile",
-    response_description="Current user record",
+    response_description="Current user record with usage counters and quotas",
 )
-def read_current_user(current_user: User = Depends(get_current_user)) -> User:
-    return current_user
+def read_current_user(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+) -> UserProfile:
+    usage = session.get(UserUsage, current_user.id)
+    counters = UserUsageRead(
+        max_items=settings.quota_max_items or None,
+        max_bytes=settings.quota_max_mb * 1024 * 1024 or None,
+        max_renders_per_day=settings.quota_renders_per_day or None,
+    )
+    if usage is not None:
+        counters.items = usage.item_count
+        counters.svg_bytes = usage.svg_bytes
+        counters.png_bytes = usage.png_bytes
+        counters.renders_today = renders_today(usage)
+    return UserProfile(**current_user.model_dump(), usage=counters)
 
 
 @router.patch(
@@ -57,16 +74,19 @@ def update_current_user(
     response_description="Confirmation payload",
 )
 def delete_current_user(
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
 ) -> dict:
-    qrs = session.exec(select(QRItem).where(QRItem.user_id == current_user.id)).all()
-    for item in qrs:
-        if item.svg_path and Path(item.svg_path).exists():
-            Path(item.svg_path).unlink()
-        if item.png_path and Path(item.png_path).exists():
-            Path(item.png_path).unlink()
-        session.delete(item)
+    slugs = session.exec(
+        select(QRItem.slug).where(QRItem.user_id == current_user.id, QRItem.slug.is_not(None))
+    ).all()
+    orphaned = release_user_items(session, current_user.id)
+    forget(session, current_user.id)
     session.delete(current_user)
     session.commit()
+    for slug in slugs:
+        redirects.discard(slug)
+    # files go after the response; anything missed is swept by the asset GC
+    background_tasks.add_task(asset_writer.remove, *orphaned)
     return {"ok": True}
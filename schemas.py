@@ -1,7 +1,7 @@
 ﻿from datetime import datetime
 from typing import Annotated, Optional
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, HttpUrl, model_validator
 
 
 HexColor = Annotated[str, Field(pattern=r"^#[0-9a-fA-F]{6}$")]
@@ -41,6 +41,21 @@ class UserRead(UserBase):
     })
 
 
+class UserUsageRead(BaseModel):
+    items: int = 0
+    svg_bytes: int = 0
+    png_bytes: int = 0
+    renders_today: int = 0
+    # configured quotas; None means unlimited
+    max_items: Optional[int] = None
+    max_bytes: Optional[int] = None
+    max_renders_per_day: Optional[int] = None
+
+
+class UserProfile(UserRead):
+    usage: UserUsageRead
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -97,8 +112,86 @@ class QRBase(BaseModel):
     })
 
 
+LogoId = Annotated[str, Field(pattern=r"^[0-9a-f]{64}$")]
+
+
 class QRCreate(QRBase):
-    pass
+    dynamic: bool = False
+    overlay_text: Optional[str] = Field(default=None, min_length=1, max_length=4)
+    logo_id: Optional[LogoId] = None
+
+    @model_validator(mode="after")
+    def _single_overlay(self) -> "QRCreate":
+        if self.overlay_text and self.logo_id:
+            raise ValueError("Use either overlay_text or logo_id, not both")
+        return self
+
+
+class QRUpdate(BaseModel):
+    """Partial edit of a saved code; only the fields that are sent change."""
+
+    title: Optional[str] = None
+    url: Optional[HttpUrl] = None
+    foreground_color: Optional[HexColor] = None
+    background_color: Optional[HexOrTransparent] = None
+    size: Optional[int] = Field(default=None, ge=128, le=1024)
+    padding: Optional[int] = Field(default=None, ge=0, le=128)
+    border_radius: Optional[int] = Field(default=None, ge=0, le=120)
+    overlay_text: Optional[str] = Field(default=None, min_length=1, max_length=4)
+    logo_id: Optional[LogoId] = None
+
+    @model_validator(mode="after")
+    def _valid_changes(self) -> "QRUpdate":
+        # null clears an overlay; every other field must keep a value
+        cleared = {name for name in self.model_fields_set if getattr(self, name) is None}
+        if cleared - {"overlay_text", "logo_id"}:
+            raise ValueError(f"{', '.join(sorted(cleared))} cannot be null")
+        if self.overlay_text and self.logo_id:
+            raise ValueError("Use either overlay_text or logo_id, not both")
+        return self
+
+
+class QRLogoUpload(BaseModel):
+    # base64 of at most MAX_LOGO_BYTES
+    data: str = Field(max_length=700_000)
+
+
+class QRLogo(BaseModel):
+    logo_id: LogoId
+
+
+class QRItemSummary(BaseModel):
+    id: int
+    title: Optional[str] = None
+    url: str
+    foreground_color: str
+    background_color: str
+    size: int
+    padding: int
+    border_radius: int
+    overlay_text: Optional[str] = None
+    logo_id: Optional[str] = None
+    slug: Optional[str] = None
+    scan_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "id": 1,
+            "title": "Campaign QR",
+            "url": "https://example.com/",
+            "foreground_color": "#1f3a93",
+            "background_color": "#ffffff",
+            "size": 320,
+            "padding": 12,
+            "border_radius": 20,
+            "slug": "7QK2M9XD",
+            "scan_count": 42,
+            "created_at": "2024-01-01T12:00:00",
+            "updated_at": "2024-01-01T12:00:00",
+        }
+    })
 
 
 class QRPreviewResponse(BaseModel):
@@ -111,3 +204,33 @@ class QRPreviewResponse(BaseModel):
             "png_data": "iVBORw0KGgoAAAANSUhEUg...",
         }
     })
+
+
+class QRMatrixResponse(BaseModel):
+    modules: int
+    version: int
+    efficiency: float
+    data: str
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "modules": 25,
+            "version": 2,
+            "efficiency": 1.18,
+            "data": "/sF/wUFdLuoXUtEF/VX+AP8AJ0...",
+        }
+    })
+
+
+class QRAssetLink(BaseModel):
+    id: int
+    url: str
+    expires_at: datetime
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "id": 1,
+            "url": "/api/qr/assets/3f2a...c9.png?expires=1735776000&signature=Qm9v...",
+            "expires_at": "2025-01-02T00:00:00Z",
+        }
+    })
@@ -0,0 +1,103 @@
+"""Production launcher for the QR Forge app.
+
+Run ``python -m serve``. The worker model comes from :mod:`config`
+(``QR_FORGE_WORKERS``, ``QR_FORGE_BACKLOG``, ``QR_FORGE_KEEP_ALIVE_SECONDS``,
+``QR_FORGE_LIMIT_CONCURRENCY``, ``QR_FORGE_GRACEFUL_SHUTDOWN_SECONDS``) and
+is handed to uvicorn together with the fastest event loop and HTTP parser
+that are installed (uvloop and httptools, else asyncio and h11).
+
+Pending migrations run once here, before any worker starts, so workers never
+race each other on the schema. Workers import the app afresh and open their
+own engine and connection pool; ``db`` also drops inherited connections if a
+process is forked instead.
+
+On SIGTERM/SIGINT uvicorn stops accepting connections and waits up to the
+graceful timeout for in-flight requests. Each worker's lifespan then waits for
+preview renders still holding pixel budget and flushes queued asset writes
+before it exits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import Settings, settings
+
+APP = "app:app"
+# (module to probe, uvicorn option value), fastest first
+LOOPS: Tuple[Tuple[str, str], ...] = (("uvloop", "uvloop"), ("asyncio", "asyncio"))
+HTTP_PARSERS: Tuple[Tuple[str, str], ...] = (("httptools", "httptools"), ("h11", "h11"))
+
+
+def fastest_available(candidates: Sequence[Tuple[str, str]]) -> str:
+    """Option value of the first candidate whose module is importable."""
+
+    for module, option in candidates:
+        if importlib.util.find_spec(module) is not None:
+            return option
+    raise RuntimeError(f"none of {', '.join(module for module, _ in candidates)} is installed")
+
+
+def worker_count(configured: int) -> int:
+    return configured if configured > 0 else os.cpu_count() or 1
+
+
+def uvicorn_options(config: Settings) -> Dict[str, Any]:
+    """Keyword arguments for ``uvicorn.run`` built from ``config``."""
+
+    return {
+        "host": config.host,
+        "port": config.port,
+        "workers": worker_count(config.workers),
+        "backlog": config.backlog,
+        "timeout_keep_alive": config.keep_alive_seconds,
+        "limit_concurrency": config.limit_concurrency or None,
+        "timeout_graceful_shutdown": config.graceful_shutdown_seconds,
+        "loop": fastest_available(LOOPS),
+        "http": fastest_available(HTTP_PARSERS),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m serve", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", help="overrides QR_FORGE_HOST")
+    parser.add_argument("--port", type=int, help="overrides QR_FORGE_PORT")
+    parser.add_argument("--workers", type=int, help="overrides QR_FORGE_WORKERS (0 = one per CPU)")
+    parser.add_argument("--dry-run", action="store_true", help="print the server options and exit")
+    parser.add_argument("--json", action="store_true", help="print the options as JSON")
+    args = parser.parse_args(argv)
+
+    for name in ("host", "port", "workers"):
+        if getattr(args, name) is not None:
+            setattr(settings, name, getattr(args, name))
+    options = uvicorn_options(settings)
+    if args.json:
+        print(json.dumps(options, indent=2))
+    else:
+        for key, value in options.items():
+            print(f"{key}: {value}")
+    if args.dry_run:
+        return 0
+
+    from db import engine, init_db
+
+    init_db(engine)
+    # workers must not start with connections opened by the parent
+    engine.dispose()
+    # workers are separate interpreters that re-read the environment; a single
+    # worker runs in this process and reads the settings object directly
+    os.environ["QR_FORGE_MIGRATE_ON_STARTUP"] = "false"
+    settings.migrate_on_startup = False
+
+    import uvicorn
+
+    uvicorn.run(APP, **options)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+"""Admission control and cancellation for preview renders.
+
+A render's memory grows with its pixel count, so concurrency is bounded by a
+:class:`PixelBudget` rather than a plain semaphore: eight 256px previews fit
+where a single 1024px one would otherwise have to queue behind them. Waiters
+are admitted in FIFO order, so a large render is not starved by a stream of
+small ones.
+
+:func:`run_admitted` waits for budget, runs the render in the threadpool and
+gives up when the deadline passes or the caller goes away (client disconnect,
+newer preview on the same socket). Renders still waiting for budget are
+dropped without running; a render already running is told to stop at its
+next stage boundary through a ``threading.Event``, and its budget is only
+returned once the thread has actually finished.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+from config import settings
+
+T = TypeVar("T")
+
+
+class RenderRejected(Exception):
+    """Base class for previews that were not rendered to completion."""
+
+
+class Overloaded(RenderRejected):
+    """No pixel budget became free before the deadline."""
+
+
+class DeadlineExceeded(RenderRejected):
+    """The render was admitted but did not finish before the deadline."""
+
+
+class Abandoned(RenderRejected):
+    """The caller stopped waiting (disconnected or superseded)."""
+
+
+class PixelBudget:
+    """FIFO admission by pixel count, for use from one event loop."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, "asyncio.Future[None]"]] = deque()
+        self._idle: List["asyncio.Future[None]"] = []
+
+    def cost(self, pixels: int) -> int:
+        # a render larger than the whole budget still runs, alone
+        return max(1, min(pixels, self.capacity))
+
+    async def acquire(self, pixels: int) -> int:
+        """Wait until ``pixels`` fit and return the cost to hand back to :meth:`release`."""
+
+        cost = self.cost(pixels)
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+            return cost
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, waiter))
+        try:
+            await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # admitted in the same tick the caller gave up
+                self.release(cost)
+            else:
+                self._waiters = deque(entry for entry in self._waiters if entry[1] is not waiter)
+                self._wake()
+            raise
+        return cost
+
+    def release(self, cost: int) -> None:
+        self.in_use -= cost
+        self._wake()
+        if self.in_use == 0:
+            for idle in self._idle:
+                if not idle.done():
+                    idle.set_result(None)
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until no render holds budget; False if ``timeout`` seconds passed first.
+
+        Used on shutdown, so renders whose callers already gave up can finish
+        their current stage before the process exits.
+        """
+
+        if self.in_use == 0:
+            return True
+        idle = asyncio.get_running_loop().create_future()
+        self._idle.append(idle)
+        try:
+            done, _ = await asyncio.wait({idle}, timeout=max(timeout, 0))
+        finally:
+            self._idle.remove(idle)
+            idle.cancel()
+        return bool(done)
+
+    def _wake(self) -> None:
+        while self._waiters:
+            cost, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + cost > self.capacity:
+                return
+            self._waiters.popleft()
+            self.in_use += cost
+            waiter.set_result(None)
+
+
+async def run_admitted(
+    budget: PixelBudget,
+    pixels: int,
+    work: Callable[[threading.Event], T],
+    *,
+    deadline: float,
+    abandoned: Optional[Awaitable[object]] = None,
+) -> T:
+    """Run ``work(cancelled)`` in the threadpool once ``pixels`` fit in ``budget``.
+
+    ``deadline`` is in ``loop.time()`` units. ``abandoned`` completes when the
+    result is no longer wanted. Raises a :class:`RenderRejected` subclass
+    instead of returning when the render did not complete in time.
+    """
+
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    watcher = asyncio.ensure_future(abandoned) if abandoned is not None else None
+    admission = asyncio.ensure_future(budget.acquire(pixels))
+    task: Optional["asyncio.Future[T]"] = None
+    try:
+        if not await _first(admission, watcher, deadline - loop.time()):
+            admission.cancel()
+            # let it leave the queue before reporting, so the budget state is settled
+            await asyncio.wait({admission})
+            raise Abandoned() if watcher is not None and watcher.done() else Overloaded()
+        cost = admission.result()
+
+        task = asyncio.ensure_future(run_in_threadpool(work, cancelled))
+        task.add_done_callback(lambda done: _settle(done, budget, cost))
+        if not await _first(task, watcher, deadline - loop.time()):
+            raise Abandoned() if watcher is not None and watcher.done() else DeadlineExceeded()
+        return task.result()
+    finally:
+        if task is None or not task.done():
+            cancelled.set()
+        if task is None:
+            # cancelled from outside while queued; never leave an admission behind
+            if admission.done() and not admission.cancelled() and admission.exception() is None:
+                budget.release(admission.result())
+            else:
+                admission.cancel()
+        if watcher is not None:
+            watcher.cancel()
+
+
+async def _first(target: "asyncio.Future[object]", watcher: Optional["asyncio.Future[object]"], timeout: float) -> bool:
+    """Wait for ``target``; False if ``watcher`` or the timeout came first."""
+
+    waiting = {target} if watcher is None else {target, watcher}
+    done, _ = await asyncio.wait(waiting, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+    return target in done
+
+
+def _settle(task: "asyncio.Future[object]", budget: PixelBudget, cost: int) -> None:
+    budget.release(cost)
+    if not task.cancelled():
+        # a cancelled render's exception has no reader left; retrieve it so asyncio does not log it
+        task.exception()
+
+
+preview_budget = PixelBudget(settings.preview_pixel_budget)
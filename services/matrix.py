@@ -0,0 +1,108 @@
+"""Bit-packed QR module matrix shared by every renderer.
+
+A version 40 code has 177x177 modules. qrcode hands them back as 177 lists
+of 177 ``bool`` pointers (~280 KB); :class:`QRMatrix` keeps one bit per
+module in a single ``bytes`` object (~3.9 KB), row-major with the most
+significant bit first and no padding between rows. That layout is also the
+``/api/qr/matrix`` wire format, so it can be sent, cached, pickled to worker
+processes or stored in a BLOB column without conversion.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Iterator, List, Sequence, Tuple
+
+# maps the bytes of a list of bools (b'\x00' / b'\x01') to ASCII digits
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+class QRMatrix:
+    """Immutable square matrix of dark (``True``) and light modules."""
+
+    __slots__ = ('size', '_bits')
+
+    def __init__(self, size: int, bits: bytes) -> None:
+        if len(bits) != (size * size + 7) // 8:
+            raise ValueError(f'{len(bits)} bytes cannot hold a {size}x{size} matrix')
+        self.size = size
+        self._bits = bytes(bits)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[bool]]) -> 'QRMatrix':
+        size = len(rows)
+        digits = b''.join(bytes(map(bool, row)).translate(_DIGITS) for row in rows)
+        nbytes = (size * size + 7) // 8
+        value = int(digits, 2) << (nbytes * 8 - size * size) if digits else 0
+        return cls(size, value.to_bytes(nbytes, 'big'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'QRMatrix':
+        """Inverse of :meth:`to_bytes`; the byte length implies the size of any square matrix."""
+
+        return cls(math.isqrt(len(data) * 8), data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[List[bool]]:
+        # row iteration keeps code written against the List[List[bool]] layout working
+        return iter(self.rows())
+
+    def __getitem__(self, position: Tuple[int, int]) -> bool:
+        y, x = position
+        if not (0 <= y < self.size and 0 <= x < self.size):
+            raise IndexError(position)
+        index = y * self.size + x
+        return bool(self._bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, QRMatrix):
+            return NotImplemented
+        return self.size == other.size and self._bits == other._bits
+
+    def __hash__(self) -> int:
+        return hash((self.size, self._bits))
+
+    def __repr__(self) -> str:
+        return f'QRMatrix(size={self.size}, dark={self.dark_count()})'
+
+    def __reduce__(self):
+        return (QRMatrix, (self.size, self._bits))
+
+    def _digits(self) -> str:
+        total = self.size * self.size
+        return format(int.from_bytes(self._bits, 'big'), f'0{len(self._bits) * 8}b')[:total]
+
+    def rows(self) -> List[List[bool]]:
+        """Expanded ``List[List[bool]]`` copy, for callers that need the qrcode layout."""
+
+        digits = self._digits()
+        return [[digit == '1' for digit in digits[y * self.size:(y + 1) * self.size]] for y in range(self.size)]
+
+    def runs(self) -> Iterator[Tuple[int, int, int]]:
+        """Yield ``(row, start, length)`` for each horizontal run of dark modules."""
+
+        digits = self._digits()
+        size = self.size
+        for y in range(size):
+            x = 0
+            # splitting on light modules leaves one non-empty piece per dark run
+            for piece in digits[y * size:(y + 1) * size].split('0'):
+                if piece:
+                    yield y, x, len(piece)
+                    x += len(piece) + 1
+                else:
+                    x += 1
+
+    def dark_count(self) -> int:
+        # padding bits after the last module are always zero
+        return bin(int.from_bytes(self._bits, 'big')).count('1')
+
+    def to_bytes(self) -> bytes:
+        return self._bits
+
+    def view(self) -> memoryview:
+        """Read-only view of the packed bits, without copying them."""
+
+        return memoryview(self._bits)
@@ -1,17 +1,34 @@
 ﻿from __future__ import annotations
 
 import base64
+import hashlib
 import io
-import uuid
-from dataclasses import dataclass
+import json
+import math
+import threading
+import zlib
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
 
-import qrcode
-from PIL import Image, ImageDraw
+from config import settings
+from core.tracing import span
+from services.matrix import QRMatrix
+from services.render_cache import shared_render_cache
 
+if TYPE_CHECKING:
+    from PIL import Image
 
-@dataclass
+# qrcode and Pillow are imported on first use so importing the app stays cheap
+
+Matrix = QRMatrix
+Renderer = Callable[['QRConfig', Matrix], bytes]
+
+
+@dataclass(frozen=True)
 class QRConfig:
     url: str
     foreground_color: str
@@ -19,6 +36,25 @@ class QRConfig:
     size: int
     padding: int
     border_radius: int
+    overlay_text: Optional[str] = None
+    logo: Optional[str] = None
+
+    def digest(self) -> str:
+        """Stable hash of every field that affects the rendered output."""
+
+        # unset overlays are left out so codes saved before overlays keep their hash
+        fields = {key: value for key, value in asdict(self).items() if value is not None}
+        canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @property
+    def has_overlay(self) -> bool:
+        return bool(self.overlay_text or self.logo)
+
+    @property
+    def error_correction(self) -> int:
+        # an overlay hides the centre of the code, so it needs the strongest level
+        return ERROR_CORRECTION_H if self.has_overlay else ERROR_CORRECTION
 
 
 @dataclass
@@ -27,20 +63,80 @@ class QRPreview:
     png_data: str
 
 
-@dataclass
-class QRRender:
-    svg_text: str
-    png_bytes: bytes
+@dataclass(frozen=True)
+class EncodingPlan:
+    """Mixed-mode segments for a payload and the smallest version that holds them."""
+
+    payload: str
+    segments: Tuple[Tuple[int, str], ...]
+    version: int
+    data_bits: int
+    capacity_bits: int
+    error_correction: int = 0
+
+    @property
+    def efficiency(self) -> float:
+        """Plain byte-mode bits per encoded bit; above 1.0 the segmentation saved space."""
+
+        if not self.data_bits:
+            return 1.0
+        return len(self.payload.encode('utf-8')) * 8 / self.data_bits
+
+    @property
+    def fill(self) -> float:
+        return self.data_bits / self.capacity_bits
 
 
 @dataclass
 class QRAssets:
+    digest: str
     svg_path: Path
     png_path: Path
 
 
+@dataclass(frozen=True)
+class QRFormat:
+    name: str
+    media_type: str
+    render: Renderer
+
+
 HEX_ALPHA = 255
 TRANSPARENT = (0, 0, 0, 0)
+# Bezier control point offset approximating a quarter circle.
+KAPPA = 0.5522847498
+# overlays cover this share of the code's width; level H recovers up to 30% damage
+OVERLAY_RATIO = 0.25
+# PDF/EPS embed the overlay at this many pixels per point
+OVERLAY_VECTOR_SCALE = 4
+LOGO_DIR = Path('generated_logos')
+MAX_LOGO_SIDE = 512
+
+FORMATS: Dict[str, QRFormat] = {}
+
+# mirrors qrcode.constants.ERROR_CORRECT_M/_H and the mode indicators in qrcode.util
+ERROR_CORRECTION = 0
+ERROR_CORRECTION_H = 2
+MODE_NUMBER = 1
+MODE_ALPHA_NUM = 2
+MODE_8BIT_BYTE = 4
+ALPHANUMERIC = frozenset('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:')
+SEGMENT_MODES = (MODE_NUMBER, MODE_ALPHA_NUM, MODE_8BIT_BYTE)
+# per-character cost in sixths of a bit; byte mode is 48 per UTF-8 byte
+SIXTH_COSTS = {MODE_NUMBER: 20, MODE_ALPHA_NUM: 33}
+VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+
+def register_format(name: str, media_type: str) -> Callable[[Renderer], Renderer]:
+    def decorator(func: Renderer) -> Renderer:
+        FORMATS[name] = QRFormat(name=name, media_type=media_type, render=func)
+        return func
+
+    return decorator
+
+
+def format_pattern() -> str:
+    return f"^({'|'.join(FORMATS)})$"
 
 
 def _ensure_dir(path: Path) -> Path:
@@ -60,18 +156,316 @@ def _hex_to_rgba(color: str) -> Tuple[int, int, int, int]:
     return r, g, b, HEX_ALPHA
 
 
-def _create_matrix(config: QRConfig) -> List[List[bool]]:
-    qr = qrcode.QRCode(
-        version=None,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        border=0,
+def _segment_bits(mode: int, text: str, version: int) -> int:
+    from qrcode.util import length_in_bits
+
+    count = len(text)
+    if mode == MODE_NUMBER:
+        body = 10 * (count // 3) + (0, 4, 7)[count % 3]
+    elif mode == MODE_ALPHA_NUM:
+        body = 11 * (count // 2) + 6 * (count % 2)
+    else:
+        body = 8 * len(text.encode('utf-8'))
+    return 4 + length_in_bits(mode, version) + body
+
+
+def _segment(payload: str, version: int) -> List[Tuple[int, str]]:
+    """Split ``payload`` into the cheapest run of numeric/alphanumeric/byte segments.
+
+    Dynamic programming over characters, tracking the cheapest cost of ending in
+    each mode. Costs are kept in sixths of a bit so numeric (10/3 bits per digit)
+    and alphanumeric (11/2 bits per character) stay integral.
+    """
+
+    from qrcode.util import length_in_bits
+
+    if not payload:
+        return []
+    modes = SEGMENT_MODES
+    head = [(4 + length_in_bits(mode, version)) * 6 for mode in modes]
+    costs = list(head)
+    # came_from[i][j]: mode of character i when the segment open after it is modes[j]
+    came_from: List[List[Optional[int]]] = []
+    for char in payload:
+        current = [float('inf')] * len(modes)
+        step: List[Optional[int]] = [None] * len(modes)
+        for j, mode in enumerate(modes):
+            if mode == MODE_NUMBER and not ('0' <= char <= '9'):
+                continue
+            if mode == MODE_ALPHA_NUM and char not in ALPHANUMERIC:
+                continue
+            char_cost = SIXTH_COSTS.get(mode) or 48 * len(char.encode('utf-8'))
+            current[j] = costs[j] + char_cost
+            step[j] = mode
+        for j in range(len(modes)):
+            for k in range(len(modes)):
+                if step[k] is None:
+                    continue
+                switched = -(-current[k] // 6) * 6 + head[j]
+                if step[j] is None or switched < current[j]:
+                    current[j] = switched
+                    step[j] = modes[k]
+        costs = current
+        came_from.append(step)
+
+    mode = modes[min(range(len(modes)), key=lambda j: costs[j])]
+    char_modes: List[int] = [0] * len(payload)
+    for index in range(len(payload) - 1, -1, -1):
+        mode = came_from[index][modes.index(mode)]
+        char_modes[index] = mode
+
+    segments: List[Tuple[int, str]] = []
+    start = 0
+    for index in range(1, len(payload) + 1):
+        if index == len(payload) or char_modes[index] != char_modes[start]:
+            segments.append((char_modes[start], payload[start:index]))
+            start = index
+    return segments
+
+
+def uppercase_host(url: str) -> str:
+    """Upper-case the scheme and host, which URLs compare case-insensitively."""
+
+    parts = urlsplit(url)
+    prefix = f'{parts.scheme}://{parts.netloc}'
+    if not parts.scheme or not parts.netloc or not url.startswith(prefix):
+        return url
+    # user info is case-sensitive; only the host and port follow the '@'
+    userinfo, at, hostport = parts.netloc.rpartition('@')
+    if not hostport.isascii():
+        # Unicode case mapping is not reversible (e.g. 'ß' -> 'SS')
+        return url
+    return f'{parts.scheme.upper()}://{userinfo}{at}{hostport.upper()}{url[len(prefix):]}'
+
+
+def plan_encoding(
+    payload: str, *, upper_host: bool = False, error_correction: int = ERROR_CORRECTION
+) -> EncodingPlan:
+    """Pick optimal segments and the smallest version that fits them at ``error_correction``."""
+
+    from qrcode.exceptions import DataOverflowError
+    from qrcode.util import BIT_LIMIT_TABLE
+
+    if upper_host:
+        payload = uppercase_host(payload)
+    for low, high in VERSION_CLASSES:
+        # character-count field widths are constant within a class
+        segments = _segment(payload, high)
+        bits = sum(_segment_bits(mode, text, high) for mode, text in segments)
+        for version in range(low, high + 1):
+            capacity = BIT_LIMIT_TABLE[error_correction][version]
+            if bits <= capacity:
+                return EncodingPlan(payload, tuple(segments), version, bits, capacity, error_correction)
+    raise DataOverflowError(f'Payload of {len(payload)} characters does not fit in a QR code')
+
+
+def build_matrix(plan: EncodingPlan) -> Matrix:
+    import qrcode
+    from qrcode.util import QRData
+
+    qr = qrcode.QRCode(version=plan.version, error_correction=plan.error_correction, border=0)
+    for mode, text in plan.segments:
+        qr.add_data(QRData(text, mode=mode))
+    qr.make(fit=False)
+    return QRMatrix.from_rows(qr.get_matrix())
+
+
+def encode_url(url: str, *, error_correction: int = ERROR_CORRECTION) -> Matrix:
+    return build_matrix(
+        plan_encoding(url, upper_host=settings.qr_uppercase_host, error_correction=error_correction)
     )
-    qr.add_data(config.url)
-    qr.make(fit=True)
-    return qr.get_matrix()
 
 
-def _render_svg(config: QRConfig, matrix: List[List[bool]]) -> str:
+def fits_capacity(config: QRConfig) -> bool:
+    """Whether ``config.url`` fits in a code at the error-correction level its overlay needs."""
+
+    from qrcode.exceptions import DataOverflowError
+
+    try:
+        plan_encoding(config.url, upper_host=settings.qr_uppercase_host, error_correction=config.error_correction)
+    except DataOverflowError:
+        return False
+    return True
+
+
+def _create_matrix(config: QRConfig) -> Matrix:
+    with span('qr.encode') as active:
+        matrix = encode_url(config.url, error_correction=config.error_correction)
+        if active is not None:
+            active.set(modules=matrix.size)
+        return matrix
+
+
+def logo_path(logo: str) -> Path:
+    return LOGO_DIR / f'{logo}.png'
+
+
+def normalize_logo(data: bytes) -> bytes:
+    """Re-encode an uploaded logo as an RGBA PNG no larger than MAX_LOGO_SIDE."""
+
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((MAX_LOGO_SIDE, MAX_LOGO_SIDE))
+            logo = image.convert('RGBA')
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ValueError('Logo is not a readable image') from exc
+    with io.BytesIO() as buf:
+        logo.save(buf, format='PNG', optimize=True)
+        return buf.getvalue()
+
+
+@lru_cache(maxsize=16)
+def _logo_png(logo: str) -> bytes:
+    return logo_path(logo).read_bytes()
+
+
+def overlay_box(config: QRConfig, modules: int) -> Optional[Tuple[int, int]]:
+    """``(first, side)`` of the centred square of modules cleared for the overlay."""
+
+    if not config.has_overlay:
+        return None
+    side = math.ceil(modules * OVERLAY_RATIO)
+    if (modules - side) % 2:
+        side += 1
+    return (modules - side) // 2, side
+
+
+def _visible_runs(config: QRConfig, matrix: Matrix) -> Iterator[Tuple[int, int, int]]:
+    """Dark-module runs with the overlay square cut out."""
+
+    box = overlay_box(config, len(matrix))
+    if box is None:
+        yield from matrix.runs()
+        return
+    first, side = box
+    last = first + side
+    for y, start, length in matrix.runs():
+        end = start + length
+        if not first <= y < last or end <= first or start >= last:
+            yield y, start, length
+            continue
+        if start < first:
+            yield y, start, first - start
+        if end > last:
+            yield y, last, end - last
+
+
+def _overlay_key(config: QRConfig) -> Tuple[str, str, str]:
+    # logos look the same in every colour scheme, so they share one cache entry
+    if config.logo:
+        return 'logo', config.logo, ''
+    return 'text', config.overlay_text or '', config.foreground_color
+
+
+@lru_cache(maxsize=64)
+def _overlay_layer(key: Tuple[str, str, str], pixels: int) -> Image.Image:
+    """Rasterized logo or text at one pixel size; renders of the same overlay reuse it.
+
+    The returned image is shared and must not be modified.
+    """
+
+    from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+    kind, value, color = key
+    layer = Image.new('RGBA', (pixels, pixels), TRANSPARENT)
+    if kind == 'logo':
+        with Image.open(io.BytesIO(_logo_png(value))) as image:
+            logo = ImageOps.contain(image.convert('RGBA'), (pixels, pixels), Image.LANCZOS)
+        layer.paste(logo, ((pixels - logo.width) // 2, (pixels - logo.height) // 2))
+        return layer
+    draw = ImageDraw.Draw(layer)
+    left, top, right, bottom = draw.textbbox((0, 0), value, font=ImageFont.load_default(size=pixels))
+    scale = min(pixels * 0.9 / max(right - left, 1), pixels * 0.9 / max(bottom - top, 1))
+    font = ImageFont.load_default(size=max(int(pixels * scale), 1))
+    draw.text((pixels / 2, pixels / 2), value, font=font, fill=_hex_to_rgba(color), anchor='mm')
+    return layer
+
+
+def _flat_overlay(config: QRConfig, pixels: int) -> Image.Image:
+    """The overlay composited onto the code background, for formats without alpha."""
+
+    from PIL import Image
+
+    bg = config.background_color
+    flat = Image.new('RGBA', (pixels, pixels), _hex_to_rgba('#FFFFFF' if bg.lower() == 'transparent' else bg))
+    flat.alpha_composite(_overlay_layer(_overlay_key(config), pixels))
+    return flat.convert('RGB')
+
+
+@lru_cache(maxsize=64)
+def _svg_overlay_symbol(key: Tuple[str, str, str]) -> str:
+    kind, value, color = key
+    if kind == 'logo':
+        data = base64.b64encode(_logo_png(value)).decode('ascii')
+        body = f'<image href="data:image/png;base64,{data}" width="100" height="100" preserveAspectRatio="xMidYMid meet" />'
+    else:
+        font_size = _num(min(80, 150 / max(len(value), 1)))
+        body = (
+            f'<text x="50" y="50" text-anchor="middle" dominant-baseline="central" font-family="sans-serif" '
+            f'font-weight="bold" font-size="{font_size}" fill="{color}">{escape(value)}</text>'
+        )
+    return f'<defs><symbol id="qr-overlay" viewBox="0 0 100 100">{body}</symbol></defs>'
+
+
+def _num(value: float) -> str:
+    text = f'{value:.3f}'.rstrip('0').rstrip('.')
+    return text or '0'
+
+
+def _rgb_operands(color: str) -> str:
+    r, g, b, _ = _hex_to_rgba(color)
+    return f'{_num(r / 255)} {_num(g / 255)} {_num(b / 255)}'
+
+
+def _rounded_rect_path(size: float, radius: float, ops: Dict[str, str]) -> str:
+    """Build a closed rounded-square path with y pointing up (PDF/PostScript space)."""
+
+    r = min(radius, size / 2)
+    if r <= 0:
+        return f"0 0 {_num(size)} {_num(size)} {ops['rect']}"
+    k = r * KAPPA
+    s = size
+    parts = [
+        f"{_num(r)} 0 {ops['move']}",
+        f"{_num(s - r)} 0 {ops['line']}",
+        f"{_num(s - r + k)} 0 {_num(s)} {_num(r - k)} {_num(s)} {_num(r)} {ops['curve']}",
+        f"{_num(s)} {_num(s - r)} {ops['line']}",
+        f"{_num(s)} {_num(s - r + k)} {_num(s - r + k)} {_num(s)} {_num(s - r)} {_num(s)} {ops['curve']}",
+        f"{_num(r)} {_num(s)} {ops['line']}",
+        f"{_num(r - k)} {_num(s)} 0 {_num(s - r + k)} 0 {_num(s - r)} {ops['curve']}",
+        f"0 {_num(r)} {ops['line']}",
+        f"0 {_num(r - k)} {_num(r - k)} 0 {_num(r)} 0 {ops['curve']}",
+        ops['close'],
+    ]
+    return '\n'.join(parts)
+
+
+def _vector_body(config: QRConfig, matrix: Matrix, ops: Dict[str, str]) -> str:
+    """Emit background and run-merged module rectangles as fill operations."""
+
+    modules = len(matrix)
+    module_size = config.size / modules
+    total_size = config.size + config.padding * 2
+    lines = []
+    if config.background_color.lower() != 'transparent':
+        lines.append(f"{_rgb_operands(config.background_color)} {ops['color']}")
+        lines.append(_rounded_rect_path(total_size, config.border_radius, ops))
+        lines.append(ops['fill'])
+    lines.append(f"{_rgb_operands(config.foreground_color)} {ops['color']}")
+    height = _num(module_size)
+    for y, start, length in _visible_runs(config, matrix):
+        x0 = config.padding + start * module_size
+        # vector formats place the origin at the bottom-left corner
+        y0 = total_size - config.padding - (y + 1) * module_size
+        lines.append(f"{_num(x0)} {_num(y0)} {_num(length * module_size)} {height} {ops['rect']}")
+    lines.append(ops['fill'])
+    return '\n'.join(lines)
+
+
+@register_format('svg', 'image/svg+xml')
+def _render_svg(config: QRConfig, matrix: Matrix) -> bytes:
     modules = len(matrix)
     module_size = config.size / modules
     total_size = config.size + config.padding * 2
@@ -85,20 +479,27 @@ def _render_svg(config: QRConfig, matrix: List[List[bool]]) -> str:
         )
     pad = config.padding
     fg = config.foreground_color
-    for y, row in enumerate(matrix):
-        for x, cell in enumerate(row):
-            if not cell:
-                continue
-            x0 = pad + x * module_size
-            y0 = pad + y * module_size
-            svg_parts.append(
-                f'<rect x="{x0:.3f}" y="{y0:.3f}" width="{module_size:.3f}" height="{module_size:.3f}" fill="{fg}" />'
-            )
+    for y, start, length in _visible_runs(config, matrix):
+        x0 = pad + start * module_size
+        y0 = pad + y * module_size
+        svg_parts.append(
+            f'<rect x="{x0:.3f}" y="{y0:.3f}" width="{length * module_size:.3f}" height="{module_size:.3f}" fill="{fg}" />'
+        )
+    box = overlay_box(config, modules)
+    if box is not None:
+        # the logo is embedded once in a <symbol> and placed with <use>
+        first, side = box
+        offset = _num(pad + first * module_size)
+        extent = _num(side * module_size)
+        svg_parts.append(_svg_overlay_symbol(_overlay_key(config)))
+        svg_parts.append(f'<use href="#qr-overlay" x="{offset}" y="{offset}" width="{extent}" height="{extent}" />')
     svg_parts.append('</svg>')
-    return ''.join(svg_parts)
+    return ''.join(svg_parts).encode('utf-8')
 
 
-def _render_png(config: QRConfig, matrix: List[List[bool]]) -> bytes:
+def _rasterize(config: QRConfig, matrix: Matrix) -> Image.Image:
+    from PIL import Image, ImageDraw
+
     modules = len(matrix)
     module_size = config.size / modules
     total_size = config.size + config.padding * 2
@@ -107,15 +508,17 @@ def _render_png(config: QRConfig, matrix: List[List[bool]]) -> bytes:
     draw = ImageDraw.Draw(background)
     fg_rgba = _hex_to_rgba(config.foreground_color)
 
-    for y, row in enumerate(matrix):
-        for x, cell in enumerate(row):
-            if not cell:
-                continue
-            x0 = config.padding + x * module_size
-            y0 = config.padding + y * module_size
-            x1 = x0 + module_size
-            y1 = y0 + module_size
-            draw.rectangle([x0, y0, x1, y1], fill=fg_rgba)
+    # one rectangle per run covers the same pixels as one per module
+    for y, start, length in _visible_runs(config, matrix):
+        x0 = config.padding + start * module_size
+        y0 = config.padding + y * module_size
+        draw.rectangle([x0, y0, x0 + length * module_size, y0 + module_size], fill=fg_rgba)
+
+    box = overlay_box(config, modules)
+    if box is not None:
+        first, side = box
+        offset = round(config.padding + first * module_size)
+        background.alpha_composite(_overlay_layer(_overlay_key(config), round(side * module_size)), (offset, offset))
 
     if config.border_radius > 0:
         radius = min(config.border_radius, total_size // 2)
@@ -126,16 +529,179 @@ def _render_png(config: QRConfig, matrix: List[List[bool]]) -> bytes:
         rounded.paste(background, (0, 0), mask=mask)
         background = rounded
 
+    return background
+
+
+@register_format('png', 'image/png')
+def _render_png(config: QRConfig, matrix: Matrix) -> bytes:
+    with io.BytesIO() as buf:
+        _rasterize(config, matrix).save(buf, format='PNG')
+        return buf.getvalue()
+
+
+@register_format('webp', 'image/webp')
+def _render_webp(config: QRConfig, matrix: Matrix) -> bytes:
+    # lossless keeps module edges crisp and still beats PNG on size
     with io.BytesIO() as buf:
-        background.save(buf, format='PNG')
+        _rasterize(config, matrix).save(buf, format='WEBP', lossless=True, method=6)
         return buf.getvalue()
 
 
-def render_qr(config: QRConfig) -> QRRender:
-    matrix = _create_matrix(config)
-    svg_text = _render_svg(config, matrix)
-    png_bytes = _render_png(config, matrix)
-    return QRRender(svg_text=svg_text, png_bytes=png_bytes)
+def _vector_overlay(config: QRConfig, modules: int, box: Tuple[int, int]) -> Tuple[Image.Image, float, float]:
+    """Overlay layer for PDF/EPS plus its offset and extent in points."""
+
+    first, side = box
+    module_size = config.size / modules
+    extent = side * module_size
+    layer = _overlay_layer(_overlay_key(config), max(round(extent * OVERLAY_VECTOR_SCALE), 1))
+    return layer, config.padding + first * module_size, extent
+
+
+PDF_OPS = {'color': 'rg', 'rect': 're', 'move': 'm', 'line': 'l', 'curve': 'c', 'close': 'h', 'fill': 'f'}
+
+
+@register_format('pdf', 'application/pdf')
+def _render_pdf(config: QRConfig, matrix: Matrix) -> bytes:
+    total_size = config.size + config.padding * 2
+    body = _vector_body(config, matrix, PDF_OPS)
+    resources = '<< >>'
+    images = []
+    box = overlay_box(config, len(matrix))
+    if box is not None:
+        layer, offset, extent = _vector_overlay(config, len(matrix), box)
+        rgb = zlib.compress(layer.convert('RGB').tobytes(), 9)
+        alpha = zlib.compress(layer.getchannel('A').tobytes(), 9)
+        image = f'/Type /XObject /Subtype /Image /Width {layer.width} /Height {layer.height} /BitsPerComponent 8'
+        images = [
+            f'<< {image} /ColorSpace /DeviceRGB /SMask 6 0 R /Length {len(rgb)} /Filter /FlateDecode >>\nstream\n'.encode('ascii') + rgb + b'\nendstream',
+            f'<< {image} /ColorSpace /DeviceGray /Length {len(alpha)} /Filter /FlateDecode >>\nstream\n'.encode('ascii') + alpha + b'\nendstream',
+        ]
+        resources = '<< /XObject << /Im1 5 0 R >> >>'
+        body += f'\nq {_num(extent)} 0 0 {_num(extent)} {_num(offset)} {_num(total_size - offset - extent)} cm /Im1 Do Q'
+    content = zlib.compress(body.encode('ascii'), 9)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {total_size} {total_size}] /Resources {resources} /Contents 4 0 R >>'.encode('ascii'),
+        f'<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n'.encode('ascii') + content + b'\nendstream',
+        *images,
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n'
+    xref_offset = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode('ascii')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii')
+    return bytes(out)
+
+
+EPS_OPS = {'color': 'setrgbcolor', 'rect': 'R', 'move': 'moveto', 'line': 'lineto', 'curve': 'curveto', 'close': 'closepath', 'fill': 'fill'}
+# R appends a rectangle subpath so all runs are filled with a single fill
+EPS_PROLOG = '/R { 4 2 roll moveto 1 index 0 rlineto 0 exch rlineto neg 0 rlineto closepath } bind def'
+
+
+@register_format('eps', 'application/postscript')
+def _render_eps(config: QRConfig, matrix: Matrix) -> bytes:
+    total_size = config.size + config.padding * 2
+    box = overlay_box(config, len(matrix))
+    header = '\n'.join(
+        [
+            '%!PS-Adobe-3.0 EPSF-3.0',
+            f'%%BoundingBox: 0 0 {total_size} {total_size}',
+            '%%Creator: QR Forge',
+            # the overlay image uses the Level 3 FlateDecode filter
+            *(['%%LanguageLevel: 3'] if box is not None else []),
+            '%%EndComments',
+            EPS_PROLOG,
+            'gsave',
+        ]
+    )
+    body = _vector_body(config, matrix, EPS_OPS)
+    if box is not None:
+        layer, offset, extent = _vector_overlay(config, len(matrix), box)
+        pixels = layer.width
+        # PostScript images have no alpha channel, so the overlay is flattened onto the background
+        data = base64.a85encode(zlib.compress(_flat_overlay(config, pixels).tobytes(), 9), wrapcol=76).decode('ascii')
+        body += (
+            f'\ngsave {_num(offset)} {_num(total_size - offset - extent)} translate {_num(extent)} {_num(extent)} scale'
+            f'\n{pixels} {pixels} 8 [{pixels} 0 0 -{pixels} 0 {pixels}]'
+            ' currentfile /ASCII85Decode filter /FlateDecode filter false 3 colorimage'
+            f'\n{data}~>\ngrestore'
+        )
+    return f'{header}\n{body}\ngrestore\n%%EOF\n'.encode('ascii')
+
+
+class QRRender:
+    """Lazily encoded matrix and rendered outputs, each produced at most once.
+
+    ``shared`` renders go through the host-wide render cache first, so a hit
+    skips encoding as well as rasterizing.
+    """
+
+    __slots__ = ('config', 'shared', '_matrix', '_outputs')
+
+    def __init__(self, config: QRConfig, matrix: Optional[Matrix] = None, *, shared: bool = False) -> None:
+        self.config = config
+        self.shared = shared
+        self._matrix = matrix
+        self._outputs: Dict[str, bytes] = {}
+
+    @property
+    def matrix(self) -> Matrix:
+        if self._matrix is None:
+            self._matrix = _create_matrix(self.config)
+        return self._matrix
+
+    def get(self, fmt: str) -> bytes:
+        output = self._outputs.get(fmt)
+        if output is None:
+            try:
+                renderer = FORMATS[fmt].render
+            except KeyError:
+                raise ValueError(f'Unsupported format: {fmt}') from None
+            cache = shared_render_cache() if self.shared else None
+            with span('qr.render', format=fmt, shared=cache is not None):
+                if cache is None:
+                    output = renderer(self.config, self.matrix)
+                else:
+                    output = cache.get_or_render(
+                        f'{self.config.digest()}:{fmt}', lambda: renderer(self.config, self.matrix)
+                    )
+            self._outputs[fmt] = output
+        return output
+
+    @property
+    def svg_text(self) -> str:
+        return self.get('svg').decode('utf-8')
+
+    @property
+    def png_bytes(self) -> bytes:
+        return self.get('png')
+
+
+def render_qr(config: QRConfig, matrix: Optional[Matrix] = None, *, shared: bool = False) -> QRRender:
+    """Prepare a render, reusing ``matrix`` when the caller already encoded ``config.url``.
+
+    Pass ``shared=True`` for configs other workers are likely to render too
+    (saved codes rather than keystroke previews).
+    """
+
+    return QRRender(config, matrix, shared=shared)
+
+
+@lru_cache(maxsize=64)
+def _cached_render(config: QRConfig) -> QRRender:
+    return render_qr(config, shared=True)
+
+
+def render_format(config: QRConfig, fmt: str) -> bytes:
+    """Render one format for a config, reusing recent matrices and outputs."""
+
+    return _cached_render(config).get(fmt)
 
 
 def generate_qr_assets(
@@ -144,19 +710,47 @@ def generate_qr_assets(
     svg_dir: Path,
     png_dir: Path,
 ) -> QRAssets:
-    svg_dir = _ensure_dir(svg_dir)
-    png_dir = _ensure_dir(png_dir)
+    """Render and write assets named after a hash of their bytes.
+
+    Identical output always lands on the same paths, so existing files are left alone.
+    """
+
     render = render_qr(config)
+    files = address_qr_assets(render, svg_dir=_ensure_dir(svg_dir), png_dir=_ensure_dir(png_dir))
+    svg, png = render.get('svg'), render.get('png')
+    with span('qr.write', bytes=len(svg) + len(png)):
+        if not files.svg_path.exists():
+            files.svg_path.write_bytes(svg)
+        if not files.png_path.exists():
+            files.png_path.write_bytes(png)
+    return files
+
+
+def address_qr_assets(render: QRRender, *, svg_dir: Path, png_dir: Path) -> QRAssets:
+    """Content-addressed SVG/PNG paths for ``render``; nothing is written."""
+
+    digest = hashlib.sha256(render.get('svg') + b'\0' + render.get('png')).hexdigest()
+    return QRAssets(digest=digest, svg_path=svg_dir / f"{digest}.svg", png_path=png_dir / f"{digest}.png")
+
 
-    svg_filename = f"{uuid.uuid4()}.svg"
-    svg_path = svg_dir / svg_filename
-    svg_path.write_text(render.svg_text, encoding='utf-8')
+class RenderCancelled(Exception):
+    """Raised at a stage boundary of :func:`render_staged` once the caller has given up."""
 
-    png_filename = f"{svg_filename[:-4]}.png"
-    png_path = png_dir / png_filename
-    png_path.write_bytes(render.png_bytes)
 
-    return QRAssets(svg_path=svg_path, png_path=png_path)
+def render_staged(render: QRRender, formats: Tuple[str, ...], cancelled: threading.Event) -> QRRender:
+    """Encode, then produce each format, checking ``cancelled`` before every stage.
+
+    A stage that has started runs to completion; the check only stops the next one.
+    """
+
+    if cancelled.is_set():
+        raise RenderCancelled()
+    render.matrix
+    for fmt in formats:
+        if cancelled.is_set():
+            raise RenderCancelled()
+        render.get(fmt)
+    return render
 
 
 def encode_render(render: QRRender) -> QRPreview:
@@ -164,3 +758,19 @@ def encode_render(render: QRRender) -> QRPreview:
         svg_data=render.svg_text,
         png_data=base64.b64encode(render.png_bytes).decode('ascii'),
     )
+
+
+def warm_up() -> None:
+    """Load the encoder and rasterizer and render one sample code in each stored format."""
+
+    config = QRConfig(
+        url=settings.public_base_url,
+        foreground_color='#000000',
+        background_color='#FFFFFF',
+        size=256,
+        padding=16,
+        border_radius=0,
+    )
+    render = render_qr(config)
+    for fmt in ('svg', 'png'):
+        render.get(fmt)
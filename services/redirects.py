@@ -0,0 +1,132 @@
+"""In-memory resolution of dynamic QR slugs with batched scan counting.
+
+Each worker keeps a ``slug -> destination`` map loaded at startup and updated
+by its own writes; slugs it has not seen (created by another worker) are
+looked up once and cached. Edits and deletes made through another worker
+only reach this one through the database, so every entry is trusted for
+``QR_FORGE_REDIRECT_CACHE_SECONDS`` and then re-read; 0 reads every
+redirect from the database. Scans only bump an in-memory counter, and
+``flush`` writes all pending counts in a single transaction. A slug whose
+row no longer exists is evicted during that flush.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from config import settings
+from models import QRItem
+
+# digits and upper-case letters keep short links inside the QR alphanumeric charset
+SLUG_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SLUG_LENGTH = 8
+PREVIEW_SLUG = "0" * SLUG_LENGTH
+
+logger = logging.getLogger(__name__)
+
+
+def new_slug() -> str:
+    return "".join(secrets.choice(SLUG_ALPHABET) for _ in range(SLUG_LENGTH))
+
+
+def redirect_url(slug: str) -> str:
+    # with upper-cased hosts the whole short link fits the alphanumeric charset
+    prefix = "R" if settings.qr_uppercase_host else "r"
+    return f"{settings.public_base_url.rstrip('/')}/{prefix}/{slug}"
+
+
+class RedirectTable:
+    def __init__(self, *, ttl_seconds: float = 5.0) -> None:
+        self.ttl_seconds = ttl_seconds
+        # slug -> (destination, monotonic time after which it is re-read)
+        self._urls: Dict[str, Tuple[str, float]] = {}
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._clock = time.monotonic
+
+    def load(self, bind: Engine) -> None:
+        urls: Dict[str, Tuple[str, float]] = {}
+        expires = self._clock() + self.ttl_seconds
+        with Session(bind) as session:
+            for slug, url in session.exec(select(QRItem.slug, QRItem.url).where(QRItem.slug.is_not(None))):
+                urls[slug] = (url, expires)
+        self._urls = urls
+
+    def set(self, slug: str, url: str) -> None:
+        self._urls[slug] = (url, self._clock() + self.ttl_seconds)
+
+    def discard(self, slug: str) -> None:
+        self._urls.pop(slug, None)
+
+    def resolve(self, slug: str, session: Optional[Session] = None) -> Optional[str]:
+        cached = self._urls.get(slug)
+        if cached is not None and (session is None or cached[1] > self._clock()):
+            return cached[0]
+        if session is None:
+            return None
+        url = session.exec(select(QRItem.url).where(QRItem.slug == slug)).first()
+        if url is None:
+            # deleted through another worker
+            self.discard(slug)
+        else:
+            self.set(slug, url)
+        return url
+
+    def record_scan(self, slug: str) -> None:
+        with self._lock:
+            self._pending[slug] += 1
+
+    def pending_scans(self) -> int:
+        return sum(self._pending.values())
+
+    def flush(self, bind: Engine) -> int:
+        """Persist pending scan counts in one transaction; returns scans written."""
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+        written = 0
+        try:
+            with Session(bind) as session:
+                for slug, count in pending.items():
+                    result = session.exec(
+                        update(QRItem).where(QRItem.slug == slug).values(scan_count=QRItem.scan_count + count)
+                    )
+                    if result.rowcount:
+                        written += count
+                    else:
+                        self.discard(slug)
+                session.commit()
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return written
+
+
+redirects = RedirectTable(ttl_seconds=settings.redirect_cache_seconds)
+
+
+async def run_scan_flusher(table: RedirectTable, bind: Engine, *, interval_seconds: float) -> None:
+    """Flush scan counts every ``interval_seconds``; a final flush runs on cancellation."""
+
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(table.flush, bind)
+            except Exception:
+                logger.exception("Flushing scan counts failed")
+    finally:
+        await asyncio.to_thread(table.flush, bind)
@@ -0,0 +1,253 @@
+"""Render cache shared by every worker process on a host.
+
+Each uvicorn worker keeps its own in-process ``lru_cache`` of renders, which
+only sees 1/N of the traffic. This second level is a SQLite file (WAL mode,
+memory-mapped reads) that every worker opens, keyed on ``QRConfig.digest()``
+plus the output format.
+
+* Publishing is atomic: a blob becomes visible in the same transaction that
+  inserts it, so readers see either nothing or the whole output.
+* Eviction is approximate LRU: hits refresh ``accessed`` at most once per
+  ``touch_seconds`` and the oldest rows are dropped once the store exceeds
+  ``max_bytes``.
+* Identical misses are single-flight. Threads in one process wait on an
+  event, and processes coordinate through a ``leases`` row that expires, so a
+  crashed worker cannot block a key forever.
+
+The cache is optional (``QR_FORGE_RENDER_CACHE_PATH``); any SQLite error falls
+back to rendering in-process.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS renders (
+        key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS ix_renders_accessed ON renders (accessed)",
+    "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO usage VALUES (1, 0)",
+)
+
+
+@dataclass
+class RenderCacheStats:
+    hits: int = 0
+    misses: int = 0
+    renders: int = 0
+    waits: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class RenderCache:
+    """Size-bounded blob store in a SQLite file that several processes share."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_bytes: int,
+        lease_seconds: float = 10.0,
+        touch_seconds: float = 60.0,
+        poll_seconds: float = 0.005,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.lease_seconds = lease_seconds
+        self.touch_seconds = touch_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.stats = RenderCacheStats()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit; writers open BEGIN IMMEDIATE so they queue on the lock instead of deadlocking
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes * 2}")
+            self._local.conn = conn
+        return conn
+
+    def _begin(self) -> "_Transaction":
+        return _Transaction(self._connect())
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._connect()
+        row = conn.execute("SELECT data, accessed FROM renders WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        data, accessed = row
+        now = time.time()
+        if now - accessed > self.touch_seconds:
+            conn.execute("UPDATE renders SET accessed = ? WHERE key = ?", (now, key))
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._begin() as conn:
+            self._publish(conn, key, data)
+
+    def get_or_render(self, key: str, produce: Callable[[], bytes]) -> bytes:
+        """Return the cached blob for ``key``, rendering it once across all workers on a miss."""
+
+        try:
+            data = self.get(key)
+        except sqlite3.Error:
+            logger.warning("Render cache read failed; rendering locally", exc_info=True)
+            return produce()
+        if data is not None:
+            self.stats.hits += 1
+            return data
+        self.stats.misses += 1
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            # another thread in this worker is already on it
+            self.stats.waits += 1
+            event.wait(self.lease_seconds)
+            return self.get_or_render(key, produce)
+        try:
+            return self._render_once(key, produce)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _render_once(self, key: str, produce: Callable[[], bytes]) -> bytes:
+        try:
+            while True:
+                data = self._acquire(key)
+                if data is not None:
+                    return data
+                if self._owns(key):
+                    break
+                self.stats.waits += 1
+                time.sleep(self.poll_seconds)
+        except sqlite3.Error:
+            logger.warning("Render cache lease failed; rendering locally", exc_info=True)
+            return produce()
+
+        try:
+            data = produce()
+        except BaseException:
+            self._release(key)
+            raise
+        self.stats.renders += 1
+        try:
+            with self._begin() as conn:
+                self._publish(conn, key, data)
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error:
+            logger.warning("Render cache publish failed", exc_info=True)
+        return data
+
+    def _acquire(self, key: str) -> Optional[bytes]:
+        """Return the blob if it was published meanwhile, else try to take the lease for ``key``."""
+
+        now = time.time()
+        with self._begin() as conn:
+            row = conn.execute("SELECT data FROM renders WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return row[0]
+            # take the lease if nobody holds it or the holder died without releasing it
+            conn.execute(
+                """INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                WHERE leases.expires < ?""",
+                (key, self.owner, now + self.lease_seconds, now),
+            )
+        return None
+
+    def _owns(self, key: str) -> bool:
+        row = self._connect().execute("SELECT owner FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == self.owner
+
+    def _release(self, key: str) -> None:
+        try:
+            with self._begin() as conn:
+                conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error:
+            pass  # the lease expires on its own
+
+    def _publish(self, conn: sqlite3.Connection, key: str, data: bytes) -> None:
+        previous = conn.execute("SELECT size FROM renders WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO renders (key, data, size, accessed) VALUES (?, ?, ?, ?)",
+            (key, data, len(data), time.time()),
+        )
+        delta = len(data) - (previous[0] if previous else 0)
+        total = conn.execute("UPDATE usage SET total = total + ? RETURNING total", (delta,)).fetchone()[0]
+        if total > self.max_bytes:
+            self._evict(conn, total)
+
+    def _evict(self, conn: sqlite3.Connection, total: int) -> None:
+        # shed down to 90% so a full cache does not evict on every publish
+        target = self.max_bytes * 9 // 10
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM renders ORDER BY accessed"):
+            if total - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM renders WHERE key = ?", victims)
+        conn.execute("UPDATE usage SET total = total - ?", (freed,))
+        self.stats.evictions += len(victims)
+
+    def usage(self) -> int:
+        return self._connect().execute("SELECT total FROM usage").fetchone()[0]
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+@lru_cache(maxsize=1)
+def shared_render_cache() -> Optional[RenderCache]:
+    """The host-wide cache configured in settings, opened on first use; ``None`` when disabled."""
+
+    if not settings.render_cache_path:
+        return None
+    try:
+        return RenderCache(Path(settings.render_cache_path), max_bytes=settings.render_cache_mb * 1024 * 1024)
+    except sqlite3.Error:
+        logger.warning("Could not open render cache at %s", settings.render_cache_path, exc_info=True)
+        return None
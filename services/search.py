@@ -0,0 +1,56 @@
+"""Full-text search over a user's saved codes.
+
+Queries run against the ``qr_items_fts`` FTS5 index (see ``models.SEARCH_DDL``)
+instead of ``LIKE '%term%'`` scans. User input is never passed to FTS5 as
+query syntax: it is split into words and each word becomes a quoted prefix
+term, so ``camp exa`` finds "Campaign" at ``https://example.com``.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import column, func, literal_column, table
+from sqlmodel import Session, select
+
+from models import SEARCH_TABLE, QRItem
+
+# bm25 weights per indexed column: a title hit counts more than a URL hit
+TITLE_WEIGHT = 10.0
+URL_WEIGHT = 1.0
+MAX_TERMS = 8
+
+_WORD = re.compile(r"\w+")
+_index = table(SEARCH_TABLE, column("rowid"))
+# FTS5 takes the table name itself as the left operand of MATCH and the argument of bm25()
+_index_ref = literal_column(SEARCH_TABLE)
+
+
+def match_query(text: str) -> Optional[str]:
+    """FTS5 ``MATCH`` expression requiring a prefix match of every word, or ``None`` when there is none."""
+
+    words = _WORD.findall(text.lower())[:MAX_TERMS]
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_items(
+    session: Session, user_id: int, text: str, columns: Sequence[Any], *, limit: int, offset: int = 0
+) -> List[Any]:
+    """Rows of ``columns`` for the user's items matching ``text``, best match first."""
+
+    query = match_query(text)
+    if query is None:
+        return []
+    rank = func.bm25(_index_ref, TITLE_WEIGHT, URL_WEIGHT)
+    return session.exec(
+        select(*columns)
+        .select_from(QRItem)
+        .join(_index, _index.c.rowid == QRItem.id)
+        .where(_index_ref.op("MATCH")(query), QRItem.user_id == user_id)
+        .order_by(rank, QRItem.created_at.desc())
+        .limit(limit)
+        .offset(offset)
+    ).all()
@@ -0,0 +1,95 @@
+"""Per-user usage counters and quota checks.
+
+``user_usage`` holds one row per user with the item count, the bytes of the
+SVG/PNG files behind those items and the renders made today. Every change is
+a single upsert of deltas issued in the same transaction as the item change,
+so the totals commit or roll back together with it, and a quota check is one
+primary-key read instead of ``COUNT(*)`` plus ``stat`` calls.
+
+Bytes are counted per item: two items sharing an asset count its files twice,
+which is what the user would download.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import case, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+
+from config import settings
+from models import Asset, UserUsage, utcnow
+
+
+class QuotaExceeded(Exception):
+    """Raised before work that would take a user over a configured quota."""
+
+    def __init__(self, detail: str, *, daily: bool = False) -> None:
+        super().__init__(detail)
+        self.detail = detail
+        # the daily render quota frees up tomorrow; the storage quotas need deletions
+        self.daily = daily
+
+
+def today() -> date:
+    return utcnow().date()
+
+
+def asset_bytes(asset: Optional[Asset]) -> Tuple[int, int]:
+    if asset is None:
+        return 0, 0
+    return asset.svg_bytes or 0, asset.png_bytes or 0
+
+
+def renders_today(usage: UserUsage) -> int:
+    return usage.renders_today if usage.renders_day == today() else 0
+
+
+def record(
+    session: Session, user_id: int, *, items: int = 0, svg_bytes: int = 0, png_bytes: int = 0, renders: int = 0
+) -> None:
+    """Add the deltas to the user's counters in the caller's transaction."""
+
+    day = today()
+    stmt = insert(UserUsage).values(
+        user_id=user_id,
+        item_count=items,
+        svg_bytes=svg_bytes,
+        png_bytes=png_bytes,
+        renders_today=renders,
+        renders_day=day,
+        updated_at=utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserUsage.user_id],
+        set_={
+            "item_count": UserUsage.item_count + items,
+            "svg_bytes": UserUsage.svg_bytes + svg_bytes,
+            "png_bytes": UserUsage.png_bytes + png_bytes,
+            # the first render of a new day restarts the count
+            "renders_today": case((UserUsage.renders_day == day, UserUsage.renders_today + renders), else_=renders),
+            "renders_day": day,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    session.exec(stmt)
+
+
+def forget(session: Session, user_id: int) -> None:
+    session.exec(delete(UserUsage).where(UserUsage.user_id == user_id))
+
+
+def check_quota(session: Session, user_id: int, *, new_item: bool) -> None:
+    """Raise :class:`QuotaExceeded` if one more render (and item, with ``new_item``) is over quota."""
+
+    usage = session.get(UserUsage, user_id)
+    if usage is None:
+        return
+    if new_item and settings.quota_max_items and usage.item_count >= settings.quota_max_items:
+        raise QuotaExceeded(f"Limit of {settings.quota_max_items} saved QR codes reached")
+    if new_item and settings.quota_max_mb and usage.svg_bytes + usage.png_bytes >= settings.quota_max_mb * 1024 * 1024:
+        raise QuotaExceeded(f"Storage limit of {settings.quota_max_mb} MB reached")
+    if settings.quota_renders_per_day and renders_today(usage) >= settings.quota_renders_per_day:
+        raise QuotaExceeded(f"Limit of {settings.quota_renders_per_day} renders per day reached", daily=True)
@@ -140,13 +140,14 @@ let historyCache = new Map();
 function historyCardTemplate(item) {
   const created = formatDate(item.created_at);
   const title = escapeHtml(item.title || 'Untitled QR');
-  // Placeholder src, will be replaced after fetch
+  const scans = item.slug ? ` · ${item.scan_count} scans` : '';
+  // Placeholder src, filled in by loadThumbnails
   return `
     <article class="history-card" data-id="${item.id}" data-title="${title}">
       <img data-thumb-id="${item.id}" alt="Preview for ${title}" loading="lazy" />
       <div class="history-card-body">
         <div class="history-card-title">${title}</div>
-        <div class="history-card-meta">Created ${created}</div>
+        <div class="history-card-meta">Created ${created}${scans}</div>
       </div>
       <div class="history-card-actions">
         <button class="btn ghost small" type="button" data-action="svg" data-id="${item.id}">SVG</button>
@@ -188,48 +189,51 @@ function bindHistoryActions(container) {
   });
 }
 
+async function fetchThumbnailLinks() {
+  try {
+    const res = await authorizedFetch('/api/qr/links?format=png');
+    if (!res.ok) return new Map();
+    const links = await res.json();
+    return new Map(links.map((link) => [String(link.id), link.url]));
+  } catch (err) {
+    return new Map();
+  }
+}
+
+async function loadThumbnails(container, items, links) {
+  for (const item of items) {
+    const img = container.querySelector(`img[data-thumb-id="${item.id}"]`);
+    if (!img) continue;
+    // signed URLs are stable and immutable, so the browser cache serves repeat views
+    const signed = links.get(String(item.id));
+    if (signed) {
+      img.src = signed;
+      continue;
+    }
+    try {
+      const res = await authorizedFetch(`/api/qr/${item.id}/download?format=png&v=${encodeURIComponent(item.updated_at || '')}`);
+      if (res.ok) img.src = URL.createObjectURL(await res.blob());
+    } catch (err) { /* ignore */ }
+  }
+}
+
 async function updateHistoryUI(items) {
   historyCache = new Map(items.map((entry) => [String(entry.id), entry]));
   const hasItems = items.length > 0;
+  const links = hasItems ? await fetchThumbnailLinks() : new Map();
   historyTargets.empty?.classList.toggle('hidden', hasItems);
   if (historyTargets.page) {
     historyTargets.page.classList.toggle('empty', !hasItems);
     historyTargets.page.innerHTML = hasItems ? items.map(historyCardTemplate).join('') : '';
     bindHistoryActions(historyTargets.page);
-    // Fetch and set thumbnails
-    if (hasItems) {
-      for (const item of items) {
-        try {
-          const res = await authorizedFetch(`/api/qr/${item.id}/download?format=png&v=${encodeURIComponent(item.updated_at || '')}`);
-          if (res.ok) {
-            const blob = await res.blob();
-            const url = URL.createObjectURL(blob);
-            const img = historyTargets.page.querySelector(`img[data-thumb-id="${item.id}"]`);
-            if (img) img.src = url;
-          }
-        } catch (err) { /* ignore */ }
-      }
-    }
+    if (hasItems) await loadThumbnails(historyTargets.page, items, links);
   }
   if (historyTargets.drawer) {
     historyTargets.drawer.innerHTML = hasItems
       ? items.slice(0, 8).map(historyCardTemplate).join('')
       : '<div class="history-empty">No QR codes yet. Generate a new one to see it here.</div>';
     bindHistoryActions(historyTargets.drawer);
-    // Fetch and set thumbnails for drawer
-    if (hasItems) {
-      for (const item of items.slice(0, 8)) {
-        try {
-          const res = await authorizedFetch(`/api/qr/${item.id}/download?format=png&v=${encodeURIComponent(item.updated_at || '')}`);
-          if (res.ok) {
-            const blob = await res.blob();
-            const url = URL.createObjectURL(blob);
-            const img = historyTargets.drawer.querySelector(`img[data-thumb-id="${item.id}"]`);
-            if (img) img.src = url;
-          }
-        } catch (err) { /* ignore */ }
-      }
-    }
+    if (hasItems) await loadThumbnails(historyTargets.drawer, items.slice(0, 8), links);
   }
 }
 
@@ -304,6 +308,71 @@ function initHistory() {
   }
 }
 
+function unpackMatrix(modules, base64) {
+  const binary = atob(base64);
+  const matrix = [];
+  for (let y = 0; y < modules; y += 1) {
+    const row = new Array(modules);
+    for (let x = 0; x < modules; x += 1) {
+      const index = y * modules + x;
+      row[x] = (binary.charCodeAt(index >> 3) & (0x80 >> (index & 7))) !== 0;
+    }
+    matrix.push(row);
+  }
+  return matrix;
+}
+
+// Mirrors services/qr.py so local previews match the saved assets.
+function drawMatrix(canvas, matrix, payload) {
+  const total = payload.size + payload.padding * 2;
+  const moduleSize = payload.size / matrix.length;
+  canvas.width = total;
+  canvas.height = total;
+  const ctx = canvas.getContext('2d');
+  ctx.clearRect(0, 0, total, total);
+  ctx.save();
+  if (payload.border_radius > 0) {
+    ctx.beginPath();
+    ctx.roundRect(0, 0, total, total, Math.min(payload.border_radius, Math.floor(total / 2)));
+    ctx.clip();
+  }
+  if (payload.background_color !== 'transparent') {
+    ctx.fillStyle = payload.background_color;
+    ctx.fillRect(0, 0, total, total);
+  }
+  ctx.fillStyle = payload.foreground_color;
+  matrix.forEach((row, y) => {
+    row.forEach((cell, x) => {
+      if (cell) ctx.fillRect(payload.padding + x * moduleSize, payload.padding + y * moduleSize, moduleSize, moduleSize);
+    });
+  });
+  ctx.restore();
+}
+
+function matrixToSvg(matrix, payload) {
+  const total = payload.size + payload.padding * 2;
+  const moduleSize = payload.size / matrix.length;
+  const parts = [`<svg xmlns="http://www.w3.org/2000/svg" width="${total}" height="${total}" viewBox="0 0 ${total} ${total}">`];
+  if (payload.background_color !== 'transparent') {
+    parts.push(`<rect width="${total}" height="${total}" fill="${payload.background_color}" rx="${payload.border_radius}" ry="${payload.border_radius}" />`);
+  }
+  const size = moduleSize.toFixed(3);
+  matrix.forEach((row, y) => {
+    row.forEach((cell, x) => {
+      if (!cell) return;
+      const x0 = (payload.padding + x * moduleSize).toFixed(3);
+      const y0 = (payload.padding + y * moduleSize).toFixed(3);
+      parts.push(`<rect x="${x0}" y="${y0}" width="${size}" height="${size}" fill="${payload.foreground_color}" />`);
+    });
+  });
+  parts.push('</svg>');
+  return parts.join('');
+}
+
+function canvasToBlob(canvas) {
+  return new Promise((resolve) => canvas.toBlob(resolve, 'image/png'));
+}
+
 function payloadFromForm(form) {
   const transparent = form.querySelector('#bgTransparent')?.checked;
   return {
@@ -314,9 +383,16 @@ function payloadFromForm(form) {
     size: Number(form.querySelector('#sizeRange')?.value || 512),
     padding: Number(form.querySelector('#paddingRange')?.value || 16),
     border_radius: Number(form.querySelector('#radiusRange')?.value || 0),
+    dynamic: Boolean(form.querySelector('#dynamicCode')?.checked),
+    overlay_text: form.querySelector('#overlayText')?.value?.trim() || null,
+    logo_id: form.dataset.logoId || null,
   };
 }
 
+function hasOverlay(payload) {
+  return Boolean(payload.overlay_text || payload.logo_id);
+}
+
 function payloadsMatch(a, b) {
   if (!a || !b) return false;
   return (
@@ -326,7 +402,10 @@ function payloadsMatch(a, b) {
     a.background_color === b.background_color &&
     a.size === b.size &&
     a.padding === b.padding &&
-    a.border_radius === b.border_radius
+    a.border_radius === b.border_radius &&
+    a.dynamic === b.dynamic &&
+    a.overlay_text === b.overlay_text &&
+    a.logo_id === b.logo_id
   );
 }
 
@@ -347,6 +426,9 @@ function initGenerator() {
   const paddingRange = document.getElementById('paddingRange');
   const radiusRange = document.getElementById('radiusRange');
   const urlInput = document.getElementById('url');
+  const dynamicCode = document.getElementById('dynamicCode');
+  const overlayText = document.getElementById('overlayText');
+  const logoFile = document.getElementById('logoFile');
   const sizeValue = document.getElementById('sizeValue');
   const paddingValue = document.getElementById('paddingValue');
   const previewBtn = document.getElementById('previewBtn');
@@ -356,13 +438,85 @@ function initGenerator() {
   const openHistoryBtn = document.getElementById('openHistory');
   const closeHistoryBtn = document.getElementById('closeHistory');
   const historyDrawer = document.getElementById('historyDrawer');
+  const localRender = document.getElementById('localRender');
+  const localRenderKey = 'qrforge_local_render';
+  const canvasSupported = typeof document.createElement('canvas').getContext('2d')?.roundRect === 'function';
 
   const formElements = form ? Array.from(form.querySelectorAll('input, button')) : [];
-  const controlInputs = [fgColor, bgColor, bgTransparent, sizeRange, paddingRange, radiusRange, urlInput];
+  const controlInputs = [fgColor, bgColor, bgTransparent, sizeRange, paddingRange, radiusRange, urlInput, dynamicCode, overlayText, logoFile];
 
   let lastPreview = null;
   let lastSaved = null;
   let previewDebounce = null;
+  // aborting a superseded preview disconnects it, so the server drops the render
+  let previewAbort = null;
+  let previewObjectUrl = null;
+
+  // Live slider previews stream over a WebSocket; HTTP previews remain the fallback.
+  const previewSocket = {
+    ws: null,
+    ready: false,
+    seq: 0,
+    frameSeq: null,
+    sent: {},
+    payloads: new Map(),
+  };
+  const socketFields = ['url', 'foreground_color', 'background_color', 'size', 'padding', 'border_radius', 'dynamic', 'overlay_text', 'logo_id'];
+
+  // In local mode only URL changes reach the server; styling is painted on a canvas.
+  const localMatrix = { url: null, matrix: null, request: null };
+  const previewCanvas = document.createElement('canvas');
+
+  if (localRender) {
+    localRender.checked = canvasSupported && localStorage.getItem(localRenderKey) !== 'false';
+    localRender.disabled = !canvasSupported;
+    localRender.addEventListener('change', () => {
+      localStorage.setItem(localRenderKey, String(localRender.checked));
+    });
+  }
+
+  function localRenderEnabled() {
+    return Boolean(localRender?.checked && canvasSupported);
+  }
+
+  async function fetchMatrix(target, dynamic) {
+    // every dynamic code encodes a short link of the same shape, whatever its destination
+    const url = dynamic ? 'dynamic' : target;
+    if (localMatrix.url === url && localMatrix.matrix) return localMatrix.matrix;
+    if (localMatrix.request?.url === url) return localMatrix.request.promise;
+    const query = `url=${encodeURIComponent(target)}${dynamic ? '&dynamic=true' : ''}`;
+    const promise = authorizedFetch(`/api/qr/matrix?${query}`)
+      .then(async (res) => {
+        if (!res.ok) throw new Error(await res.text());
+        const data = await res.json();
+        const matrix = unpackMatrix(data.modules, data.data);
+        if (localMatrix.request?.url === url) {
+          Object.assign(localMatrix, { url, matrix, request: null });
+        }
+        return matrix;
+      });
+    localMatrix.request = { url, promise };
+    return promise;
+  }
+
+  async function handleLocalPreview(payload) {
+    try {
+      new URL(payload.url);
+    } catch (err) {
+      return;
+    }
+    try {
+      const matrix = await fetchMatrix(payload.url, payload.dynamic);
+      drawMatrix(previewCanvas, matrix, payload);
+      showPreviewSrc(previewCanvas.toDataURL('image/png'), payload);
+      rememberPreview({ payload, matrix, svg: null });
+    } catch (err) {
+      if (err.message !== 'Unauthorized') {
+        console.error(err);
+        toast('Unable to preview QR');
+      }
+    }
+  }
 
   function setGeneratorAuthState(authed) {
     guard?.classList.toggle('hidden', authed);
@@ -372,7 +526,10 @@ function initGenerator() {
       if (el) el.disabled = !authed;
     });
     saveBtn.disabled = !authed;
-    if (!authed) {
+    if (authed) {
+      connectPreviewSocket();
+    } else {
+      previewSocket.ws?.close();
       historyDrawer?.classList.remove('open');
       lastPreview = null;
       lastSaved = null;
@@ -399,15 +556,82 @@ function initGenerator() {
     previewImg.style.borderRadius = `${Math.max(payload.border_radius - 4, 0)}px`;
   }
 
-  function setPreviewFromBase64(pngData, payload) {
-    if (!pngData || !previewImg) return;
-    const dataUrl = `data:image/png;base64,${pngData}`;
-    previewImg.src = dataUrl;
+  function showPreviewSrc(src, payload) {
+    if (!previewImg) return;
+    previewImg.src = src;
     previewImg.style.display = 'block';
     previewEmpty?.classList.add('hidden');
     applyPreviewStyles(payload);
   }
 
+  function setPreviewFromBase64(pngData, payload) {
+    if (!pngData) return;
+    showPreviewSrc(`data:image/png;base64,${pngData}`, payload);
+  }
+
+  function setPreviewFromBlob(blob, payload) {
+    if (previewObjectUrl) URL.revokeObjectURL(previewObjectUrl);
+    previewObjectUrl = URL.createObjectURL(blob);
+    showPreviewSrc(previewObjectUrl, payload);
+  }
+
+  function rememberPreview(preview) {
+    lastPreview = preview;
+    if (!lastSaved || !payloadsMatch(lastSaved.payload, preview.payload)) {
+      lastSaved = null;
+    }
+    saveBtn.disabled = false;
+  }
+
+  function handleSocketFrame(blob) {
+    const payload = previewSocket.payloads.get(previewSocket.frameSeq);
+    if (!payload) return;
+    previewSocket.payloads.forEach((_, seq) => {
+      if (seq <= previewSocket.frameSeq) previewSocket.payloads.delete(seq);
+    });
+    setPreviewFromBlob(blob, payload);
+    rememberPreview({ payload, pngBlob: blob, svg: null });
+  }
+
+  function connectPreviewSocket() {
+    if (!('WebSocket' in window) || !isAuthed() || previewSocket.ws) return;
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${scheme}://${window.location.host}/ws/qr/preview`);
+    ws.binaryType = 'blob';
+    ws.addEventListener('open', () => ws.send(JSON.stringify({ token: authState.token })));
+    ws.addEventListener('message', (event) => {
+      if (typeof event.data !== 'string') {
+        handleSocketFrame(event.data);
+        return;
+      }
+      const message = JSON.parse(event.data);
+      if (message.type === 'ready') {
+        previewSocket.ready = true;
+      } else if (message.type === 'frame') {
+        previewSocket.frameSeq = message.seq;
+      } else if (message.type === 'error') {
+        previewSocket.payloads.delete(message.seq);
+      }
+    });
+    ws.addEventListener('close', () => {
+      Object.assign(previewSocket, { ws: null, ready: false, seq: 0, frameSeq: null, sent: {} });
+      previewSocket.payloads.clear();
+    });
+    previewSocket.ws = ws;
+  }
+
+  function sendPreviewDelta(payload) {
+    const delta = {};
+    socketFields.forEach((field) => {
+      if (previewSocket.sent[field] !== payload[field]) delta[field] = payload[field];
+    });
+    if (Object.keys(delta).length === 0) return;
+    previewSocket.ws.send(JSON.stringify(delta));
+    Object.assign(previewSocket.sent, delta);
+    previewSocket.seq += 1;
+    previewSocket.payloads.set(previewSocket.seq, payload);
+  }
+
   async function requestPreview(payload) {
     if (!isAuthed()) return null;
     if (!payload.url) return null;
@@ -416,10 +640,13 @@ function initGenerator() {
     } catch (err) {
       return null;
     }
+    previewAbort?.abort();
+    previewAbort = new AbortController();
     const res = await authorizedFetch('/api/qr/preview', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(payload),
+      signal: previewAbort.signal,
     });
     if (!res.ok) throw new Error(await res.text());
     return res.json();
@@ -430,16 +657,13 @@ function initGenerator() {
       const preview = await requestPreview(payload);
       if (!preview) return;
       setPreviewFromBase64(preview.png_data, payload);
-      lastPreview = {
+      rememberPreview({
         payload,
         pngData: preview.png_data,
         svg: preview.svg_data,
-      };
-      if (!lastSaved || !payloadsMatch(lastSaved.payload, payload)) {
-        lastSaved = null;
-      }
-      saveBtn.disabled = false;
+      });
     } catch (err) {
+      if (err.name === 'AbortError') return;
       if (err.message !== 'Unauthorized') {
         console.error(err);
         toast('Unable to preview QR');
@@ -450,6 +674,25 @@ function initGenerator() {
   function schedulePreview(payload) {
     if (!isAuthed()) return;
     if (previewDebounce) clearTimeout(previewDebounce);
+    // overlays change the error-correction level, so only the server can render them
+    if (localRenderEnabled() && !hasOverlay(payload)) {
+      if (payload.url === localMatrix.url) {
+        handleLocalPreview(payload);
+      } else {
+        previewDebounce = setTimeout(() => handleLocalPreview(payload), 250);
+      }
+      return;
+    }
+    if (previewSocket.ready) {
+      try {
+        new URL(payload.url);
+      } catch (err) {
+        return;
+      }
+      // the server renders only the newest config, so no debounce is needed
+      sendPreviewDelta(payload);
+      return;
+    }
     previewDebounce = setTimeout(() => {
       handlePreview(payload);
     }, 250);
@@ -464,7 +707,8 @@ function initGenerator() {
       return;
     }
     previewBtn.disabled = true;
-    handlePreview(payload).finally(() => {
+    const preview = localRenderEnabled() && !hasOverlay(payload) ? handleLocalPreview(payload) : handlePreview(payload);
+    preview.finally(() => {
       previewBtn.disabled = false;
     });
   });
@@ -493,13 +737,54 @@ function initGenerator() {
     }
   });
 
-  [fgColor, bgColor, bgTransparent, sizeRange, paddingRange, radiusRange, urlInput].forEach((input) => {
+  async function uploadLogo(file) {
+    const data = await new Promise((resolve, reject) => {
+      const reader = new FileReader();
+      reader.onload = () => resolve(String(reader.result).split(',')[1]);
+      reader.onerror = () => reject(reader.error);
+      reader.readAsDataURL(file);
+    });
+    const res = await authorizedFetch('/api/qr/logos', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ data }),
+    });
+    if (!res.ok) throw new Error(await res.text());
+    return (await res.json()).logo_id;
+  }
+
+  logoFile?.addEventListener('change', async () => {
+    if (!form) return;
+    delete form.dataset.logoId;
+    const file = logoFile.files?.[0];
+    if (file) {
+      try {
+        form.dataset.logoId = await uploadLogo(file);
+        if (overlayText) overlayText.value = '';
+      } catch (err) {
+        if (err.message !== 'Unauthorized') {
+          console.error(err);
+          toast('Unable to upload logo');
+        }
+        logoFile.value = '';
+      }
+    }
+    const payload = payloadFromForm(form);
+    if (payload.url) schedulePreview(payload);
+  });
+
+  [fgColor, bgColor, bgTransparent, sizeRange, paddingRange, radiusRange, urlInput, dynamicCode, overlayText].forEach((input) => {
     input?.addEventListener('input', () => {
       applyControlLabels();
       if (!form) return;
       if (input === bgTransparent) {
         bgColor.disabled = bgTransparent.checked;
       }
+      if (input === overlayText && overlayText.value.trim()) {
+        // text and logo overlays are exclusive
+        delete form.dataset.logoId;
+        if (logoFile) logoFile.value = '';
+      }
       const payload = payloadFromForm(form);
       if (!payload.url) return;
       schedulePreview(payload);
@@ -510,7 +795,7 @@ function initGenerator() {
     bgColor.disabled = true;
   }
 
-  dlSvg?.addEventListener('click', () => {
+  dlSvg?.addEventListener('click', async () => {
     if (!lastPreview) {
       toast('Preview a QR code first');
       return;
@@ -520,11 +805,26 @@ function initGenerator() {
       downloadAsset(lastSaved.item, 'svg');
       return;
     }
+    const { payload } = lastPreview;
+    if (!lastPreview.svg && lastPreview.matrix) {
+      lastPreview.svg = matrixToSvg(lastPreview.matrix, payload);
+    }
+    if (!lastPreview.svg) {
+      // socket frames carry PNG only; fetch the markup on demand
+      try {
+        const preview = await requestPreview(payload);
+        if (!preview) return;
+        lastPreview.svg = preview.svg_data;
+      } catch (err) {
+        if (err.message !== 'Unauthorized') toast('Unable to download file');
+        return;
+      }
+    }
     const blob = new Blob([lastPreview.svg], { type: 'image/svg+xml' });
-    triggerDownload(blob, sanitizeFilename(lastPreview.payload.title, 'svg'));
+    triggerDownload(blob, sanitizeFilename(payload.title, 'svg'));
   });
 
-  dlPng?.addEventListener('click', () => {
+  dlPng?.addEventListener('click', async () => {
     if (!lastPreview) {
       toast('Preview a QR code first');
       return;
@@ -534,7 +834,13 @@ function initGenerator() {
       downloadAsset(lastSaved.item, 'png');
       return;
     }
-    const blob = base64ToBlob(lastPreview.pngData, 'image/png');
+    let blob = lastPreview.pngBlob;
+    if (!blob && lastPreview.matrix) {
+      const canvas = document.createElement('canvas');
+      drawMatrix(canvas, lastPreview.matrix, lastPreview.payload);
+      blob = await canvasToBlob(canvas);
+    }
+    blob = blob || base64ToBlob(lastPreview.pngData, 'image/png');
     triggerDownload(blob, sanitizeFilename(lastPreview.payload.title, 'png'));
   });
 
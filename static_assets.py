@@ -0,0 +1,152 @@
+"""Fingerprinted, precompressed static files.
+
+At startup every file under a mounted directory is hashed and, for text
+types, compressed once with gzip (and brotli when the ``brotli`` package is
+installed). Templates link to ``name.<hash>.ext`` URLs through
+``static_url``; those URLs never change content, so they are served from
+memory with one-year immutable caching and the best encoding the client
+accepts. Plain URLs keep working through the regular ``StaticFiles`` path.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+
+from core.compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FINGERPRINT_LENGTH = 10
+_FINGERPRINTED = re.compile(rf"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{{{FINGERPRINT_LENGTH}}})(?P<suffix>\.[^./]+)$")
+
+
+@dataclass
+class StaticEntry:
+    digest: str
+    media_type: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class StaticManifest:
+    """Content hashes and encoded variants for the files of one mount."""
+
+    def __init__(self, directory: Path, prefix: str) -> None:
+        self.directory = Path(directory)
+        self.prefix = prefix.rstrip("/")
+        self.entries: Dict[str, StaticEntry] = {}
+
+    def build(self) -> None:
+        entries: Dict[str, StaticEntry] = {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            data = path.read_bytes()
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            entry = StaticEntry(
+                digest=hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH],
+                media_type=media_type,
+                variants={"identity": data},
+            )
+            if path.suffix in COMPRESSIBLE_SUFFIXES:
+                entry.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+                if brotli is not None:
+                    entry.variants["br"] = brotli.compress(data, quality=11)
+            entries[path.relative_to(self.directory).as_posix()] = entry
+        self.entries = entries
+
+    def url(self, relative: str) -> str:
+        relative = relative.lstrip("/")
+        entry = self.entries.get(relative)
+        if entry is None:
+            return f"{self.prefix}/{relative}"
+        stem, dot, suffix = relative.rpartition(".")
+        if not dot:
+            return f"{self.prefix}/{relative}.{entry.digest}"
+        return f"{self.prefix}/{stem}.{entry.digest}.{suffix}"
+
+    def resolve(self, fingerprinted: str) -> Optional[StaticEntry]:
+        match = _FINGERPRINTED.match(fingerprinted)
+        if not match:
+            return None
+        entry = self.entries.get(match["stem"] + match["suffix"])
+        if entry is None or entry.digest != match["digest"]:
+            return None
+        return entry
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """``StaticFiles`` that serves fingerprinted URLs from a precompressed manifest."""
+
+    def __init__(self, *, directory: Path, manifest: StaticManifest) -> None:
+        super().__init__(directory=directory)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        entry = self.manifest.resolve(path)
+        if entry is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        headers = Headers(scope=scope)
+        response_headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "ETag": entry.etag,
+            "Vary": "Accept-Encoding",
+        }
+        if entry.etag in headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=response_headers)
+
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in entry.variants and accepted.get(candidate, 0) > 0:
+                encoding = candidate
+                break
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        body = entry.variants[encoding]
+        if scope["method"] == "HEAD":
+            response_headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(content=body, media_type=entry.media_type, headers=response_headers)
+
+
+class StaticRegistry:
+    """All fingerprinted mounts, exposed to templates as ``static_url``."""
+
+    def __init__(self) -> None:
+        self.manifests: List[StaticManifest] = []
+
+    def add(self, directory: Path, prefix: str) -> StaticManifest:
+        manifest = StaticManifest(directory, prefix)
+        self.manifests.append(manifest)
+        return manifest
+
+    def build(self) -> None:
+        for manifest in self.manifests:
+            manifest.build()
+
+    def static_url(self, url: str) -> str:
+        for manifest in self.manifests:
+            if url.startswith(manifest.prefix + "/"):
+                return manifest.url(url[len(manifest.prefix) + 1:])
+        return url
@@ -0,0 +1,378 @@
+"""Content-addressed storage for rendered QR assets.
+
+Assets are keyed by a hash of their rendered bytes and shared between every
+``QRItem`` that renders identically. Each reference bumps ``Asset.refcount``;
+files are unlinked only once the last reference is released.
+
+File I/O never happens in the request path: writes and unlinks are queued on
+:data:`asset_writer`, whose thread writes to a temporary file, fsyncs and
+renames it into place. New assets are ``pending`` until their files land.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from config import settings
+from core.tracing import span
+from models import ASSET_PENDING, ASSET_READY, Asset, QRItem, utcnow
+from services.qr import Matrix, QRConfig, address_qr_assets, logo_path, normalize_logo, render_qr
+from services.redirects import redirect_url
+
+SVG_DIR = Path("generated_svgs")
+PNG_DIR = Path("generated_pngs")
+
+logger = logging.getLogger(__name__)
+
+
+class AssetWriter:
+    """Single I/O thread that persists asset files in the order they were queued.
+
+    Each wake-up drains up to ``max_batch`` queued operations. A run of writes
+    lands in phases: every temporary file is written, then fsynced, then
+    renamed into place, and finally each touched directory is fsynced once, so
+    a batch costs one directory sync rather than one per file. Until a write
+    is renamed its bytes stay readable through :meth:`pending_bytes`.
+
+    Unlinks are queued after the releasing transaction commits, so a
+    concurrent request may have re-created the same content-addressed asset
+    by the time they run. When :attr:`referenced` is set, paths it reports as
+    still in use are kept.
+    """
+
+    def __init__(self, *, fsync: bool = True, max_batch: int = 64) -> None:
+        self.fsync = fsync
+        self.max_batch = max_batch
+        self.on_flushed: Optional[Callable[[List[str]], None]] = None
+        self.referenced: Optional[Callable[[List[str]], Set[str]]] = None
+        self._queue: "queue.Queue[object]" = queue.Queue()
+        self._pending: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="asset-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, asset_id: str, files: Dict[Path, bytes]) -> Future:
+        """Queue ``files`` for ``asset_id``; the future resolves once all of them are durable."""
+
+        future: Future = Future()
+        with self._lock:
+            for path, data in files.items():
+                self._pending[str(path)] = data
+        self._ensure_started()
+        self._queue.put(("write", asset_id, files, future))
+        return future
+
+    def remove(self, *paths: Optional[str]) -> None:
+        paths = tuple(path for path in paths if path)
+        if paths:
+            self._ensure_started()
+            self._queue.put(("unlink", paths))
+
+    def pending_bytes(self, path: str) -> Optional[bytes]:
+        with self._lock:
+            return self._pending.get(str(path))
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been processed."""
+
+        done = threading.Event()
+        self._ensure_started()
+        self._queue.put(("barrier", done))
+        done.wait()
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            self._process([op for op in batch if op is not None])
+            if stop:
+                return
+
+    def _process(self, batch: List[tuple]) -> None:
+        # consecutive runs keep an unlink queued after a write (or vice versa) in order
+        run: List[tuple] = []
+        for op in batch:
+            if run and op[0] != run[0][0]:
+                self._process_run(run)
+                run = []
+            run.append(op)
+        if run:
+            self._process_run(run)
+
+    def _process_run(self, run: List[tuple]) -> None:
+        kind = run[0][0]
+        if kind == "unlink":
+            remove_files(*self._unreferenced([path for _, paths in run for path in paths]))
+        elif kind == "barrier":
+            for _, done in run:
+                done.set()
+        else:
+            self._write_run(run)
+
+    def _unreferenced(self, paths: List[str]) -> List[str]:
+        if self.referenced is None:
+            return paths
+        try:
+            live = self.referenced(paths)
+        except Exception:
+            # keeping a file is recoverable (the garbage collector finds it), deleting a live one is not
+            logger.exception("Checking asset references failed; keeping %d files", len(paths))
+            return []
+        return [path for path in paths if path not in live]
+
+    def _write_run(self, run: List[tuple]) -> None:
+        staged: List[Tuple[str, Path, Path]] = []
+        failed: Dict[str, BaseException] = {}
+        for _, asset_id, files, _ in run:
+            for path, data in files.items():
+                temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(temp, "wb") as handle:
+                        handle.write(data)
+                        if self.fsync:
+                            handle.flush()
+                            os.fsync(handle.fileno())
+                    staged.append((asset_id, temp, path))
+                except OSError as exc:
+                    failed[asset_id] = exc
+        directories = set()
+        for asset_id, temp, path in staged:
+            try:
+                os.replace(temp, path)
+            except OSError as exc:
+                # the thread must survive, or this batch's futures and every later flush() would hang
+                failed[asset_id] = exc
+                remove_files(str(temp))
+                continue
+            directories.add(path.parent)
+        if self.fsync:
+            for directory in directories:
+                _fsync_directory(directory)
+
+        with self._lock:
+            for _, _, files, _ in run:
+                for path in files:
+                    self._pending.pop(str(path), None)
+        flushed = []
+        for _, asset_id, _, future in run:
+            if asset_id in failed:
+                logger.error("Writing asset %s failed", asset_id, exc_info=failed[asset_id])
+                future.set_exception(failed[asset_id])
+            else:
+                flushed.append(asset_id)
+                future.set_result(asset_id)
+        if flushed and self.on_flushed is not None:
+            try:
+                self.on_flushed(flushed)
+            except Exception:
+                logger.exception("Marking assets ready failed")
+
+
+def _fsync_directory(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # not supported for directories on every platform
+    finally:
+        os.close(fd)
+
+
+asset_writer = AssetWriter(fsync=settings.asset_fsync, max_batch=settings.asset_write_batch)
+
+
+def ensure_dirs() -> None:
+    for directory in (SVG_DIR, PNG_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+
+
+def item_config(item: QRItem) -> QRConfig:
+    return QRConfig(
+        # dynamic codes encode their short link, not the destination
+        url=redirect_url(item.slug) if item.slug else item.url,
+        foreground_color=item.foreground_color,
+        background_color=item.background_color,
+        size=item.size,
+        padding=item.padding,
+        border_radius=item.border_radius,
+        overlay_text=item.overlay_text,
+        logo=item.logo_id,
+    )
+
+
+def store_logo(data: bytes) -> str:
+    """Normalise an uploaded logo and store it under its content hash, which is returned.
+
+    Raises ``ValueError`` for data Pillow cannot read. Unlike QR assets this
+    waits for the write, since renders read logos straight from disk.
+    """
+
+    logo = normalize_logo(data)
+    digest = hashlib.sha256(logo).hexdigest()
+    path = logo_path(digest)
+    if not path.exists():
+        asset_writer.write(digest, {path: logo}).result()
+    return digest
+
+
+def acquire_asset(
+    session: Session, config: QRConfig, *, svg_dir: Path, png_dir: Path, matrix: Optional[Matrix] = None
+) -> Asset:
+    """Take a reference on the asset for ``config``, rendering it only on a miss.
+
+    Pass ``matrix`` when it is already known for ``config.url`` to skip encoding.
+    The refcount is updated in the caller's transaction; the caller commits.
+    """
+
+    config_hash = config.digest()
+    known = session.exec(select(Asset).where(Asset.config_hash == config_hash)).first()
+    if known is not None and all(
+        asset_writer.pending_bytes(path) is not None or Path(path).exists()
+        for path in (known.svg_path, known.png_path)
+    ):
+        stmt = insert(Asset).values(
+            id=known.id,
+            config_hash=config_hash,
+            svg_path=known.svg_path,
+            png_path=known.png_path,
+            refcount=1,
+            created_at=utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(index_elements=[Asset.id], set_={"refcount": Asset.refcount + 1})
+        session.exec(stmt)
+        return session.get(Asset, known.id, populate_existing=True)
+
+    render = render_qr(config, matrix, shared=True)
+    files = address_qr_assets(render, svg_dir=svg_dir, png_dir=png_dir)
+    stmt = insert(Asset).values(
+        id=files.digest,
+        config_hash=config_hash,
+        svg_path=str(files.svg_path),
+        png_path=str(files.png_path),
+        refcount=1,
+        status=ASSET_PENDING,
+        matrix=render.matrix.to_bytes(),
+        svg_bytes=len(render.get("svg")),
+        png_bytes=len(render.get("png")),
+        created_at=utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Asset.id],
+        set_={
+            "refcount": Asset.refcount + 1,
+            "svg_path": stmt.excluded.svg_path,
+            "png_path": stmt.excluded.png_path,
+            "status": stmt.excluded.status,
+            "matrix": stmt.excluded.matrix,
+            "svg_bytes": stmt.excluded.svg_bytes,
+            "png_bytes": stmt.excluded.png_bytes,
+        },
+    )
+    session.exec(stmt)
+    # the row can commit right away; the files follow on the writer thread
+    svg, png = render.get("svg"), render.get("png")
+    with span("storage.enqueue_write", bytes=len(svg) + len(png)):
+        asset_writer.write(files.digest, {files.svg_path: svg, files.png_path: png})
+    return session.get(Asset, files.digest, populate_existing=True)
+
+
+def mark_assets_ready(bind: Engine, asset_ids: List[str]) -> None:
+    with Session(bind) as session:
+        session.exec(
+            update(Asset)
+            .where(Asset.id.in_(asset_ids), Asset.status == ASSET_PENDING)
+            .values(status=ASSET_READY)
+        )
+        session.commit()
+
+
+def referenced_paths(bind: Engine, paths: List[str]) -> Set[str]:
+    """The subset of ``paths`` that an asset row still points at."""
+
+    with Session(bind) as session:
+        rows = session.exec(
+            select(Asset.svg_path, Asset.png_path).where(or_(Asset.svg_path.in_(paths), Asset.png_path.in_(paths)))
+        ).all()
+    return {path for row in rows for path in row} & set(paths)
+
+
+def release_asset(session: Session, asset_id: str) -> Optional[Asset]:
+    """Drop one reference and return the asset if it is now unreferenced.
+
+    The unreferenced row is deleted in the caller's transaction; its files should
+    be queued on :data:`asset_writer` after the commit succeeds.
+    """
+
+    session.exec(update(Asset).where(Asset.id == asset_id).values(refcount=Asset.refcount - 1))
+    asset = session.get(Asset, asset_id, populate_existing=True)
+    if asset is None or asset.refcount > 0:
+        return None
+    session.delete(asset)
+    return asset
+
+
+def release_user_items(session: Session, user_id: int) -> List[str]:
+    """Delete every QR item owned by ``user_id`` with a fixed number of set-based statements.
+
+    Each shared asset loses one reference per deleted item and is deleted once
+    unreferenced. Returns the file paths nothing refers to any more; like
+    :func:`release_asset`, the caller commits and then queues their removal.
+    """
+
+    owned = QRItem.user_id == user_id
+    legacy = session.exec(select(QRItem.svg_path, QRItem.png_path).where(owned, QRItem.asset_id.is_(None))).all()
+    references = (
+        select(func.count()).select_from(QRItem).where(QRItem.asset_id == Asset.id, owned).scalar_subquery()
+    )
+    # only this user's assets: another user's unreferenced row may be about to be reused
+    touched = Asset.id.in_(select(QRItem.asset_id).where(owned))
+    session.exec(update(Asset).where(touched).values(refcount=Asset.refcount - references))
+    unreferenced = (touched, Asset.refcount <= 0)
+    released = session.exec(select(Asset.svg_path, Asset.png_path).where(*unreferenced)).all()
+    # the subquery reads the items, so the assets go before them
+    session.exec(delete(Asset).where(*unreferenced))
+    session.exec(delete(QRItem).where(owned))
+    return [path for row in (*legacy, *released) for path in row if path]
+
+
+def remove_files(*paths: Optional[str]) -> None:
+    for path in paths:
+        if not path:
+            continue
+        try:
+            Path(path).unlink(missing_ok=True)
+        except OSError:
+            # the periodic garbage collector retries anything left behind
+            logger.warning("Could not remove %s", path, exc_info=True)
@@ -1,6 +1,6 @@
 ﻿import sys
 from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
@@ -13,6 +13,7 @@ from sqlmodel import SQLModel, Session, create_engine
 
 from app import app
 from db import get_session
+from storage import asset_writer
 
 TEST_DATABASE_URL = "sqlite://"
 
@@ -31,6 +32,16 @@ def engine() -> Generator:
     yield engine
 
 
+@pytest.fixture()
+def file_engine(tmp_path: Path) -> Generator:
+    """A SQLite file behind the default QueuePool, for tests that count checked-out connections."""
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
 @pytest.fixture(autouse=True)
 def prepare_database(engine) -> Generator:
     SQLModel.metadata.drop_all(engine)
@@ -40,7 +51,7 @@ def prepare_database(engine) -> Generator:
 
 
 @pytest.fixture()
-def client(tmp_path: Path, monkeypatch, engine) -> TestClient:
+def client(tmp_path: Path, monkeypatch, engine) -> Generator:
     def override_get_session() -> Generator[Session, None, None]:
         with Session(engine) as session:
             yield session
@@ -55,5 +66,52 @@ def client(tmp_path: Path, monkeypatch, engine) -> TestClient:
     png_dir.mkdir(parents=True, exist_ok=True)
     monkeypatch.setattr(qr, "SVG_DIR", svg_dir, raising=False)
     monkeypatch.setattr(qr, "PNG_DIR", png_dir, raising=False)
+    monkeypatch.setattr("services.qr.LOGO_DIR", tmp_path / "logos")
+
+    yield TestClient(app)
+    # keep queued writes from landing in the next test
+    asset_writer.flush()
+
+
+@pytest.fixture()
+def qr_payload() -> dict:
+    """A valid create payload; tests vary it with ``{**qr_payload, ...}``."""
+
+    return {
+        "title": "Company",
+        "url": "https://example.com",
+        "foreground_color": "#000000",
+        "background_color": "#ffffff",
+        "size": 256,
+        "padding": 8,
+        "border_radius": 0,
+    }
+
+
+@pytest.fixture()
+def auth_headers(client: TestClient) -> Callable[..., dict]:
+    """Sign up and log in a user on ``client``; returns their bearer header."""
+
+    def login(email: str = "tester@example.com") -> dict:
+        payload = {"email": email, "full_name": "Test User", "password": "strongpass123"}
+        resp = client.post("/api/auth/signup", json=payload)
+        assert resp.status_code == 201
+        resp = client.post("/api/auth/login", json={"email": email, "password": payload["password"]})
+        assert resp.status_code == 200
+        return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    return login
+
+
+@pytest.fixture()
+def lifespan_client(client: TestClient, tmp_path: Path, monkeypatch, engine) -> Generator:
+    """``client`` with the app lifespan running against the test database."""
+
+    import app as app_module
+    import storage
 
-    return TestClient(app)
+    monkeypatch.setattr(app_module, "engine", engine)
+    monkeypatch.setattr(storage, "SVG_DIR", tmp_path / "svg")
+    monkeypatch.setattr(storage, "PNG_DIR", tmp_path / "png")
+    with client:
+        yield client
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.admission import Abandoned, DeadlineExceeded, Overloaded, PixelBudget, run_admitted
+from services.qr import QRConfig, RenderCancelled, render_qr, render_staged
+
+
+def _slow_work(started: threading.Event, stopped: threading.Event):
+    def work(cancelled: threading.Event) -> str:
+        started.set()
+        while not cancelled.wait(0.01):
+            pass
+        time.sleep(0.05)  # the stage in progress finishes before the check
+        stopped.set()
+        raise RenderCancelled()
+
+    return work
+
+
+def test_budget_admits_by_pixels_in_fifo_order() -> None:
+    async def scenario() -> list:
+        budget = PixelBudget(100)
+        admitted = []
+
+        async def take(name: str, pixels: int) -> None:
+            await budget.acquire(pixels)
+            admitted.append(name)
+
+        first = await budget.acquire(60)
+        waiting = [asyncio.ensure_future(take("large", 60)), asyncio.ensure_future(take("small", 30))]
+        await asyncio.sleep(0)
+        # the small render fits, but does not jump the queue
+        assert admitted == [] and budget.in_use == 60
+        budget.release(first)
+        await asyncio.gather(*waiting)
+        assert budget.in_use == 90
+        # larger than the whole budget: clamped so it can still run alone
+        assert budget.cost(10_000) == 100
+        return admitted
+
+    assert asyncio.run(scenario()) == ["large", "small"]
+
+
+def test_queued_renders_are_dropped_without_running() -> None:
+    calls = []
+
+    async def scenario() -> None:
+        loop = asyncio.get_running_loop()
+        budget = PixelBudget(100)
+        held = await budget.acquire(100)
+
+        with pytest.raises(Overloaded):
+            await run_admitted(budget, 10, calls.append, deadline=loop.time() + 0.05)
+
+        gone = loop.create_future()
+        loop.call_later(0.02, gone.set_result, None)
+        with pytest.raises(Abandoned):
+            await run_admitted(budget, 10, calls.append, deadline=loop.time() + 5, abandoned=gone)
+
+        assert budget.in_use == 100 and not budget._waiters
+        budget.release(held)
+        assert await run_admitted(budget, 10, lambda cancelled: "done", deadline=loop.time() + 5) == "done"
+        await asyncio.sleep(0)
+        assert budget.in_use == 0
+
+    asyncio.run(scenario())
+    assert calls == []
+
+
+def test_running_render_stops_at_deadline_and_keeps_budget_until_it_does() -> None:
+    started, stopped = threading.Event(), threading.Event()
+
+    async def scenario() -> None:
+        loop = asyncio.get_running_loop()
+        budget = PixelBudget(100)
+        with pytest.raises(DeadlineExceeded):
+            await run_admitted(budget, 50, _slow_work(started, stopped), deadline=loop.time() + 0.1)
+        assert started.is_set()
+        # the thread is still finishing its stage, so its pixels are still in use
+        assert budget.in_use == 50
+        while budget.in_use:
+            await asyncio.sleep(0.01)
+        assert stopped.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_render_staged_checks_between_stages() -> None:
+    cancelled = threading.Event()
+    render = render_qr(QRConfig("https://example.com/staged", "#000000", "#ffffff", 128, 0, 0))
+    cancelled.set()
+    with pytest.raises(RenderCancelled):
+        render_staged(render, ("svg", "png"), cancelled)
+    assert render._matrix is None and render._outputs == {}
+
+
+def test_preview_endpoint_rejects_when_busy_or_late(client: TestClient, monkeypatch, auth_headers, qr_payload) -> None:
+    import routers.qr as qr_router
+    from services.admission import preview_budget
+
+    headers = auth_headers()
+    payload = {**qr_payload, "size": 1024}
+    monkeypatch.setattr(preview_budget, "in_use", preview_budget.capacity)
+    resp = client.post("/api/qr/preview", json=payload, headers={**headers, "X-Render-Deadline-Ms": "50"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+    monkeypatch.setattr(preview_budget, "in_use", 0)
+
+    started, stopped = threading.Event(), threading.Event()
+    monkeypatch.setattr(qr_router, "_render_preview", lambda config, cancelled: _slow_work(started, stopped)(cancelled))
+    resp = client.post("/api/qr/preview", json=payload, headers={**headers, "X-Render-Deadline-Ms": "100"})
+    assert resp.status_code == 504
+    assert stopped.wait(2)
+    monkeypatch.undo()
+
+    resp = client.post("/api/qr/preview", json=payload, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["svg_data"].startswith("<svg")
+
+
+def test_cancelled_caller_leaves_no_admission_behind() -> None:
+    async def scenario() -> None:
+        loop = asyncio.get_running_loop()
+        budget = PixelBudget(100)
+        held = await budget.acquire(100)
+        # what a closed preview socket does to its render task
+        caller = asyncio.ensure_future(run_admitted(budget, 10, lambda cancelled: "late", deadline=loop.time() + 5))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        budget.release(held)
+        assert budget.in_use == 0 and not budget._waiters
+
+    asyncio.run(scenario())
@@ -143,3 +143,24 @@ def test_update_profile_and_password_flow(client: TestClient) -> None:
     )
     assert new_login.status_code == 200
     assert "access_token" in new_login.json()
+
+
+def test_csv_exports_return_their_connections(client: TestClient, file_engine, monkeypatch) -> None:
+    from app import app
+    from db import get_session
+
+    def file_session():
+        with Session(file_engine) as session:
+            yield session
+
+    monkeypatch.setitem(app.dependency_overrides, get_session, file_session)
+    headers = _auth_headers(client, email="exporter@example.com")
+    for n in range(3):
+        payload = {"title": f"Export {n}", "url": f"https://example.com/{n}"}
+        assert client.post("/api/qr", json=payload, headers=headers).status_code == 201
+
+    for _ in range(20):
+        resp = client.get("/api/export/csv", headers=headers)
+        assert resp.status_code == 200
+        assert len(resp.text.splitlines()) == 4
+    assert file_engine.pool.checkedout() == 0
@@ -0,0 +1,85 @@
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from core.compression import CompressionMiddleware, CompressionStats
+
+
+def _build_app(stats: CompressionStats) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100, level=9, stats=stats)
+
+    @app.get("/stream")
+    def stream() -> StreamingResponse:
+        def rows():
+            for n in range(200):
+                yield f"row-{n},https://example.com/{n}\n"
+
+        return StreamingResponse(rows(), media_type="text/csv")
+
+    @app.get("/svg")
+    def svg() -> Response:
+        return Response("<svg>" + "<rect/>" * 200 + "</svg>", media_type="image/svg+xml", headers={"ETag": '"abc"'})
+
+    @app.get("/png")
+    def png() -> Response:
+        return Response(b"\x89PNG" + b"\0" * 1000, media_type="image/png")
+
+    @app.get("/small")
+    def small() -> dict:
+        return {"ok": True}
+
+    return app
+
+
+def test_compression_streams_and_respects_allowlist() -> None:
+    stats = CompressionStats()
+    client = TestClient(_build_app(stats))
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as resp:
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "content-length" not in resp.headers
+        raw = b"".join(resp.iter_raw())
+    text = zlib.decompress(raw, 31).decode()
+    assert text.splitlines()[-1] == "row-199,https://example.com/199"
+
+    svg = client.get("/svg", headers={"Accept-Encoding": "gzip"})
+    assert svg.headers["content-encoding"] == "gzip"
+    assert svg.headers["etag"] == 'W/"abc"'
+    assert "Accept-Encoding" in svg.headers["vary"]
+    assert svg.text.startswith("<svg>")
+
+    png = client.get("/png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in png.headers
+    assert client.get("/small", headers={"Accept-Encoding": "gzip"}).headers.get("content-encoding") is None
+    assert client.get("/svg", headers={"Accept-Encoding": "identity"}).headers.get("content-encoding") is None
+
+    summary = stats.as_dict()
+    assert summary["responses"] == 2
+    assert summary["bytes_out"] < summary["bytes_in"]
+    assert summary["ratio"] < 0.5
+
+
+def test_saved_svg_and_export_are_compressed(client: TestClient) -> None:
+    resp = client.post(
+        "/api/auth/signup",
+        json={"email": "zip@example.com", "full_name": "Zip", "password": "strongpass123"},
+    )
+    assert resp.status_code == 201
+    token = client.post(
+        "/api/auth/login", json={"email": "zip@example.com", "password": "strongpass123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"}
+    item = client.post(
+        "/api/qr", json={"title": "Zip", "url": "https://example.com"}, headers=headers
+    ).json()
+
+    svg = client.get(f"/api/qr/{item['id']}/download", params={"format": "svg"}, headers=headers)
+    assert svg.headers["content-encoding"] == "gzip"
+    assert svg.text.startswith("<svg")
+
+    export = client.get("/api/export/csv", headers=headers)
+    assert export.status_code == 200
+    assert export.text.splitlines()[1].startswith("Zip,https://example.com/")
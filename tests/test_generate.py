@@ -0,0 +1,139 @@
+import json
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from generate import Checkpoint, generate, main
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+
+def _write_csv(path: Path, count: int) -> None:
+    lines = ["url,name,size,foreground_color"]
+    lines += [f"https://example.com/{n},{'code ' + str(n) if n % 2 else ''},,#1f3a93" for n in range(count)]
+    lines.append(",broken,,")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_csv_rows_render_into_a_directory(tmp_path: Path) -> None:
+    source = tmp_path / "urls.csv"
+    _write_csv(source, 7)
+    out = tmp_path / "codes"
+    failures = []
+
+    stats = generate(
+        source, out, defaults={"size": 128, "padding": 4}, workers=2, chunk_size=3, max_inflight=1,
+        on_failure=lambda where, error: failures.append((where, error)),
+    )
+
+    assert (stats.rows, stats.codes, stats.failed, stats.files) == (8, 7, 1, 14)
+    assert failures == [("row 8", "missing url")]
+    names = sorted(path.name for path in out.iterdir())
+    # named rows keep a filesystem-safe name, the rest are numbered by row
+    assert "code_1.svg" in names and "000001.png" in names and len(names) == 14
+    assert b"#1f3a93" in (out / "code_1.svg").read_bytes()
+    assert set(stats.stage_seconds) == {"encode", "svg", "png", "write"}
+    assert stats.codes_per_second > 0
+    assert not (tmp_path / "codes.checkpoint").exists()
+
+
+def test_resume_skips_rows_the_checkpoint_covers(tmp_path: Path) -> None:
+    source = tmp_path / "urls.ndjson"
+    source.write_text(
+        "".join(json.dumps({"url": f"https://example.com/{n}", "size": 128}) + "\n" for n in range(6)),
+        encoding="utf-8",
+    )
+    out = tmp_path / "codes.zip"
+    first = generate(source, out, formats=("svg",), workers=1, chunk_size=2)
+    assert first.codes == 6
+
+    # pretend the run died after four rows, and the archive lost the rest
+    with zipfile.ZipFile(out, "w") as archive:
+        for n in range(1, 5):
+            archive.writestr(f"{n:06d}.svg", b"<svg/>")
+    Checkpoint(tmp_path / "codes.zip.checkpoint", source).save(4)
+
+    resumed = generate(source, out, formats=("svg",), workers=1, chunk_size=2, resume=True)
+    assert (resumed.skipped, resumed.rows, resumed.codes) == (4, 2, 2)
+    with zipfile.ZipFile(out) as archive:
+        assert sorted(archive.namelist()) == [f"{n:06d}.svg" for n in range(1, 7)]
+        assert archive.read("000006.svg").startswith(b"<svg")
+    assert not (tmp_path / "codes.zip.checkpoint").exists()
+
+
+def test_resume_after_a_crash_keeps_entries_written_before_it(tmp_path: Path) -> None:
+    source = tmp_path / "urls.csv"
+    _write_csv(source, 7)
+    out = tmp_path / "codes.zip"
+    # the process dies for real right after the second chunk is checkpointed
+    script = (
+        "import multiprocessing, os, sys\n"
+        "from pathlib import Path\n"
+        f"sys.path.insert(0, {str(ROOT_DIR)!r})\n"
+        "import generate\n"
+        "save = generate.Checkpoint.save\n"
+        "def save_then_die(self, rows):\n"
+        "    save(self, rows)\n"
+        "    if rows >= 4:\n"
+        # pool workers would otherwise outlive the parent and hold its output pipes open
+        "        for child in multiprocessing.active_children():\n"
+        "            child.kill()\n"
+        "        os._exit(3)\n"
+        "generate.Checkpoint.save = save_then_die\n"
+        f"generate.generate(Path({str(source)!r}), Path({str(out)!r}), formats=('svg',), "
+        "defaults={'size': 128}, workers=1, chunk_size=2, max_inflight=1)\n"
+    )
+    crashed = subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, capture_output=True, text=True, timeout=60)
+    assert crashed.returncode == 3, crashed.stderr
+    with pytest.raises(zipfile.BadZipFile):
+        zipfile.ZipFile(out)
+
+    resumed = generate(source, out, formats=("svg",), defaults={"size": 128}, workers=1, chunk_size=2, resume=True)
+    assert (resumed.skipped, resumed.rows) == (4, 4)
+    with zipfile.ZipFile(out) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == sorted(
+            ["000001.svg", "code_1.svg", "000003.svg", "code_3.svg", "000005.svg", "code_5.svg", "000007.svg"]
+        )
+
+
+def test_duplicate_names_get_the_row_number(tmp_path: Path) -> None:
+    source = tmp_path / "urls.csv"
+    source.write_text(
+        "url,name\n"
+        "https://example.com/1,menu\n"
+        "https://example.com/2,menu\n"
+        "https://example.com/3,\n"
+        "https://example.com/4,000003\n"
+        "https://example.com/5,menu\n",
+        encoding="utf-8",
+    )
+    for out in (tmp_path / "codes", tmp_path / "codes.zip"):
+        stats = generate(source, out, formats=("svg",), defaults={"size": 128}, workers=1, chunk_size=2)
+        assert (stats.codes, stats.files, stats.renamed) == (5, 5, 3)
+        if out.suffix == ".zip":
+            with zipfile.ZipFile(out) as archive:
+                names = archive.namelist()
+        else:
+            names = [path.name for path in out.iterdir()]
+        assert sorted(names) == ["000003-4.svg", "000003.svg", "menu-2.svg", "menu-5.svg", "menu.svg"]
+
+    # a resumed run names the remaining rows exactly as the first run would have
+    out = tmp_path / "resumed"
+    out.mkdir()
+    Checkpoint(tmp_path / "resumed.checkpoint", source).save(3)
+    resumed = generate(source, out, formats=("svg",), defaults={"size": 128}, workers=1, resume=True)
+    assert resumed.renamed == 2
+    assert sorted(path.name for path in out.iterdir()) == ["000003-4.svg", "menu-5.svg"]
+
+
+def test_cli_reports_stats_as_json(tmp_path: Path, capsys) -> None:
+    source = tmp_path / "urls.csv"
+    source.write_text("url\nhttps://example.com/cli\n", encoding="utf-8")
+    code = main([str(source), "--out", str(tmp_path / "out"), "--formats", "png", "--size", "128", "--workers", "1", "--json"])
+    assert code == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["codes"] == 1 and stats["files"] == 1
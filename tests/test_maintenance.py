@@ -0,0 +1,129 @@
+import os
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from maintenance import collect_garbage
+from storage import asset_writer
+
+
+def _make_old(path: Path) -> None:
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+
+
+def test_collect_garbage_reports_and_repairs(client: TestClient, engine, tmp_path: Path, auth_headers) -> None:
+    headers = auth_headers()
+    created = [
+        client.post(
+            "/api/qr",
+            json={"title": f"QR {n}", "url": f"https://example.com/{n}", "size": 128, "padding": 0},
+            headers=headers,
+        ).json()
+        for n in range(3)
+    ]
+    svg_dir, png_dir = tmp_path / "svg", tmp_path / "png"
+    asset_writer.flush()
+
+    orphan = svg_dir / "leftover.svg"
+    orphan.write_text("<svg/>")
+    _make_old(orphan)
+    fresh = png_dir / "in-flight.png"
+    fresh.write_bytes(b"png")
+    missing_png = Path(created[0]["png_path"])
+    missing_png.unlink()
+
+    report = collect_garbage(engine, svg_dir=svg_dir, png_dir=png_dir, batch_size=2)
+    assert report.scanned_files == 7
+    assert report.orphaned_files == 1
+    assert report.orphaned_bytes == len("<svg/>")
+    assert report.checked_assets == 3
+    assert report.missing_assets == 1
+    assert report.removed_files == report.regenerated_assets == 0
+    assert orphan.exists()
+
+    report = collect_garbage(
+        engine, svg_dir=svg_dir, png_dir=png_dir, batch_size=2, remove=True, regenerate=True
+    )
+    assert report.removed_files == 1
+    assert report.regenerated_assets == 1
+    assert not orphan.exists()
+    assert fresh.exists()
+    assert missing_png.read_bytes().startswith(b"\x89PNG")
+    assert report.disk_usage[str(svg_dir)] == sum(p.stat().st_size for p in svg_dir.iterdir())
+
+    download = client.get(f"/api/qr/{created[0]['id']}/download", params={"format": "png"}, headers=headers)
+    assert download.status_code == 200
+
+
+def test_sweep_matches_files_by_name_whatever_the_directory_spelling(
+    client: TestClient, engine, tmp_path: Path, monkeypatch, auth_headers
+) -> None:
+    from sqlmodel import Session, select
+
+    from models import QRItem
+    from routers import qr
+
+    # the app stores paths relative to its working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(qr, "SVG_DIR", Path("svg"))
+    monkeypatch.setattr(qr, "PNG_DIR", Path("png"))
+    headers = auth_headers()
+    created = client.post("/api/qr", json={"title": "Rel", "url": "https://example.com/rel"}, headers=headers).json()
+    asset_writer.flush()
+    assert created["svg_path"] == f"svg/{created['asset_id']}.svg"
+    legacy = Path("svg") / "legacy-item.svg"
+    legacy.write_text("<svg/>")
+    # saved by an instance running on Windows
+    windows = Path("svg") / "windows-item.svg"
+    windows.write_text("<svg/>")
+    with Session(engine) as session:
+        item = session.exec(select(QRItem)).one()
+        fields = item.model_dump(exclude={"id", "asset_id", "slug"})
+        session.add(QRItem(**{**fields, "svg_path": str(legacy)}))
+        session.add(QRItem(**{**fields, "svg_path": "svg\\windows-item.svg"}))
+        session.commit()
+    orphan = Path("svg") / "leftover.svg"
+    orphan.write_text("<svg/>")
+
+    # run from elsewhere, pointing at the same directories by absolute path
+    monkeypatch.chdir(tmp_path.parent)
+    report = collect_garbage(
+        engine, svg_dir=tmp_path / "svg", png_dir=tmp_path / "png", remove=True, grace_seconds=0
+    )
+    assert (report.scanned_files, report.orphaned_files, report.removed_files) == (5, 1, 1)
+    assert not (tmp_path / orphan).exists()
+    assert (tmp_path / legacy).exists() and (tmp_path / windows).exists()
+    assert (tmp_path / created["svg_path"]).exists() and (tmp_path / created["png_path"]).exists()
+
+
+def test_regenerate_leaves_assets_the_item_no_longer_renders(
+    client: TestClient, engine, tmp_path: Path, auth_headers
+) -> None:
+    from sqlmodel import Session
+
+    from models import ASSET_PENDING, Asset, QRItem
+
+    headers = auth_headers()
+    created = client.post("/api/qr", json={"title": "Drift", "url": "https://example.com/drift"}, headers=headers).json()
+    asset_writer.flush()
+    missing_png = Path(created["png_path"])
+    missing_png.unlink()
+    with Session(engine) as session:
+        # stands in for a renderer change: the item's content no longer hashes to its asset
+        item = session.get(QRItem, created["id"])
+        item.url = "https://example.com/changed"
+        session.add(item)
+        asset = session.get(Asset, created["asset_id"])
+        asset.status = ASSET_PENDING
+        session.add(asset)
+        session.commit()
+
+    report = collect_garbage(
+        engine, svg_dir=tmp_path / "svg", png_dir=tmp_path / "png", remove=True, regenerate=True
+    )
+    assert (report.missing_assets, report.regenerated_assets) == (1, 0)
+    assert not missing_png.exists()
+    with Session(engine) as session:
+        assert session.get(Asset, created["asset_id"]).status == ASSET_PENDING
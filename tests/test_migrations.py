@@ -0,0 +1,92 @@
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, inspect
+from sqlmodel import Session, select
+
+from migrations import MIGRATIONS, migrate
+from models import QRItem, User
+from routers.qr import SUMMARY_COLUMNS
+
+# schema written by the first release, before versioned migrations existed
+LEGACY_SCHEMA = (
+    """CREATE TABLE users (
+        id INTEGER NOT NULL, email VARCHAR NOT NULL, full_name VARCHAR NOT NULL,
+        hashed_password VARCHAR NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id))""",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE qr_items (
+        id INTEGER NOT NULL, user_id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, url VARCHAR NOT NULL,
+        foreground_color VARCHAR(7) NOT NULL, background_color VARCHAR(7) NOT NULL, size INTEGER NOT NULL,
+        padding INTEGER NOT NULL, border_radius INTEGER NOT NULL, overlay_text VARCHAR(4),
+        svg_path VARCHAR NOT NULL, png_path VARCHAR, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id))""",
+    "CREATE INDEX ix_qr_items_created_at ON qr_items (created_at)",
+    "CREATE INDEX ix_qr_items_user_id ON qr_items (user_id)",
+    "INSERT INTO users VALUES (1, 'Legacy@Example.com', '', 'x', '2024-01-01', '2024-01-01')",
+    """INSERT INTO qr_items VALUES (1, 1, 'Old', 'https://example.com', '#000000', '#ffffff', 256, 8, 0,
+        NULL, 'generated_svgs/old.svg', NULL, '2024-01-01', '2024-01-01')""",
+)
+
+
+def _indexes(engine, table: str) -> dict:
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = '{table}'")
+        return {name: sql for name, sql in rows}
+
+
+def _plan(engine, statement) -> str:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return "\n".join(row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def test_migrate_upgrades_legacy_database(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+
+    assert migrate(engine) == len(MIGRATIONS)
+    columns = {column["name"] for column in inspect(engine).get_columns("qr_items")}
+    assert {"asset_id", "slug", "scan_count"} <= columns
+    assert "assets" in inspect(engine).get_table_names()
+    indexes = _indexes(engine, "qr_items")
+    assert "ix_qr_items_user_created" in indexes and "ix_qr_items_user_id" not in indexes
+    assert "ix_users_email_lower" in _indexes(engine, "users")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT scan_count FROM qr_items").scalar_one() == 0
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar_one() == len(MIGRATIONS)
+
+    with Session(engine) as session:
+        # rows stored before emails were normalised still match at login
+        assert session.exec(select(User).where(func.lower(User.email) == "legacy@example.com")).first()
+
+    # already current: nothing to do
+    assert migrate(engine) == len(MIGRATIONS)
+
+
+def test_fresh_and_migrated_databases_match(tmp_path: Path, engine) -> None:
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    migrate(legacy)
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrate(fresh)
+
+    for table in ("users", "qr_items", "assets"):
+        assert set(_indexes(legacy, table)) == set(_indexes(fresh, table)) == set(_indexes(engine, table))
+
+
+def test_query_plans_use_indexes(engine) -> None:
+    history = select(*SUMMARY_COLUMNS).where(QRItem.user_id == 1).order_by(QRItem.created_at.desc())
+    plan = _plan(engine, history)
+    assert "USING INDEX ix_qr_items_user_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+    owner = select(QRItem).where(QRItem.id == 1, QRItem.user_id == 1)
+    # id is SQLite's rowid, so ownership checks are a primary-key seek
+    assert "USING INTEGER PRIMARY KEY" in _plan(engine, owner)
+
+    login = select(User).where(func.lower(User.email) == "user@example.com")
+    assert "USING INDEX ix_users_email_lower" in _plan(engine, login)
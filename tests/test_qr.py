@@ -78,3 +78,375 @@ def test_history_only_returns_owner_items(client: TestClient) -> None:
     resp_alice = client.get("/api/qr/history", headers=alice_headers)
     assert len(resp_alice.json()) == 1
 
+
+def test_download_extra_formats(client: TestClient) -> None:
+    headers = auth_headers(client)
+    create_resp = client.post(
+        "/api/qr",
+        json={
+            "title": "Print",
+            "url": "https://example.com/print",
+            "foreground_color": "#112233",
+            "background_color": "#ffffff",
+            "size": 256,
+            "padding": 8,
+            "border_radius": 16,
+        },
+        headers=headers,
+    )
+    assert create_resp.status_code == 201
+    qr_id = create_resp.json()["id"]
+
+    expected = {
+        "webp": ("image/webp", b"RIFF"),
+        "pdf": ("application/pdf", b"%PDF-"),
+        "eps": ("application/postscript", b"%!PS-Adobe"),
+    }
+    for fmt, (media_type, magic) in expected.items():
+        resp = client.get(f"/api/qr/{qr_id}/download", params={"format": fmt}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        assert resp.headers["content-type"].startswith(media_type)
+        assert resp.content.startswith(magic)
+
+    resp = client.get(f"/api/qr/{qr_id}/download", params={"format": "gif"}, headers=headers)
+    assert resp.status_code == 422
+
+
+def test_vector_formats_merge_runs() -> None:
+    from services.qr import QRConfig, render_qr
+
+    config = QRConfig(
+        url="https://example.com",
+        foreground_color="#000000",
+        background_color="transparent",
+        size=256,
+        padding=0,
+        border_radius=0,
+    )
+    render = render_qr(config)
+    runs = list(render.matrix.runs())
+    dark = render.matrix.dark_count()
+    assert sum(length for _, _, length in runs) == dark
+    assert len(runs) < dark
+
+    eps = render.get("eps").decode("ascii")
+    assert eps.count(" R\n") == len(runs)
+    assert render.get("pdf") is render.get("pdf")
+
+
+def test_encoding_plan_shrinks_typical_urls() -> None:
+    import qrcode
+    from qrcode.util import MODE_8BIT_BYTE, MODE_NUMBER, QRData
+    from services.qr import build_matrix, plan_encoding, uppercase_host
+
+    def byte_mode_modules(url: str) -> int:
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+        qr.add_data(QRData(url, mode=MODE_8BIT_BYTE))
+        qr.make(fit=True)
+        return len(qr.get_matrix())
+
+    product = "https://shop.example.org/item/9781234567897"
+    plan = plan_encoding(product)
+    assert (MODE_NUMBER, "9781234567897") in plan.segments
+    assert plan.efficiency > 1
+    assert len(build_matrix(plan)) < byte_mode_modules(product)
+
+    for url in ("https://example.com/", "https://maps.example.com/@40.7128,-74.0060,15z"):
+        upper = plan_encoding(url, upper_host=True)
+        assert upper.payload.startswith("HTTPS://")
+        assert upper.version < plan_encoding(url).version
+        assert len(build_matrix(upper)) < byte_mode_modules(url)
+
+    assert uppercase_host("https://User:Pw@Example.com:8443/Path?q=A") == "HTTPS://User:Pw@EXAMPLE.COM:8443/Path?q=A"
+    assert uppercase_host("https://straße.example/") == "https://straße.example/"
+
+
+def test_preview_socket_rejects_bad_token(client: TestClient) -> None:
+    from starlette.websockets import WebSocketDisconnect
+
+    with client.websocket_connect("/ws/qr/preview") as ws:
+        ws.send_json({"token": "not-a-token"})
+        try:
+            ws.receive_json()
+        except WebSocketDisconnect as exc:
+            assert exc.code == 1008
+        else:
+            raise AssertionError("socket should be closed")
+
+
+def test_preview_socket_reuses_matrix_for_style_deltas(client: TestClient, monkeypatch) -> None:
+    import services.qr as qr_service
+
+    headers = auth_headers(client)
+    token = headers["Authorization"].split(" ", 1)[1]
+    calls = []
+    original = qr_service._create_matrix
+
+    def counting_create_matrix(config):
+        calls.append(config.url)
+        return original(config)
+
+    monkeypatch.setattr(qr_service, "_create_matrix", counting_create_matrix)
+
+    with client.websocket_connect("/ws/qr/preview") as ws:
+        ws.send_json({"token": token})
+        assert ws.receive_json() == {"type": "ready"}
+
+        ws.send_json({"url": "https://example.com", "size": 256})
+        assert ws.receive_json() == {"type": "frame", "seq": 1}
+        assert ws.receive_bytes().startswith(b"\x89PNG")
+
+        ws.send_json({"foreground_color": "#ff0000", "padding": 4})
+        assert ws.receive_json() == {"type": "frame", "seq": 2}
+        assert ws.receive_bytes().startswith(b"\x89PNG")
+
+        ws.send_json({"size": 5})
+        error = ws.receive_json()
+        assert error["type"] == "error"
+        assert error["seq"] == 3
+
+    assert calls == ["https://example.com/"]
+
+
+def test_long_url_with_overlay_is_rejected_instead_of_overflowing(client: TestClient) -> None:
+    headers = auth_headers(client)
+    token = headers["Authorization"].split(" ", 1)[1]
+    # fits at level M, but not at the level H an overlay requires
+    url = "https://example.com/" + "a" * 1400
+    payload = {"title": "Long", "url": url, "size": 256, "padding": 0}
+
+    plain = client.post("/api/qr", json=payload, headers=headers)
+    assert plain.status_code == 201, plain.text
+    branded = {**payload, "overlay_text": "QF"}
+    for resp in (
+        client.post("/api/qr", json=branded, headers=headers),
+        client.post("/api/qr/preview", json=branded, headers=headers),
+        client.patch(f"/api/qr/{plain.json()['id']}", json={"overlay_text": "QF"}, headers=headers),
+    ):
+        assert resp.status_code == 422, resp.text
+        assert "too long" in resp.json()["detail"]
+
+    with client.websocket_connect("/ws/qr/preview") as ws:
+        ws.send_json({"token": token})
+        assert ws.receive_json() == {"type": "ready"}
+        ws.send_json(branded)
+        error = ws.receive_json()
+        assert error["type"] == "error" and error["seq"] == 1
+        # the socket keeps rendering once the overlay is removed
+        ws.send_json({"overlay_text": None})
+        assert ws.receive_json() == {"type": "frame", "seq": 2}
+        assert ws.receive_bytes().startswith(b"\x89PNG")
+
+
+def test_preview_socket_answers_malformed_frames_and_keeps_going(client: TestClient) -> None:
+    headers = auth_headers(client)
+    token = headers["Authorization"].split(" ", 1)[1]
+    with client.websocket_connect("/ws/qr/preview") as ws:
+        ws.send_json({"token": token})
+        assert ws.receive_json() == {"type": "ready"}
+        for frame in ("{not json", "[1, 2]"):
+            ws.send_text(frame)
+            assert ws.receive_json() == {"type": "error", "detail": "Expected a JSON object"}
+        ws.send_json({"url": "https://example.com", "size": 256})
+        assert ws.receive_json() == {"type": "frame", "seq": 1}
+        assert ws.receive_bytes().startswith(b"\x89PNG")
+
+
+def test_matrix_endpoint_round_trips_bits(client: TestClient) -> None:
+    import base64
+
+    from services.qr import encode_url
+
+    headers = auth_headers(client)
+    resp = client.get("/api/qr/matrix", params={"url": "https://example.com"}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    matrix = encode_url("https://example.com/")
+    assert body["modules"] == len(matrix)
+    assert body["version"] == (len(matrix) - 17) // 4
+
+    packed = base64.b64decode(body["data"])
+    flat = [cell for row in matrix for cell in row]
+    assert len(packed) == (len(flat) + 7) // 8
+    assert [bool(packed[i >> 3] & (0x80 >> (i & 7))) for i in range(len(flat))] == flat
+
+    raw = client.get(
+        "/api/qr/matrix",
+        params={"url": "https://example.com"},
+        headers={**headers, "Accept": "application/octet-stream"},
+    )
+    assert raw.content == packed
+    assert raw.headers["x-qr-modules"] == str(len(matrix))
+    assert raw.headers["x-qr-version"] == str(body["version"])
+
+    assert client.get("/api/qr/matrix", params={"url": "https://example.com"}).status_code == 401
+
+
+def _create_cached_qr(client: TestClient, headers: dict) -> dict:
+    resp = client.post(
+        "/api/qr",
+        json={"title": "Cached", "url": "https://example.com/cache", "size": 128, "padding": 4},
+        headers=headers,
+    )
+    assert resp.status_code == 201
+    return resp.json()
+
+
+def test_download_conditional_requests(client: TestClient) -> None:
+    headers = auth_headers(client)
+    item = _create_cached_qr(client, headers)
+    url = f"/api/qr/{item['id']}/download"
+
+    first = client.get(url, params={"format": "png"}, headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag == f"\"{item['asset_id']}-png\""
+    assert first.headers["last-modified"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get(url, params={"format": "png"}, headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    since = client.get(
+        url, params={"format": "png"}, headers={**headers, "If-Modified-Since": first.headers["last-modified"]}
+    )
+    assert since.status_code == 304
+
+    versioned = client.get(url, params={"format": "svg", "v": item["updated_at"]}, headers=headers)
+    assert versioned.status_code == 200
+    assert "immutable" in versioned.headers["cache-control"]
+    assert versioned.headers["etag"] != etag
+
+
+def test_signed_asset_links(client: TestClient) -> None:
+    headers = auth_headers(client)
+    item = _create_cached_qr(client, headers)
+
+    links = client.get("/api/qr/links", params={"format": "png"}, headers=headers)
+    assert links.status_code == 200
+    (link,) = links.json()
+    assert link["id"] == item["id"]
+
+    resp = client.get(link["url"])
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/png"
+    assert "immutable" in resp.headers["cache-control"]
+
+    cached = client.get(link["url"], headers={"If-None-Match": resp.headers["etag"]})
+    assert cached.status_code == 304
+
+    tampered = link["url"].replace(".png?", ".svg?")
+    assert client.get(tampered).status_code == 403
+    from core.security import sign_asset
+
+    forged = link["url"].replace("expires=", "expires=1")
+    assert client.get(forged).status_code == 403
+    past = 1_000_000
+    expired = f"/api/qr/assets/{item['asset_id']}.png?expires={past}&signature={sign_asset(item['asset_id'], 'png', past)}"
+    assert client.get(expired).status_code == 403
+
+
+def test_list_returns_lean_summaries(client: TestClient) -> None:
+    from schemas import QRItemSummary
+
+    headers = auth_headers(client)
+    created = _create_cached_qr(client, headers)
+
+    resp = client.get("/api/qr", headers=headers)
+    assert resp.status_code == 200
+    (item,) = resp.json()
+    assert set(item) == set(QRItemSummary.model_fields)
+    assert item["id"] == created["id"]
+    assert item["created_at"] == created["created_at"]
+    assert "svg_path" not in item
+
+
+def test_qr_matrix_is_bit_packed() -> None:
+    import pickle
+
+    from services.matrix import QRMatrix
+    from services.qr import encode_url
+
+    matrix = encode_url("https://example.com/" + "x" * 300)
+    rows = matrix.rows()
+    assert QRMatrix.from_rows(rows) == matrix
+    assert len(matrix.to_bytes()) == (len(matrix) ** 2 + 7) // 8
+    assert matrix.dark_count() == sum(map(sum, rows))
+    assert all(matrix[y, x] == rows[y][x] for y in (0, 7, len(matrix) - 1) for x in range(len(matrix)))
+
+    view = matrix.view()
+    assert view.readonly and view.obj is matrix.to_bytes()
+    restored = pickle.loads(pickle.dumps(matrix))
+    assert restored == matrix and len(pickle.dumps(matrix)) < len(matrix.to_bytes()) + 100
+
+
+def test_overlay_text_uses_level_h_and_clears_the_centre(client: TestClient) -> None:
+    import io
+
+    from PIL import Image
+    from services.qr import ERROR_CORRECTION_H, QRConfig, overlay_box, render_qr
+
+    headers = auth_headers(client)
+    payload = {"title": "Branded", "url": "https://example.com", "size": 256, "padding": 0, "overlay_text": "QF"}
+    created = client.post("/api/qr", json=payload, headers=headers)
+    assert created.status_code == 201, created.text
+    assert created.json()["overlay_text"] == "QF"
+
+    config = QRConfig("https://example.com/", "#000000", "#FFFFFF", 256, 0, 0, overlay_text="QF")
+    plain = QRConfig("https://example.com/", "#000000", "#FFFFFF", 256, 0, 0)
+    assert plain.digest() != config.digest()
+    render = render_qr(config)
+    assert config.error_correction == ERROR_CORRECTION_H
+    assert len(render.matrix) > len(render_qr(plain).matrix)
+    first, side = overlay_box(config, len(render.matrix))
+    assert side / len(render.matrix) < 0.35
+
+    svg = render.get("svg").decode("utf-8")
+    assert svg.count("<symbol") == 1 and svg.count('<use href="#qr-overlay"') == 1
+    # no module is drawn under the overlay
+    module = 256 / len(render.matrix)
+    image = Image.open(io.BytesIO(render.get("png"))).convert("RGB")
+    corner = round((first + 0.5) * module)
+    assert image.getpixel((corner, corner)) == (255, 255, 255)
+    for fmt in ("pdf", "eps", "webp"):
+        assert render.get(fmt)
+
+    both = client.post("/api/qr", json={**payload, "logo_id": "a" * 64}, headers=headers)
+    assert both.status_code == 422
+
+
+def test_logo_layer_is_rasterized_once_per_size(client: TestClient) -> None:
+    import base64
+    import io
+
+    from PIL import Image
+    from services.qr import QRConfig, _overlay_layer, render_qr
+
+    headers = auth_headers(client)
+    with io.BytesIO() as buf:
+        Image.new("RGBA", (900, 600), (200, 30, 30, 255)).save(buf, format="PNG")
+        upload = {"data": base64.b64encode(buf.getvalue()).decode("ascii")}
+    resp = client.post("/api/qr/logos", json=upload, headers=headers)
+    assert resp.status_code == 201, resp.text
+    logo_id = resp.json()["logo_id"]
+    assert client.post("/api/qr/logos", json=upload, headers=headers).json()["logo_id"] == logo_id
+    assert client.post("/api/qr/logos", json={"data": "bm90IGFuIGltYWdl"}, headers=headers).status_code == 400
+
+    _overlay_layer.cache_clear()
+    for n in range(5):
+        config = QRConfig(f"https://example.com/{n:02d}", "#000000", "#ffffff", 256, 8, 0, logo=logo_id)
+        render = render_qr(config)
+        render.get("png")
+        svg = render.get("svg").decode("utf-8")
+        assert svg.count("data:image/png;base64,") == 1
+    assert _overlay_layer.cache_info().misses == 1
+
+    created = client.post(
+        "/api/qr", json={"title": "Logo", "url": "https://example.com", "logo_id": logo_id}, headers=headers
+    )
+    assert created.status_code == 201 and created.json()["logo_id"] == logo_id
+    missing = client.post(
+        "/api/qr", json={"title": "Logo", "url": "https://example.com", "logo_id": "f" * 64}, headers=headers
+    )
+    assert missing.status_code == 400
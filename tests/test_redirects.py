@@ -0,0 +1,149 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from models import QRItem
+from services.redirects import redirect_url, redirects
+from storage import item_config
+
+
+@pytest.fixture()
+def qr_payload(qr_payload: dict) -> dict:
+    # a long campaign link shows how much a short redirect saves
+    return {
+        **qr_payload,
+        "title": "Flyer",
+        "url": "https://example.com/a/very/long/campaign/landing/page?utm_source=print&utm_medium=flyer",
+        "dynamic": True,
+    }
+
+
+def test_dynamic_code_encodes_short_link(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+    static = client.post("/api/qr", json={**qr_payload, "dynamic": False}, headers=headers).json()
+
+    assert len(item["slug"]) == 8 and static["slug"] is None
+    with Session(engine) as session:
+        saved = session.get(QRItem, item["id"])
+        assert item_config(saved).url == redirect_url(item["slug"])
+        assert item_config(session.get(QRItem, static["id"])).url == static["url"]
+
+    dynamic_matrix = client.get("/api/qr/matrix", params={"url": qr_payload["url"], "dynamic": True}, headers=headers)
+    static_matrix = client.get("/api/qr/matrix", params={"url": qr_payload["url"]}, headers=headers)
+    assert dynamic_matrix.json()["modules"] < static_matrix.json()["modules"]
+
+
+def test_redirect_counts_scans_in_batches(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(5):
+            resp = client.get(f"/r/{item['slug']}", follow_redirects=False)
+            assert resp.status_code == 302
+            assert resp.headers["location"] == item["url"]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not any(statement.lstrip().upper().startswith("UPDATE") for statement in statements)
+
+    assert redirects.flush(engine) == 5
+    assert redirects.flush(engine) == 0
+    with Session(engine) as session:
+        assert session.get(QRItem, item["id"]).scan_count == 5
+    listed = client.get("/api/qr", headers=headers).json()
+    assert listed[0]["scan_count"] == 5
+
+
+def test_cached_redirect_checks_out_no_connection(
+    client: TestClient, file_engine, monkeypatch, auth_headers, qr_payload
+) -> None:
+    import db
+    from app import app
+
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+    # serve through the real session dependency, backed by a pooled engine
+    monkeypatch.delitem(app.dependency_overrides, db.get_session)
+    monkeypatch.setattr(db, "engine", file_engine)
+    checkouts = []
+    listener = lambda *args: checkouts.append(args)
+    event.listen(file_engine.pool, "checkout", listener)
+    try:
+        for _ in range(3):
+            assert client.get(f"/r/{item['slug']}", follow_redirects=False).status_code == 302
+        assert checkouts == []
+        # a miss still queries, and hands the connection back
+        redirects.discard(item["slug"])
+        assert client.get(f"/r/{item['slug']}", follow_redirects=False).status_code == 404
+        assert len(checkouts) == 1
+    finally:
+        event.remove(file_engine.pool, "checkout", listener)
+    assert file_engine.pool.checkedout() == 0
+
+
+def test_redirect_misses_fall_back_to_database(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+
+    # another worker created the code: this process has never cached it
+    redirects.discard(item["slug"])
+    assert client.get(f"/r/{item['slug']}", follow_redirects=False).status_code == 302
+
+    assert client.delete(f"/api/qr/{item['id']}", headers=headers).status_code == 200
+    assert client.get(f"/r/{item['slug']}", follow_redirects=False).status_code == 404
+    assert client.get("/r/NOTASLUG", follow_redirects=False).status_code == 404
+    assert client.get("/r/lower", follow_redirects=False).status_code == 422
+    # the pending scan for the deleted row is dropped instead of failing the flush
+    assert redirects.flush(engine) == 0
+
+
+def test_other_workers_edits_reach_the_cache_after_its_ttl(
+    client: TestClient, engine, monkeypatch, auth_headers, qr_payload
+) -> None:
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+    now = [1000.0]
+    monkeypatch.setattr(redirects, "_clock", lambda: now[0])
+    redirects.set(item["slug"], item["url"])
+
+    # another worker edits the destination: only the database sees it
+    with Session(engine) as session:
+        saved = session.get(QRItem, item["id"])
+        saved.url = "https://example.com/moved"
+        session.add(saved)
+        session.commit()
+    assert client.get(f"/r/{item['slug']}", follow_redirects=False).headers["location"] == item["url"]
+    now[0] += redirects.ttl_seconds + 1
+    assert client.get(f"/r/{item['slug']}", follow_redirects=False).headers["location"] == "https://example.com/moved"
+
+    # ... and then deletes it
+    with Session(engine) as session:
+        session.delete(session.get(QRItem, item["id"]))
+        session.commit()
+    now[0] += redirects.ttl_seconds + 1
+    assert client.get(f"/r/{item['slug']}", follow_redirects=False).status_code == 404
+    assert redirects.resolve(item["slug"]) is None
+
+
+def test_uppercase_short_links_are_fully_alphanumeric(
+    client: TestClient, monkeypatch, auth_headers, qr_payload
+) -> None:
+    from qrcode.util import MODE_ALPHA_NUM
+
+    from config import settings
+    from services.qr import plan_encoding
+
+    headers = auth_headers()
+    item = client.post("/api/qr", json=qr_payload, headers=headers).json()
+
+    monkeypatch.setattr(settings, "qr_uppercase_host", True)
+    plan = plan_encoding(redirect_url(item["slug"]), upper_host=True)
+    assert [mode for mode, _ in plan.segments] == [MODE_ALPHA_NUM]
+    resp = client.get(f"/R/{item['slug']}", follow_redirects=False)
+    assert resp.status_code == 302
+    assert resp.headers["location"] == item["url"]
@@ -0,0 +1,89 @@
+import threading
+import time
+from pathlib import Path
+
+from services.render_cache import RenderCache
+
+
+def test_publish_and_approximate_lru_eviction(tmp_path: Path) -> None:
+    cache = RenderCache(tmp_path / "renders.db", max_bytes=1_000, touch_seconds=0)
+    for n in range(4):
+        cache.put(f"key-{n}", bytes(200))
+        time.sleep(0.01)
+    assert cache.usage() == 800
+    # a hit refreshes key-0, so key-1 is now the least recently used
+    assert cache.get("key-0") == bytes(200)
+
+    cache.put("key-4", bytes(300))
+    assert cache.get("key-1") is None
+    assert cache.get("key-0") is not None and cache.get("key-4") is not None
+    assert cache.usage() <= 900
+    assert cache.stats.evictions >= 1
+
+    reopened = RenderCache(tmp_path / "renders.db", max_bytes=1_000)
+    assert reopened.get("key-4") == bytes(300)
+    assert reopened.usage() == cache.usage()
+
+
+def test_identical_misses_render_once_across_workers(tmp_path: Path) -> None:
+    # two instances on one file stand in for two worker processes
+    workers = [RenderCache(tmp_path / "renders.db", max_bytes=1 << 20) for _ in range(2)]
+    calls = []
+    start = threading.Barrier(8)
+
+    def produce() -> bytes:
+        calls.append(1)
+        time.sleep(0.1)
+        return b"<svg/>"
+
+    results = []
+
+    def request(cache: RenderCache) -> None:
+        start.wait()
+        results.append(cache.get_or_render("popular:svg", produce))
+
+    threads = [threading.Thread(target=request, args=(workers[n % 2],)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"<svg/>"] * 8
+    assert len(calls) == 1
+    assert sum(cache.stats.renders for cache in workers) == 1
+
+
+def test_expired_lease_from_dead_worker_is_taken_over(tmp_path: Path) -> None:
+    crashed = RenderCache(tmp_path / "renders.db", max_bytes=1 << 20, lease_seconds=0.05)
+    assert crashed._acquire("orphan:png") is None and crashed._owns("orphan:png")
+
+    survivor = RenderCache(tmp_path / "renders.db", max_bytes=1 << 20, lease_seconds=0.05)
+    started = time.perf_counter()
+    assert survivor.get_or_render("orphan:png", lambda: b"png") == b"png"
+    assert time.perf_counter() - started < 1
+    assert crashed.get("orphan:png") == b"png"
+
+
+def test_saved_renders_use_the_shared_cache(tmp_path: Path, monkeypatch) -> None:
+    from config import settings
+    from services import render_cache
+    from services.qr import QRConfig, render_qr
+
+    monkeypatch.setattr(settings, "render_cache_path", str(tmp_path / "renders.db"))
+    render_cache.shared_render_cache.cache_clear()
+    try:
+        config = QRConfig("https://example.com/shared", "#000000", "#ffffff", 128, 0, 0)
+        first = render_qr(config, shared=True).get("svg")
+        cache = render_cache.shared_render_cache()
+        assert cache.stats.renders == 1
+
+        # another worker: no matrix is encoded on a hit
+        again = render_qr(config, shared=True)
+        assert again.get("svg") == first
+        assert again._matrix is None
+        assert cache.stats.hits == 1
+
+        render_qr(config).get("png")
+        assert cache.stats.renders == 1
+    finally:
+        render_cache.shared_render_cache.cache_clear()
@@ -0,0 +1,97 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+
+from migrations import migrate
+from services.search import match_query
+
+
+def _create(client: TestClient, headers: dict, payload: dict, title: str, url: str = "https://example.com") -> dict:
+    resp = client.post("/api/qr", json={**payload, "title": title, "url": url}, headers=headers)
+    assert resp.status_code == 201
+    return resp.json()
+
+
+def _search(client: TestClient, headers: dict, q: str, **params) -> list:
+    resp = client.get("/api/qr/search", params={"q": q, **params}, headers=headers)
+    assert resp.status_code == 200
+    return [item["title"] for item in resp.json()]
+
+
+def _assert_index_consistent(engine) -> None:
+    with Session(engine) as session:
+        # compares every index entry with the qr_items content; raises on any mismatch
+        session.exec(text("INSERT INTO qr_items_fts (qr_items_fts, rank) VALUES ('integrity-check', 1)"))
+        indexed = session.exec(text("SELECT count(*) FROM qr_items_fts")).one()[0]
+        stored = session.exec(text("SELECT count(*) FROM qr_items")).one()[0]
+    assert indexed == stored
+
+
+def test_match_query_quotes_words_as_prefixes() -> None:
+    assert match_query('Camp "OR" exa*') == '"camp"* "or"* "exa"*'
+    assert match_query("  -- ") is None
+
+
+def test_search_matches_prefixes_ranks_and_paginates(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    _create(client, alice, qr_payload, "Spring campaign")
+    _create(client, alice, qr_payload, "Menu", "https://campaigns.example.org/menu")
+    _create(client, alice, qr_payload, "Winter campaign poster", "https://example.com/winter")
+    _create(client, bob, qr_payload, "Bob's campaign")
+
+    found = _search(client, alice, "camp")
+    # title hits rank above the URL-only hit, and other users' items never show up
+    assert set(found[:2]) == {"Spring campaign", "Winter campaign poster"}
+    assert found[2:] == ["Menu"]
+    assert _search(client, alice, "camp win") == ["Winter campaign poster"]
+    assert _search(client, alice, "menu example.org") == ["Menu"]
+    assert _search(client, alice, "nothing") == []
+
+    first = _search(client, alice, "camp", limit=2)
+    rest = _search(client, alice, "camp", limit=2, offset=2)
+    assert first + rest == found
+    assert client.get("/api/qr/search", params={"q": ""}, headers=alice).status_code == 422
+    _assert_index_consistent(engine)
+
+
+def test_index_follows_edits_and_deletes(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    menu = _create(client, alice, qr_payload, "Lunch menu")
+    _create(client, alice, qr_payload, "Dinner menu")
+    _create(client, bob, qr_payload, "Brunch menu")
+
+    client.patch(f"/api/qr/{menu['id']}", json={"title": "Breakfast card"}, headers=alice)
+    assert _search(client, alice, "lunch") == []
+    assert _search(client, alice, "breakfast") == ["Breakfast card"]
+    _assert_index_consistent(engine)
+
+    assert client.delete(f"/api/qr/{menu['id']}", headers=alice).status_code == 200
+    assert _search(client, alice, "breakfast") == []
+    _assert_index_consistent(engine)
+
+    assert client.delete("/api/user/me", headers=alice).status_code == 200
+    assert _search(client, bob, "menu") == ["Brunch menu"]
+    _assert_index_consistent(engine)
+
+
+def test_migration_backfills_existing_rows(tmp_path) -> None:
+    from sqlmodel import create_engine
+
+    bind = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with bind.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL)")
+        conn.exec_driver_sql(
+            "CREATE TABLE qr_items (id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR, url VARCHAR NOT NULL, "
+            "svg_path VARCHAR NOT NULL, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.exec_driver_sql("INSERT INTO users (id, email) VALUES (1, 'old@example.com')")
+        conn.exec_driver_sql(
+            "INSERT INTO qr_items (user_id, title, url, svg_path) VALUES (1, 'Legacy flyer', 'https://example.com', 'a.svg')"
+        )
+    migrate(bind)
+    with bind.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT rowid FROM qr_items_fts WHERE qr_items_fts MATCH 'flyer'").all()
+    assert len(rows) == 1
+    bind.dispose()
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import serve
+from config import settings
+from services.admission import PixelBudget
+
+
+def test_fastest_available_takes_the_first_installed_module() -> None:
+    assert serve.fastest_available([("qr_forge_missing_loop", "fast"), ("asyncio", "asyncio")]) == "asyncio"
+    with pytest.raises(RuntimeError):
+        serve.fastest_available([("qr_forge_missing_loop", "fast")])
+
+
+def test_main_migrates_once_then_starts_workers_without_migrating(monkeypatch, capsys) -> None:
+    import db
+    import uvicorn
+
+    calls = []
+    monkeypatch.setattr(settings, "migrate_on_startup", True)
+    monkeypatch.setattr(settings, "backlog", 512)
+    monkeypatch.setattr(settings, "keep_alive_seconds", 15)
+    monkeypatch.setattr(settings, "limit_concurrency", 0)
+    monkeypatch.setattr(settings, "workers", 1)
+    monkeypatch.setattr(settings, "port", 8000)
+    monkeypatch.delenv("QR_FORGE_MIGRATE_ON_STARTUP", raising=False)
+    monkeypatch.setattr(db, "init_db", lambda bind: calls.append("init_db"))
+
+    def fake_run(app: str, **options) -> None:
+        # by the time workers start the schema is current and they are told so
+        calls.append((app, options, settings.migrate_on_startup, serve.os.environ["QR_FORGE_MIGRATE_ON_STARTUP"]))
+
+    monkeypatch.setattr(uvicorn, "run", fake_run)
+
+    assert serve.main(["--workers", "3", "--port", "9001"]) == 0
+
+    assert calls[0] == "init_db"
+    app, options, migrate, env = calls[1]
+    assert (app, migrate, env) == ("app:app", False, "false")
+    assert options["workers"] == 3 and options["port"] == 9001
+    assert options["backlog"] == 512 and options["timeout_keep_alive"] == 15
+    assert options["limit_concurrency"] is None
+    assert options["loop"] in ("uvloop", "asyncio") and options["http"] in ("httptools", "h11")
+    assert "backlog: 512" in capsys.readouterr().out
+
+
+def test_drain_waits_for_renders_still_holding_budget() -> None:
+    async def scenario() -> tuple:
+        budget = PixelBudget(100)
+        cost = await budget.acquire(60)
+        timed_out = await budget.drain(0.01)
+        asyncio.get_running_loop().call_later(0.01, budget.release, cost)
+        drained = await budget.drain(1)
+        return timed_out, drained, await budget.drain(0)
+
+    assert asyncio.run(scenario()) == (False, True, True)
+
+
+def test_lifespan_skips_migrations_when_the_launcher_ran_them(client: TestClient, monkeypatch, engine) -> None:
+    import app as app_module
+
+    migrated = []
+    monkeypatch.setattr(app_module, "engine", engine)
+    monkeypatch.setattr(app_module, "init_db", lambda bind: migrated.append(bind))
+    monkeypatch.setattr(settings, "migrate_on_startup", False)
+    with client:
+        assert client.get("/health").status_code == 200
+    assert migrated == []
@@ -0,0 +1,35 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("PIL", "qrcode", "bcrypt", "jinja2", "jose")
+
+
+def test_import_has_no_side_effects_and_defers_heavy_modules(tmp_path: Path) -> None:
+    script = (
+        "import json, sys\n"
+        f"sys.path.insert(0, {str(ROOT_DIR)!r})\n"
+        "import app\n"
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == []
+    # no database file and no asset directories until the lifespan runs
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lifespan_initialises_storage_and_warms_up(lifespan_client: TestClient, monkeypatch, tmp_path: Path) -> None:
+    import app as app_module
+    from config import settings
+
+    assert (tmp_path / "svg").is_dir() and (tmp_path / "png").is_dir()
+    warmed = []
+    monkeypatch.setattr(settings, "warmup", True)
+    monkeypatch.setattr(app_module, "warm_up", lambda: warmed.append(True))
+    with lifespan_client:
+        assert warmed == [True]
+        assert lifespan_client.get("/health").json() == {"status": "ok"}
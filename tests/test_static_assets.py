@@ -0,0 +1,36 @@
+import re
+
+from fastapi.testclient import TestClient
+
+from app import BASE_DIR
+
+
+def test_pages_link_fingerprinted_precompressed_assets(lifespan_client: TestClient) -> None:
+    client = lifespan_client
+    page = client.get("/")
+    assert page.status_code == 200
+    match = re.search(r'src="(/static/app\.[0-9a-f]{10}\.js)"', page.text)
+    assert match, page.text
+    assert re.search(r'src="/assets/icons/home\.[0-9a-f]{10}\.svg"', page.text)
+    url = match.group(1)
+
+    original = (BASE_DIR / "static" / "app.js").read_bytes()
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert int(compressed.headers["content-length"]) < len(original)
+    assert compressed.content == original
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == original
+
+    cached = client.get(url, headers={"If-None-Match": compressed.headers["etag"]})
+    assert cached.status_code == 304
+
+    assert client.get("/static/app.0000000000.js").status_code == 404
+    legacy = client.get("/static/app.js")
+    assert legacy.status_code == 200
+    assert "immutable" not in legacy.headers.get("cache-control", "")
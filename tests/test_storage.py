@@ -0,0 +1,298 @@
+import threading
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from models import ASSET_PENDING, ASSET_READY, Asset, QRItem
+from storage import asset_writer
+
+
+def test_identical_codes_share_one_asset(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+
+    first = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    second = client.post("/api/qr", json={**qr_payload, "title": "Mine"}, headers=bob).json()
+    third = client.post("/api/qr", json=qr_payload, headers=alice).json()
+
+    assert first["asset_id"] == second["asset_id"] == third["asset_id"]
+    assert first["svg_path"] == second["svg_path"]
+    assert Path(first["svg_path"]).name == f"{first['asset_id']}.svg"
+    with Session(engine) as session:
+        assets = session.exec(select(Asset)).all()
+        assert len(assets) == 1
+        assert assets[0].refcount == 3
+
+
+def test_files_unlinked_only_after_last_reference(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    mine = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    client.post("/api/qr", json=qr_payload, headers=bob)
+    other = client.post("/api/qr", json={**qr_payload, "foreground_color": "#ff0000"}, headers=alice).json()
+    svg_path, png_path = Path(mine["svg_path"]), Path(mine["png_path"])
+
+    assert client.delete(f"/api/qr/{mine['id']}", headers=alice).status_code == 200
+    asset_writer.flush()
+    assert svg_path.exists() and png_path.exists()
+
+    assert client.delete("/api/user/me", headers=alice).status_code == 200
+    asset_writer.flush()
+    assert not Path(other["svg_path"]).exists()
+    assert svg_path.exists()
+
+    assert client.delete("/api/user/me", headers=bob).status_code == 200
+    asset_writer.flush()
+    assert not svg_path.exists() and not png_path.exists()
+    with Session(engine) as session:
+        assert session.exec(select(Asset)).all() == []
+        assert session.exec(select(QRItem)).all() == []
+
+
+def test_account_deletion_is_set_based_at_scale(
+    client: TestClient, engine, tmp_path: Path, auth_headers, qr_payload
+) -> None:
+    from sqlalchemy import event, insert
+
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    shared = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    client.post("/api/qr", json=qr_payload, headers=bob)
+    user_id = shared["user_id"]
+
+    bulk_svg, bulk_png = tmp_path / "bulk.svg", tmp_path / "bulk.png"
+    bulk_svg.write_text("<svg/>")
+    bulk_png.write_bytes(b"png")
+    legacy_dir = tmp_path / "legacy"
+    legacy_dir.mkdir()
+    legacy_paths = [legacy_dir / f"{n}.svg" for n in range(2_000)]
+    for path in legacy_paths[::2]:
+        # every other legacy file is already gone and must be tolerated
+        path.write_text("<svg/>")
+
+    row = {key: qr_payload[key] for key in ("url", "foreground_color", "background_color", "size", "padding")}
+    with Session(engine) as session:
+        session.add(Asset(id="b" * 64, config_hash="c" * 64, svg_path=str(bulk_svg), png_path=str(bulk_png), refcount=20_000))
+        session.exec(
+            insert(QRItem),
+            params=[
+                {**row, "user_id": user_id, "title": f"Bulk {n}", "border_radius": 0,
+                 "svg_path": str(bulk_svg), "png_path": str(bulk_png), "asset_id": "b" * 64}
+                for n in range(20_000)
+            ]
+            + [
+                {**row, "user_id": user_id, "title": f"Legacy {n}", "border_radius": 0,
+                 "svg_path": str(path), "png_path": None, "asset_id": None}
+                for n, path in enumerate(legacy_paths)
+            ],
+        )
+        session.commit()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.delete("/api/user/me", headers=alice).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # a fixed handful of statements, independent of the number of items
+    assert len(statements) < 20
+
+    asset_writer.flush()
+    assert not bulk_svg.exists() and not bulk_png.exists()
+    assert not any(path.exists() for path in legacy_paths)
+    assert Path(shared["svg_path"]).exists()
+    with Session(engine) as session:
+        assert session.exec(select(QRItem).where(QRItem.user_id == user_id)).first() is None
+        assets = session.exec(select(Asset)).all()
+        assert [(asset.id, asset.refcount) for asset in assets] == [(shared["asset_id"], 1)]
+
+
+def test_assets_are_written_atomically_after_commit(
+    client: TestClient, engine, monkeypatch, auth_headers, qr_payload
+) -> None:
+    alice = auth_headers("alice@example.com")
+    gate = threading.Event()
+    flushed = []
+    monkeypatch.setattr(asset_writer, "on_flushed", flushed.extend)
+    original = asset_writer._write_run
+
+    def held_write_run(run) -> None:
+        gate.wait(5)
+        original(run)
+
+    monkeypatch.setattr(asset_writer, "_write_run", held_write_run)
+
+    try:
+        created = client.post("/api/qr", json=qr_payload, headers=alice).json()
+        svg_path = Path(created["svg_path"])
+        # the row is committed while the files are still queued on the writer
+        assert not svg_path.exists()
+        with Session(engine) as session:
+            assert session.get(Asset, created["asset_id"]).status == ASSET_PENDING
+        download = client.get(f"/api/qr/{created['id']}/download", params={"format": "svg"}, headers=alice)
+        assert download.status_code == 200
+        assert download.content == asset_writer.pending_bytes(svg_path)
+
+        # a delete queued behind the pending write unlinks after the rename
+        assert client.delete(f"/api/qr/{created['id']}", headers=alice).status_code == 200
+    finally:
+        gate.set()
+    asset_writer.flush()
+
+    assert flushed == [created["asset_id"]]
+    assert not svg_path.exists()
+    assert not list(svg_path.parent.glob("*.tmp"))
+    assert asset_writer.pending_bytes(svg_path) is None
+
+
+def test_account_deletion_only_releases_its_own_assets(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    mine = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    theirs = client.post("/api/qr", json={**qr_payload, "foreground_color": "#00ff00"}, headers=bob).json()
+    asset_writer.flush()
+    # bob's asset momentarily unreferenced, e.g. mid-edit in another request that will take it again
+    with Session(engine) as session:
+        asset = session.get(Asset, theirs["asset_id"])
+        asset.refcount = 0
+        session.add(asset)
+        session.commit()
+
+    assert client.delete("/api/user/me", headers=alice).status_code == 200
+    asset_writer.flush()
+    assert not Path(mine["svg_path"]).exists()
+    assert Path(theirs["svg_path"]).exists() and Path(theirs["png_path"]).exists()
+    with Session(engine) as session:
+        assert session.get(Asset, mine["asset_id"]) is None
+        assert session.get(Asset, theirs["asset_id"]) is not None
+
+
+def test_late_unlink_keeps_files_of_a_recreated_asset(
+    client: TestClient, engine, monkeypatch, auth_headers, qr_payload
+) -> None:
+    from functools import partial
+
+    from storage import referenced_paths, release_asset
+
+    monkeypatch.setattr(asset_writer, "referenced", partial(referenced_paths, engine))
+    alice = auth_headers("alice@example.com")
+    bob = auth_headers("bob@example.com")
+    mine = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    asset_writer.flush()
+
+    # the last reference goes, but the unlink is only queued after a concurrent create re-used the address
+    with Session(engine) as session:
+        session.delete(session.get(QRItem, mine["id"]))
+        released = release_asset(session, mine["asset_id"])
+        session.commit()
+    again = client.post("/api/qr", json=qr_payload, headers=bob).json()
+    assert again["svg_path"] == released.svg_path
+    asset_writer.remove(released.svg_path, released.png_path)
+    asset_writer.flush()
+    assert Path(again["svg_path"]).exists() and Path(again["png_path"]).exists()
+
+    assert client.delete(f"/api/qr/{again['id']}", headers=bob).status_code == 200
+    asset_writer.flush()
+    assert not Path(again["svg_path"]).exists()
+
+
+def test_failed_rename_fails_the_write_without_stopping_the_writer(tmp_path: Path, monkeypatch) -> None:
+    import storage
+
+    writer = storage.AssetWriter(fsync=False)
+
+    def full_disk(source, target) -> None:
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(storage.os, "replace", full_disk)
+    future = writer.write("broken", {tmp_path / "broken.svg": b"<svg/>"})
+    assert isinstance(future.exception(timeout=5), OSError)
+    monkeypatch.undo()
+
+    done = threading.Thread(target=writer.flush)
+    done.start()
+    done.join(5)
+    assert not done.is_alive()
+    assert writer.write("fine", {tmp_path / "fine.svg": b"<svg/>"}).result(timeout=5) == "fine"
+    assert not list(tmp_path.glob("*.tmp")) and not (tmp_path / "broken.svg").exists()
+    writer.close()
+
+
+def test_flush_callback_marks_assets_ready(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    from storage import mark_assets_ready
+
+    alice = auth_headers("alice@example.com")
+    created = client.post("/api/qr", json=qr_payload, headers=alice).json()
+    asset_writer.flush()
+    with Session(engine) as session:
+        assert session.get(Asset, created["asset_id"]).status == ASSET_PENDING
+    mark_assets_ready(engine, [created["asset_id"]])
+    with Session(engine) as session:
+        asset = session.get(Asset, created["asset_id"])
+        assert asset.status == ASSET_READY
+        assert Path(asset.svg_path).read_bytes().startswith(b"<svg")
+
+
+def test_edits_re_render_only_what_changed(client: TestClient, engine, monkeypatch, auth_headers, qr_payload) -> None:
+    import services.qr
+
+    headers = auth_headers("editor@example.com")
+    encodes = []
+    build_matrix = services.qr.build_matrix
+    monkeypatch.setattr(services.qr, "build_matrix", lambda plan: encodes.append(plan) or build_matrix(plan))
+
+    item = client.post("/api/qr", json={**qr_payload, "url": "https://example.com/edit"}, headers=headers).json()
+    assert len(encodes) == 1
+    asset_writer.flush()
+    etag = client.get(f"/api/qr/{item['id']}/download", headers=headers).headers["etag"]
+
+    # title only: no render, no asset change
+    resp = client.patch(f"/api/qr/{item['id']}", json={"title": "Renamed"}, headers=headers)
+    assert resp.status_code == 200
+    renamed = resp.json()
+    assert renamed["title"] == "Renamed" and renamed["asset_id"] == item["asset_id"]
+    assert renamed["updated_at"] > item["updated_at"]
+    assert len(encodes) == 1
+
+    # style only: new asset from the stored matrix, old files removed once unreferenced
+    resp = client.patch(f"/api/qr/{item['id']}", json={"foreground_color": "#aa0000", "padding": 20}, headers=headers)
+    restyled = resp.json()
+    assert restyled["asset_id"] != item["asset_id"]
+    assert len(encodes) == 1
+    asset_writer.flush()
+    assert not Path(item["svg_path"]).exists() and Path(restyled["svg_path"]).exists()
+    assert client.get(f"/api/qr/{item['id']}/download", headers=headers).headers["etag"] != etag
+
+    # destination change: full encode
+    resp = client.patch(f"/api/qr/{item['id']}", json={"url": "https://example.com/elsewhere"}, headers=headers)
+    assert resp.json()["url"] == "https://example.com/elsewhere"
+    assert len(encodes) == 2
+
+    with Session(engine) as session:
+        assets = session.exec(select(Asset)).all()
+        assert [asset.id for asset in assets] == [resp.json()["asset_id"]]
+        assert assets[0].refcount == 1 and assets[0].matrix
+
+
+def test_edit_validation_and_dynamic_destination(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    headers = auth_headers("dynamic-editor@example.com")
+    item = client.post("/api/qr", json={**qr_payload, "dynamic": True}, headers=headers).json()
+
+    assert client.patch(f"/api/qr/{item['id']}", json={"size": None}, headers=headers).status_code == 422
+    assert client.patch(f"/api/qr/{item['id']}", json={"size": 4096}, headers=headers).status_code == 422
+    other = auth_headers("someone-else@example.com")
+    assert client.patch(f"/api/qr/{item['id']}", json={"title": "x"}, headers=other).status_code == 404
+
+    # the code encodes its short link, so a new destination needs no render
+    resp = client.patch(f"/api/qr/{item['id']}", json={"url": "https://example.org/new"}, headers=headers)
+    assert resp.json()["asset_id"] == item["asset_id"]
+    location = client.get(f"/r/{item['slug']}", follow_redirects=False).headers["location"]
+    assert location == "https://example.org/new"
+
+    # null clears an overlay and brings back the plain code
+    with_text = client.patch(f"/api/qr/{item['id']}", json={"overlay_text": "QR"}, headers=headers).json()
+    assert with_text["overlay_text"] == "QR" and with_text["asset_id"] != item["asset_id"]
+    cleared = client.patch(f"/api/qr/{item['id']}", json={"overlay_text": None}, headers=headers).json()
+    assert cleared["overlay_text"] is None and cleared["asset_id"] == item["asset_id"]
@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+from typing import List, Sequence
+
+from fastapi.testclient import TestClient
+
+from config import settings
+from core import tracing
+
+
+class ListExporter:
+    exported: List[dict] = []
+
+    def export(self, spans: Sequence[tracing.Span]) -> None:
+        ListExporter.exported.extend(item.as_dict() for item in spans)
+
+
+def _configure(monkeypatch, exporter: str, path: Path, rate: float = 1.0) -> None:
+    monkeypatch.setattr(settings, "trace_sample_rate", rate)
+    monkeypatch.setattr(settings, "trace_exporter", exporter)
+    monkeypatch.setattr(settings, "trace_path", str(path))
+    tracing.configured_exporter.cache_clear()
+
+
+def test_unsampled_requests_only_get_a_trace_id(client: TestClient, tmp_path: Path, monkeypatch) -> None:
+    path = tmp_path / "traces.jsonl"
+    _configure(monkeypatch, "jsonl", path, rate=0)
+    try:
+        resp = client.get("/health")
+        assert len(resp.headers["x-trace-id"]) == 32
+        assert client.get("/health").headers["x-trace-id"] != resp.headers["x-trace-id"]
+        assert not path.exists()
+    finally:
+        tracing.configured_exporter.cache_clear()
+
+
+def test_sampled_request_spans_nest_under_the_root(
+    client: TestClient, tmp_path: Path, monkeypatch, auth_headers, qr_payload
+) -> None:
+    path = tmp_path / "traces.jsonl"
+    _configure(monkeypatch, "jsonl", path)
+    try:
+        headers = auth_headers()
+        created = client.post("/api/qr", json=qr_payload, headers=headers)
+        exported = client.get("/api/export/csv", headers=headers)
+    finally:
+        tracing.configured_exporter.cache_clear()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    by_trace = {}
+    for item in spans:
+        by_trace.setdefault(item["trace_id"], []).append(item)
+
+    create = by_trace[created.headers["x-trace-id"]]
+    names = {item["name"] for item in create}
+    assert {"POST /api/qr", "auth", "auth.jwt_decode", "auth.user_fetch", "qr.encode", "qr.render"} <= names
+    assert "storage.enqueue_write" in names
+    root = next(item for item in create if item["parent_id"] is None)
+    assert root["attributes"] == {"status": 201, "route": "/api/qr"}
+    ids = {item["span_id"]: item for item in create}
+    decode = next(item for item in create if item["name"] == "auth.jwt_decode")
+    assert ids[decode["parent_id"]]["name"] == "auth"
+    # every span leads back to the request's root
+    for item in create:
+        while item["parent_id"] is not None:
+            item = ids[item["parent_id"]]
+        assert item is root
+
+    export = by_trace[exported.headers["x-trace-id"]]
+    loop = next(item for item in export if item["name"] == "export.csv")
+    assert loop["attributes"] == {"rows": 1}
+    assert loop["parent_id"] == next(item for item in export if item["parent_id"] is None)["span_id"]
+
+
+def test_plugged_exporter_and_caller_trace_id(client: TestClient, tmp_path: Path, monkeypatch) -> None:
+    _configure(monkeypatch, "test_tracing:ListExporter", tmp_path / "unused.jsonl")
+    ListExporter.exported.clear()
+    trace_id = "0123456789abcdef0123456789abcdef"
+    try:
+        resp = client.get("/health", headers={"X-Trace-Id": trace_id})
+    finally:
+        tracing.configured_exporter.cache_clear()
+    assert resp.headers["x-trace-id"] == trace_id
+    assert [item["trace_id"] for item in ListExporter.exported] == [trace_id]
+    assert not (tmp_path / "unused.jsonl").exists()
+
+
+def test_span_is_a_no_op_outside_a_trace() -> None:
+    with tracing.span("idle") as active:
+        assert active is None
+    tracing.record("idle", 0.0)
+    assert tracing.current_trace_id() is None
@@ -0,0 +1,79 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from config import settings
+from models import Asset, QRItem, UserUsage
+
+
+def _usage(client: TestClient, headers: dict) -> dict:
+    resp = client.get("/api/user/me", headers=headers)
+    assert resp.status_code == 200
+    return resp.json()["usage"]
+
+
+def _recomputed(engine, user_id: int) -> tuple:
+    # what the counters replace: a COUNT(*) plus the sizes of every item's files
+    with Session(engine) as session:
+        return session.exec(
+            select(func.count(), func.coalesce(func.sum(Asset.svg_bytes), 0), func.coalesce(func.sum(Asset.png_bytes), 0))
+            .select_from(QRItem)
+            .join(Asset, Asset.id == QRItem.asset_id)
+            .where(QRItem.user_id == user_id)
+        ).one()
+
+
+def test_counters_follow_creates_edits_and_deletes(client: TestClient, engine, auth_headers, qr_payload) -> None:
+    headers = auth_headers("usage@example.com")
+    assert _usage(client, headers) == {
+        "items": 0, "svg_bytes": 0, "png_bytes": 0, "renders_today": 0,
+        "max_items": None, "max_bytes": None, "max_renders_per_day": None,
+    }
+
+    first = client.post("/api/qr", json=qr_payload, headers=headers).json()
+    client.post("/api/qr", json=qr_payload, headers=headers)
+    third = client.post("/api/qr", json={**qr_payload, "size": 512}, headers=headers).json()
+    client.patch(f"/api/qr/{third['id']}", json={"foreground_color": "#123456"}, headers=headers)
+    client.patch(f"/api/qr/{third['id']}", json={"title": "Renamed"}, headers=headers)
+    assert client.delete(f"/api/qr/{first['id']}", headers=headers).status_code == 200
+
+    usage = _usage(client, headers)
+    items, svg_bytes, png_bytes = _recomputed(engine, first["user_id"])
+    assert (usage["items"], usage["svg_bytes"], usage["png_bytes"]) == (items, svg_bytes, png_bytes)
+    assert items == 2 and svg_bytes > 0 and png_bytes > 0
+    # three creates and one re-render; the title edit rendered nothing
+    assert usage["renders_today"] == 4
+
+    assert client.delete("/api/user/me", headers=headers).status_code == 200
+    with Session(engine) as session:
+        assert session.exec(select(UserUsage)).all() == []
+
+
+def test_quotas_are_enforced(client: TestClient, engine, monkeypatch, auth_headers, qr_payload) -> None:
+    headers = auth_headers("quota@example.com")
+    monkeypatch.setattr(settings, "quota_max_items", 2)
+    monkeypatch.setattr(settings, "quota_renders_per_day", 3)
+
+    first = client.post("/api/qr", json=qr_payload, headers=headers).json()
+    client.post("/api/qr", json=qr_payload, headers=headers)
+    resp = client.post("/api/qr", json=qr_payload, headers=headers)
+    assert resp.status_code == 403
+    assert _usage(client, headers)["max_items"] == 2
+
+    assert client.patch(f"/api/qr/{first['id']}", json={"padding": 20}, headers=headers).status_code == 200
+    resp = client.patch(f"/api/qr/{first['id']}", json={"padding": 24}, headers=headers)
+    assert resp.status_code == 429
+    # edits that render nothing stay allowed
+    assert client.patch(f"/api/qr/{first['id']}", json={"title": "Still fine"}, headers=headers).status_code == 200
+
+    monkeypatch.setattr(settings, "quota_renders_per_day", 0)
+    monkeypatch.setattr(settings, "quota_max_items", 0)
+    monkeypatch.setattr(settings, "quota_max_mb", 1)
+    assert client.post("/api/qr", json=qr_payload, headers=headers).status_code == 201
+    with Session(engine) as session:
+        usage = session.get(UserUsage, first["user_id"])
+        usage.svg_bytes = 1024 * 1024
+        session.add(usage)
+        session.commit()
+    assert client.post("/api/qr", json=qr_payload, headers=headers).status_code == 403
+    assert _usage(client, headers)["max_bytes"] == 1024 * 1024